@@ -82,7 +82,9 @@ class KassenCommands(commands.Cog):
         service: KassenService = self.bot.get_cog("KassenService")
         if not service: return await interaction.followup.send("Fehler: Kassen-Service nicht gefunden.", ephemeral=True)
         
-        await service.update_kassenstand(geld, schwarzgeld)
+        result = await service.book(geld, schwarzgeld, "einzahlung", ausgefuehrt_von=interaction.user.id)
+        if not result.get("success"):
+            return await interaction.followup.send(f"❌ {result.get('error', 'Unbekannter Fehler')}", ephemeral=True)
         
         embed = discord.Embed(
             title="💵 Einzahlung",
@@ -105,11 +107,10 @@ class KassenCommands(commands.Cog):
         service: KassenService = self.bot.get_cog("KassenService")
         if not service: return await interaction.followup.send("Fehler: Kassen-Service nicht gefunden.", ephemeral=True)
         
-        kassenstand = await service.get_kassenstand()
-        if geld > kassenstand.get('geld', 0) or schwarzgeld > kassenstand.get('schwarzgeld', 0):
-            return await interaction.followup.send("❌ Nicht genug Geld in der entsprechenden Kasse vorhanden!", ephemeral=True)
-            
-        await service.update_kassenstand(-geld, -schwarzgeld)
+        # Deckungsprüfung und Buchung erfolgen atomar im Service
+        result = await service.book(-geld, -schwarzgeld, "auszahlung", grund, interaction.user.id, an_wen.id)
+        if not result.get("success"):
+            return await interaction.followup.send(f"❌ {result.get('error', 'Unbekannter Fehler')}", ephemeral=True)
         
         embed = discord.Embed(
             title="💸 Auszahlung",
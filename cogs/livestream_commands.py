@@ -23,7 +23,16 @@ class LiveStreamCommands(commands.Cog):
         service: "LiveStreamService" = self.bot.get_cog("LiveStreamService")
         if service:
             await service.trigger_check()
-            await interaction.followup.send("✅ Manuelle Überprüfung abgeschlossen!", ephemeral=True)
+            status = service.get_status()
+            gueltig_bis = status["twitch_token_gueltig_bis"]
+            used, budget = status["youtube_kontingent"]
+            await interaction.followup.send(
+                "✅ Manuelle Überprüfung abgeschlossen!\n"
+                f"**Twitch-Token:** gültig bis {gueltig_bis.strftime('%d.%m.%Y %H:%M') if gueltig_bis else '–'} | "
+                f"{status['erneuerungen']} Erneuerungen ({status['nach_401']} nach 401, {status['fehlgeschlagen']} fehlgeschlagen)\n"
+                f"**YouTube-Kontingent heute:** {used}/{budget} Einheiten",
+                ephemeral=True
+            )
         else:
             await interaction.followup.send("❌ Fehler: LiveStream-Service nicht gefunden.", ephemeral=True)
 
@@ -0,0 +1,388 @@
+import discord
+import asyncio
+import csv
+import io
+import shlex
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Set
+
+if TYPE_CHECKING:
+    from main import MyBot
+    from services.personal_service import PersonalService
+    from services.write_queue_service import WriteQueueService
+
+# --- Konstanten ---
+MAX_PARALLEL_GROUPS = 5
+PREFETCH_CHUNK_SIZE = 100 # query_members akzeptiert höchstens 100 IDs pro Aufruf
+FLUSH_CHUNK_SIZE = 200 # Vorgemerkte Schreibzugriffe pro Transaktion
+
+def is_discord_id(identifier: str) -> bool:
+    """Lange Zahlen sind Discord-IDs, kurze Zahlen Dienstnummern (wie in den Modulen)."""
+    return identifier.isdigit() and len(identifier) > 15
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+@dataclass
+class MassCommandLine:
+    """Eine geparste Zeile einer MassCommands-Datei inkl. ihres Ergebnisses."""
+    line_no: int
+    raw: str
+    tokens: List[str]
+    command: str
+    module: Any = None
+    errors: list = field(default_factory=list)
+    successes: list = field(default_factory=list)
+    duration: float = 0.0
+    group_id: int = 0
+
+    @property
+    def status(self) -> str:
+        if self.errors: return "fehler"
+        if self.successes: return "erfolg"
+        return "ohne_ergebnis"
+
+@dataclass
+class StagedWrite:
+    """Ein vorgemerktes `UPDATE <table> SET <column> = <value> WHERE dn = <dn>` einer Zeile."""
+    line: MassCommandLine
+    table: str
+    column: str
+    dn: int
+    value: Any
+    success_message: str
+    on_commit: Callable[[], Awaitable[None]] | None = None
+
+class MassCommandBatch:
+    """
+    Verarbeitet eine MassCommands-Datei in zwei Schritten:
+    1. Die gesamte Datei wird geparst und validiert (auch als reiner Testlauf nutzbar).
+    2. Zeilen, die dasselbe Mitglied betreffen, laufen in Dateireihenfolge nacheinander,
+       unabhängige Mitglieder parallel (begrenzt) über die Discord-Schreibwarteschlange.
+    """
+    def __init__(self, bot: "MyBot", interaction: discord.Interaction, command_modules: Dict[str, Dict[str, Any]]):
+        self.bot = bot
+        self.interaction = interaction
+        self.command_modules = command_modules
+        self.lines: List[MassCommandLine] = []
+        self.parse_errors: List[tuple] = []
+        self.completed = 0
+        self.started_at: float | None = None
+        # Vorab aufgelöste Kennungen (DN oder Discord-ID) -> Mitglied bzw. None, falls nicht auf dem Server
+        self.members: Dict[str, discord.Member | None] = {}
+        # Vergebene DNs (DN -> Discord-ID) und Gegenrichtung; wird von den Modulen bei DN-Änderungen mitgeführt
+        self.discord_id_by_dn: Dict[int, int | None] = {}
+        self.dn_by_discord_id: Dict[int, int] = {}
+        self.dn_registry_loaded = False
+        self._lines_by_no: Dict[int, MassCommandLine] = {}
+        self._staged: List[StagedWrite] = []
+        self._flush_lock = asyncio.Lock()
+        # Zwischenspeicher der Module für Aktionen, die erst in `finalize` gesammelt ausgeführt werden
+        self.module_state: Dict[str, Any] = {}
+
+    # --- Schritt 1: Parsen & Validieren ---
+    def parse(self, data_str: str):
+        for i, raw_line in enumerate(data_str.splitlines(), 1):
+            line = raw_line.strip()
+            if not line: continue
+            try:
+                tokens = shlex.split(line)
+            except ValueError as e:
+                self.parse_errors.append((i, raw_line, f"Zeile konnte nicht gelesen werden: {e}"))
+                continue
+            if not tokens: continue
+
+            cmd = tokens[0].lower()
+            module_data = self.command_modules.get(cmd)
+            if not module_data:
+                self.parse_errors.append((i, raw_line, f"Unbekannter Befehl '{cmd}'"))
+                continue
+
+            module_instance = module_data["instance"]
+            if validate := getattr(module_instance, "validate", None):
+                if error := validate(self.interaction, tokens):
+                    self.parse_errors.append((i, raw_line, error))
+                    continue
+            self.lines.append(MassCommandLine(line_no=i, raw=raw_line, tokens=tokens, command=cmd, module=module_instance))
+            self._lines_by_no[i] = self.lines[-1]
+
+    def _group_keys(self, line: MassCommandLine) -> Set[str]:
+        if group_keys := getattr(line.module, "group_keys", None):
+            keys = set(group_keys(line.tokens))
+        else:
+            keys = {line.tokens[2]} if len(line.tokens) > 2 else set()
+        # DN und Discord-ID desselben Mitglieds landen so in derselben Gruppe
+        keys |= {f"member:{member.id}" for key in keys if (member := self.members.get(key))}
+        return keys
+
+    # --- Kennungen vorab auflösen ---
+    async def prefetch_identifiers(self):
+        """
+        Lädt alle vergebenen DNs mit einer Abfrage und löst die Mitglieds-Kennungen der Datei
+        darüber und über den Mitglieder-Cache auf. Kennungen, deren Zuordnung sich innerhalb
+        der Datei ändert (z.B. durch DN-Wechsel oder Kündigung), werden weiterhin live aufgelöst.
+        """
+        guild = self.interaction.guild
+        personal_service: "PersonalService" = self.bot.get_cog("PersonalService")
+        if not guild or not personal_service: return
+        await self._load_dn_registry(personal_service)
+
+        identifiers, volatile = set(), set()
+        for line in self.lines:
+            if get_identifiers := getattr(line.module, "identifiers", None):
+                identifiers.update(get_identifiers(line.tokens))
+            if get_volatile := getattr(line.module, "volatile_keys", None):
+                volatile.update(get_volatile(line.tokens))
+        identifiers = {i for i in identifiers - volatile if i.isdigit()}
+        if not identifiers: return
+
+        user_id_by_identifier = {i: int(i) for i in identifiers if is_discord_id(i)}
+        # Nicht gefundene DNs bleiben offen, da sie im Verlauf der Datei entstehen können
+        for dn in (i for i in identifiers if not is_discord_id(i)):
+            if discord_id := self.discord_id_by_dn.get(int(dn)):
+                user_id_by_identifier[dn] = discord_id
+
+        missing = sorted({uid for uid in user_id_by_identifier.values() if not guild.get_member(uid)})
+        for chunk in _chunks(missing, PREFETCH_CHUNK_SIZE):
+            try:
+                await guild.query_members(user_ids=chunk, limit=len(chunk), cache=True)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                print(f"[MassCommands] Mitglieder konnten nicht vorab geladen werden: {e}")
+                # Nicht geladene Kennungen werden später einzeln aufgelöst
+                user_id_by_identifier = {i: uid for i, uid in user_id_by_identifier.items() if uid not in chunk}
+
+        for identifier, user_id in user_id_by_identifier.items():
+            self.members[identifier] = guild.get_member(user_id)
+
+    # --- DN-Verzeichnis ---
+    async def _load_dn_registry(self, personal_service: "PersonalService"):
+        rows = await personal_service._execute_query("SELECT dn, discord_id FROM members", fetch="all") or []
+        self.discord_id_by_dn = {int(row['dn']): int(row['discord_id']) if row['discord_id'] else None for row in rows}
+        self.dn_by_discord_id = {user_id: dn for dn, user_id in self.discord_id_by_dn.items() if user_id}
+        self.dn_registry_loaded = True
+
+    def dn_exists(self, dn: int | str) -> bool | None:
+        """Ob die DN vergeben ist; None, wenn das Verzeichnis nicht geladen ist (dann live prüfen)."""
+        if not self.dn_registry_loaded: return None
+        return int(dn) in self.discord_id_by_dn
+
+    def dn_for_user(self, user_id: int) -> int | None:
+        return self.dn_by_discord_id.get(user_id)
+
+    def set_member_dn(self, user_id: int, dn: int | str):
+        """Vermerkt eine neue oder geänderte DN eines Mitglieds."""
+        if old_dn := self.dn_by_discord_id.get(user_id):
+            self.discord_id_by_dn.pop(old_dn, None)
+        self.discord_id_by_dn[int(dn)] = user_id
+        self.dn_by_discord_id[user_id] = int(dn)
+
+    def move_dn(self, old_dn: int | str, new_dn: int | str):
+        user_id = self.discord_id_by_dn.pop(int(old_dn), None)
+        self.discord_id_by_dn[int(new_dn)] = user_id
+        if user_id: self.dn_by_discord_id[user_id] = int(new_dn)
+
+    def forget_dn(self, dn: int | str):
+        if user_id := self.discord_id_by_dn.pop(int(dn), None):
+            self.dn_by_discord_id.pop(user_id, None)
+
+    def build_groups(self) -> List[List[MassCommandLine]]:
+        """Fasst Zeilen mit gemeinsamen Zielen (Union-Find über die Gruppenschlüssel) zusammen."""
+        parent = list(range(len(self.lines)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        owner_by_key: Dict[str, int] = {}
+        for index, line in enumerate(self.lines):
+            for key in self._group_keys(line):
+                if key in owner_by_key:
+                    parent[find(index)] = find(owner_by_key[key])
+                else:
+                    owner_by_key[key] = index
+
+        groups: Dict[int, List[MassCommandLine]] = {}
+        for index, line in enumerate(self.lines):
+            groups.setdefault(find(index), []).append(line)
+        return list(groups.values())
+
+    # --- Schritt 2: Ausführen ---
+    async def _run_line(self, line: MassCommandLine):
+        start = time.perf_counter()
+        try:
+            await line.module.handle(self.interaction, line.tokens, line.raw, line.line_no, line.errors, line.successes, batch=self)
+        except Exception as e:
+            line.errors.append((line.line_no, line.raw, f"Unerwarteter Fehler bei Ausführung: {e}"))
+        line.duration = time.perf_counter() - start
+        self.completed += 1
+
+    async def run(self):
+        write_queue: "WriteQueueService" = self.bot.get_cog("WriteQueueService")
+        personal_service: "PersonalService" = self.bot.get_cog("PersonalService")
+        group_semaphore = asyncio.Semaphore(MAX_PARALLEL_GROUPS)
+        await self.prefetch_identifiers()
+        self.started_at = time.perf_counter()
+
+        async def run_group(group: List[MassCommandLine]):
+            async with group_semaphore:
+                for line in group:
+                    async with AsyncExitStack() as stack:
+                        if write_queue:
+                            await stack.enter_async_context(write_queue.slot())
+                        await self._run_line(line)
+
+        groups = self.build_groups()
+        for group_id, group in enumerate(groups):
+            for line in group: line.group_id = group_id
+
+        async with AsyncExitStack() as stack:
+            # Google Sheets wird nur einmal am Ende der Datei synchronisiert
+            if personal_service:
+                await stack.enter_async_context(personal_service.batched_sheet_updates())
+            await asyncio.gather(*(run_group(group) for group in groups))
+            await self.flush()
+            await self._finalize_modules()
+
+    async def _finalize_modules(self):
+        """Ruft den optionalen `finalize`-Hook jedes beteiligten Moduls einmal am Ende auf."""
+        modules = {id(line.module): line.module for line in self.lines}
+        for module in modules.values():
+            if finalize := getattr(module, "finalize", None):
+                try:
+                    await finalize(self.interaction, self)
+                except Exception as e:
+                    print(f"[MassCommands] Abschluss von {type(module).__name__} fehlgeschlagen: {e}")
+
+    def line(self, line_no: int) -> MassCommandLine:
+        return self._lines_by_no[line_no]
+
+    # --- Gebündelte Datenbank-Schreibzugriffe ---
+    async def stage_write(self, line_no: int, table: str, column: str, dn: int, value: Any,
+                          success_message: str, on_commit: Callable[[], Awaitable[None]] | None = None):
+        """
+        Merkt ein einfaches Spalten-Update für eine Zeile vor. Erfolg (bzw. `on_commit` für die
+        Discord-Seite) wird erst nach dem Commit der zugehörigen Transaktion gemeldet.
+        """
+        self._staged.append(StagedWrite(self._lines_by_no[line_no], table, column, dn, value, success_message, on_commit))
+        if len(self._staged) >= FLUSH_CHUNK_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Schreibt alle vorgemerkten Updates. Muss vor jeder strukturellen Änderung (DN-Wechsel,
+        Einstellung, Entfernung) aufgerufen werden, damit die Reihenfolge der Datei erhalten bleibt.
+        """
+        async with self._flush_lock:
+            staged, self._staged = self._staged, []
+            for start in range(0, len(staged), FLUSH_CHUNK_SIZE):
+                chunk = staged[start:start + FLUSH_CHUNK_SIZE]
+                committed = await self._apply_chunk(chunk)
+                await self._run_effects(committed)
+
+    @staticmethod
+    def _collapse(chunk: List[StagedWrite]) -> List[tuple]:
+        """Fasst die Updates zu je einem `... WHERE dn IN (...)` pro Tabelle, Spalte und Wert zusammen."""
+        final_values: Dict[tuple, Any] = {}
+        for write in chunk:
+            # Spätere Zeilen überschreiben frühere, wie bei sequenzieller Ausführung
+            final_values[(write.table, write.column, write.dn)] = write.value
+        dns_by_target: Dict[tuple, List[int]] = {}
+        for (table, column, dn), value in final_values.items():
+            dns_by_target.setdefault((table, column, value), []).append(dn)
+        statements = []
+        for (table, column, value), dns in dns_by_target.items():
+            placeholders = ", ".join(["%s"] * len(dns))
+            statements.append((f"UPDATE `{table}` SET `{column}` = %s WHERE dn IN ({placeholders})", (value, *dns)))
+        return statements
+
+    async def _apply_chunk(self, chunk: List[StagedWrite]) -> List[StagedWrite]:
+        """Führt einen Block in einer Transaktion aus; schlägt sie fehl, wird zeilenweise wiederholt."""
+        try:
+            async with self.bot.db_pool.acquire() as conn:
+                await conn.begin()
+                try:
+                    async with conn.cursor() as cursor:
+                        for query, args in self._collapse(chunk):
+                            await cursor.execute(query, args)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+            return chunk
+        except Exception as e:
+            print(f"[MassCommands] Gebündeltes Schreiben fehlgeschlagen ({e}), wiederhole zeilenweise.")
+
+        committed = []
+        for write in chunk:
+            try:
+                async with self.bot.db_pool.acquire() as conn:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(f"UPDATE `{write.table}` SET `{write.column}` = %s WHERE dn = %s", (write.value, write.dn))
+                committed.append(write)
+            except Exception as e:
+                write.line.errors.append((write.line.line_no, write.line.raw, f"Datenbankfehler: {e}"))
+        return committed
+
+    async def _run_effects(self, committed: List[StagedWrite]):
+        """Meldet Erfolge und führt die Discord-Seite je Gruppe in Dateireihenfolge aus."""
+        effects_by_group: Dict[int, List[StagedWrite]] = {}
+        for write in committed:
+            if write.on_commit:
+                effects_by_group.setdefault(write.line.group_id, []).append(write)
+            else:
+                write.line.successes.append((write.line.line_no, write.success_message))
+
+        effect_semaphore = asyncio.Semaphore(MAX_PARALLEL_GROUPS)
+        async def run_group_effects(writes: List[StagedWrite]):
+            async with effect_semaphore:
+                for write in writes:
+                    try:
+                        await write.on_commit()
+                    except Exception as e:
+                        write.line.errors.append((write.line.line_no, write.line.raw, f"Gespeichert, aber Folgeaktion fehlgeschlagen: {e}"))
+
+        await asyncio.gather(*(run_group_effects(writes) for writes in effects_by_group.values()))
+
+    # --- Ergebnisse ---
+    @property
+    def errors(self) -> List[tuple]:
+        line_errors = [err for line in self.lines for err in line.errors]
+        return sorted(self.parse_errors + line_errors, key=lambda e: e[0])
+
+    @property
+    def successes(self) -> List[tuple]:
+        return sorted((s for line in self.lines for s in line.successes), key=lambda s: s[0])
+
+    def progress_text(self) -> str:
+        """Zwischenstand mit Durchsatz und geschätzter Restdauer."""
+        total = len(self.lines)
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        eta = f"{(total - self.completed) / rate:.0f}s" if rate > 0 else "unbekannt"
+        failed = sum(1 for line in self.lines if line.errors)
+        return (f"⏳ **MassCommands laufen...**\n"
+                f"**Fortschritt:** {self.completed}/{total} Zeilen ({failed} fehlgeschlagen)\n"
+                f"**Rate:** {rate:.1f} Zeilen/s | **Restdauer:** ~{eta}")
+
+    def results_csv(self) -> str:
+        """Vollständiges Ergebnis je Zeile (inkl. ungültiger Zeilen) als CSV."""
+        rows = [(ln, raw, "ungueltig", err, "") for ln, raw, err in self.parse_errors]
+        for line in self.lines:
+            error_text = "; ".join(err for _, _, err in line.errors)
+            rows.append((line.line_no, line.raw.strip(), line.status, error_text, f"{line.duration * 1000:.0f}"))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=";")
+        writer.writerow(["zeile", "befehl", "status", "fehler", "dauer_ms"])
+        writer.writerows(sorted(rows, key=lambda r: r[0]))
+        return buffer.getvalue()
+
+    def failed_lines_text(self) -> str:
+        """Alle nicht erfolgreichen Zeilen im Originalformat, um sie erneut hochladen zu können."""
+        failed = {ln: raw for ln, raw, _ in self.parse_errors}
+        failed.update({line.line_no: line.raw for line in self.lines if line.status != "erfolg"})
+        return "\n".join(failed[ln].strip() for ln in sorted(failed))
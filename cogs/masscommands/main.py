@@ -2,66 +2,115 @@ import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
 import os
+import io
+import asyncio
 import importlib
-import shlex
+import hashlib
 import sys
+import time
 from typing import TYPE_CHECKING
 
 from utils.decorators import has_permission, log_on_completion
+from cogs.masscommands._batch import MassCommandBatch
 
 if TYPE_CHECKING:
     from main import MyBot
 
+# --- Konstanten ---
+PROGRESS_INTERVAL_SECONDS = 5
+
 class MassCommandsCog(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "MassCommands"
         self.command_modules = {}
+        self._module_signatures = {} # Dateiname -> (mtime, Größe, SHA-256)
+        self._module_files = {} # Dateiname -> Befehlsname
         self.load_mass_command_modules()
 
-    def load_mass_command_modules(self):
-        """Lädt alle Massen-Befehlsmodule aus dem 'modules'-Unterordner."""
-        self.command_modules.clear()
+    def _file_signature(self, path: str, previous: tuple | None) -> tuple:
+        """(mtime, Größe, SHA-256) einer Moduldatei; der Hash wird nur bei geänderten Metadaten neu berechnet."""
+        stat = os.stat(path)
+        if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+            return previous
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        return (stat.st_mtime_ns, stat.st_size, digest)
+
+    def load_mass_command_modules(self, force: bool = False) -> dict:
+        """
+        Lädt die Massen-Befehlsmodule aus dem 'modules'-Unterordner.
+        Nur neue oder inhaltlich geänderte Dateien werden (neu) importiert, alle anderen bleiben unverändert.
+        """
+        report = {"neu": [], "geaendert": [], "entfernt": [], "unveraendert": [], "fehler": [], "dauer": {}}
         folder = os.path.join(os.path.dirname(__file__), "modules")
         if not os.path.isdir(folder):
             print(f"[WARNUNG] MassCommands: Modul-Ordner '{folder}' nicht gefunden.")
-            return
-            
-        for filename in os.listdir(folder):
-            if filename.endswith(".py") and not filename.startswith("__"):
-                module_name = filename[:-3]
-                full_mod_path = f"cogs.masscommands.modules.{module_name}"
-                try:
-                    # Korrekte Lade-Logik für normale Python-Module
-                    if full_mod_path in sys.modules:
-                        mod = importlib.reload(sys.modules[full_mod_path])
-                    else:
-                        mod = importlib.import_module(full_mod_path)
-                    
-                    cmd_name = getattr(mod, "COMMAND_NAME", None)
-                    friendly_name = getattr(mod, "FRIENDLY_NAME", cmd_name)
-                    syntax = getattr(mod, "SYNTAX", "Keine Syntax definiert.")
-                    found_class = next((c for c in mod.__dict__.values() if isinstance(c, type) and hasattr(c, "handle")), None)
-                    
-                    if cmd_name and found_class:
-                        self.command_modules[cmd_name.lower()] = {
-                            "instance": found_class(self.bot),
-                            "friendly_name": friendly_name,
-                            "syntax": syntax.strip()
-                        }
-                    else:
-                        print(f"[WARNUNG] MassCommands-Modul {filename} unvollständig.")
-                except Exception as e:
-                    print(f"[FEHLER] Fehler beim Laden des MassCommand-Moduls {filename}: {e}")
+            return report
+
+        filenames = sorted(f for f in os.listdir(folder) if f.endswith(".py") and not f.startswith("__"))
+        for filename in set(self._module_files) - set(filenames):
+            if cmd_name := self._module_files.pop(filename):
+                self.command_modules.pop(cmd_name, None)
+            self._module_signatures.pop(filename, None)
+            report["entfernt"].append(filename)
+
+        for filename in filenames:
+            previous = self._module_signatures.get(filename)
+            try:
+                signature = self._file_signature(os.path.join(folder, filename), previous)
+            except OSError as e:
+                report["fehler"].append((filename, str(e)))
+                continue
+            if not force and previous and previous[2] == signature[2]:
+                self._module_signatures[filename] = signature
+                report["unveraendert"].append(filename)
+                continue
+
+            module_name = filename[:-3]
+            full_mod_path = f"cogs.masscommands.modules.{module_name}"
+            start = time.perf_counter()
+            try:
+                # Korrekte Lade-Logik für normale Python-Module
+                if full_mod_path in sys.modules:
+                    mod = importlib.reload(sys.modules[full_mod_path])
+                else:
+                    mod = importlib.import_module(full_mod_path)
+                
+                cmd_name = getattr(mod, "COMMAND_NAME", None)
+                friendly_name = getattr(mod, "FRIENDLY_NAME", cmd_name)
+                syntax = getattr(mod, "SYNTAX", "Keine Syntax definiert.")
+                found_class = next((c for c in mod.__dict__.values() if isinstance(c, type) and hasattr(c, "handle")), None)
+                
+                if cmd_name and found_class:
+                    if old_cmd_name := self._module_files.get(filename):
+                        self.command_modules.pop(old_cmd_name, None)
+                    self.command_modules[cmd_name.lower()] = {
+                        "instance": found_class(self.bot),
+                        "friendly_name": friendly_name,
+                        "syntax": syntax.strip()
+                    }
+                    self._module_files[filename] = cmd_name.lower()
+                    self._module_signatures[filename] = signature
+                    report["geaendert" if previous else "neu"].append(filename)
+                else:
+                    print(f"[WARNUNG] MassCommands-Modul {filename} unvollständig.")
+                    report["fehler"].append((filename, "Modul unvollständig (COMMAND_NAME oder Handler-Klasse fehlt)."))
+            except Exception as e:
+                # Die zuletzt erfolgreich geladene Version bleibt aktiv
+                print(f"[FEHLER] Fehler beim Laden des MassCommand-Moduls {filename}: {e}")
+                report["fehler"].append((filename, str(e)))
+            report["dauer"][filename] = time.perf_counter() - start
+        return report
 
     # --- Befehlsgruppe ---
     mass_group = app_commands.Group(name="masscommands", description="Massen-Befehle ausführen oder deren Format anzeigen.")
 
     @mass_group.command(name="execute", description="Führe Massenbefehle aus einer hochgeladenen .txt-Datei aus")
-    @app_commands.describe(file="Die .txt-Datei, die verarbeitet werden soll")
+    @app_commands.describe(file="Die .txt-Datei, die verarbeitet werden soll", testlauf="Datei nur prüfen, ohne etwas auszuführen")
     @has_permission("masscommands.execute")
     @log_on_completion
-    async def mass_execute(self, interaction: Interaction, file: discord.Attachment):
+    async def mass_execute(self, interaction: Interaction, file: discord.Attachment, testlauf: bool = False):
         await interaction.response.defer(ephemeral=True, thinking=True)
         if not file.filename.endswith(".txt"):
             return await interaction.followup.send("❌ Bitte lade eine .txt-Datei hoch!", ephemeral=True)
@@ -71,27 +120,28 @@ class MassCommandsCog(commands.Cog):
         except UnicodeDecodeError:
             return await interaction.followup.send("❌ Datei muss UTF-8-kodiert sein!", ephemeral=True)
 
-        errors, successes = [], []
-        lines = data_str.splitlines()
-
-        for i, raw_line in enumerate(lines, 1):
-            line = raw_line.strip()
-            if not line: continue
-            
-            try:
-                tokens = shlex.split(line)
-                if not tokens: continue
-
-                cmd = tokens[0].lower()
-                module_data = self.command_modules.get(cmd)
-                if not module_data:
-                    errors.append((i, raw_line, f"Unbekannter Befehl '{cmd}'"))
-                    continue
-
-                module_instance = module_data["instance"]
-                await module_instance.handle(interaction, tokens, raw_line, i, errors, successes)
-            except Exception as e:
-                errors.append((i, raw_line, f"Unerwarteter Fehler bei Ausführung: {e}"))
+        batch = MassCommandBatch(self.bot, interaction, self.command_modules)
+        batch.parse(data_str)
+
+        if testlauf:
+            groups = batch.build_groups()
+            report_parts = [f"### 🧪 Testlauf abgeschlossen\n**Gültige Zeilen:** {len(batch.lines)} in {len(groups)} unabhängigen Gruppen"]
+            if batch.parse_errors:
+                report_parts.append(f"**Ungültig:** {len(batch.parse_errors)}")
+                error_details = "\n".join([f"Zeile {ln}: `{line}` -> {err}" for ln, line, err in batch.parse_errors[:10]])
+                report_parts.append(f"\n**Fehlerdetails (max. 10):**\n{error_details}")
+            full_report = "\n".join(report_parts)
+            if len(full_report) > 1900:
+                full_report = full_report[:1900] + "\n..."
+            return await interaction.followup.send(full_report, ephemeral=True)
+
+        progress_message = await interaction.followup.send(batch.progress_text(), ephemeral=True, wait=True)
+        progress_task = asyncio.create_task(self._report_progress(progress_message, batch))
+        try:
+            await batch.run()
+        finally:
+            progress_task.cancel()
+        errors, successes = batch.errors, batch.successes
 
         # --- Abschlussbericht ---
         report_parts = [f"### ✅ Verarbeitung abgeschlossen\n**Erfolgreich:** {len(successes)}"]
@@ -103,18 +153,36 @@ class MassCommandsCog(commands.Cog):
             error_details = "\n".join([f"Zeile {ln}: `{line}` -> {err}" for ln, line, err in errors[:10]])
             report_parts.append(f"\n**Fehlerdetails (max. 10):**\n{error_details}")
         
+        report_parts.append("\n*Das vollständige Ergebnis je Zeile steht in der angehängten CSV-Datei.*")
         full_report = "\n".join(report_parts)
         if len(full_report) > 1900:
             full_report = full_report[:1900] + "\n..."
 
-        await interaction.followup.send(full_report, ephemeral=True)
+        files = [discord.File(io.BytesIO(batch.results_csv().encode("utf-8")), filename="masscommands_ergebnis.csv")]
+        if errors:
+            files.append(discord.File(io.BytesIO(batch.failed_lines_text().encode("utf-8")), filename="masscommands_fehlgeschlagen.txt"))
+        try:
+            await progress_message.edit(content=f"✅ **MassCommands abgeschlossen:** {batch.completed}/{len(batch.lines)} Zeilen verarbeitet.")
+        except discord.HTTPException: pass
+        await interaction.followup.send(full_report, files=files, ephemeral=True)
+
+    async def _report_progress(self, message: discord.WebhookMessage, batch: MassCommandBatch):
+        """Aktualisiert die Fortschrittsnachricht in festen Abständen."""
+        last_completed = -1
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+            if batch.completed == last_completed: continue
+            last_completed = batch.completed
+            try:
+                await message.edit(content=batch.progress_text())
+            except discord.HTTPException: pass
 
     @mass_group.command(name="format", description="Zeigt das Format aller MassCommands-Module.")
     @has_permission("masscommands.format")
     @log_on_completion
     async def mass_format(self, interaction: Interaction):
         await interaction.response.defer(ephemeral=True)
-        self.load_mass_command_modules() # Lade Module neu, um Änderungen zu erfassen
+        self.load_mass_command_modules() # Lädt nur geänderte Module neu
 
         if not self.command_modules:
             return await interaction.followup.send("Keine Mass-Command-Module geladen.", ephemeral=True)
@@ -132,5 +200,26 @@ class MassCommandsCog(commands.Cog):
         
         await interaction.followup.send("\n".join(help_text_parts), ephemeral=True)
 
+    @mass_group.command(name="reload", description="Lädt geänderte MassCommands-Module neu.")
+    @app_commands.describe(alle="Alle Module unabhängig von Änderungen neu laden")
+    @has_permission("masscommands.reload")
+    @log_on_completion
+    async def mass_reload(self, interaction: Interaction, alle: bool = False):
+        await interaction.response.defer(ephemeral=True)
+        report = self.load_mass_command_modules(force=alle)
+
+        def format_files(files: list) -> str:
+            return ", ".join(f"`{f}` ({report['dauer'][f] * 1000:.0f}ms)" for f in files)
+
+        report_parts = ["### 🔄 MassCommands-Module geladen"]
+        if report["neu"]: report_parts.append(f"**Neu:** {format_files(report['neu'])}")
+        if report["geaendert"]: report_parts.append(f"**Neu geladen:** {format_files(report['geaendert'])}")
+        if report["entfernt"]: report_parts.append(f"**Entfernt:** {', '.join(f'`{f}`' for f in report['entfernt'])}")
+        report_parts.append(f"**Unverändert:** {len(report['unveraendert'])}")
+        if report["fehler"]:
+            report_parts.append("**Fehler:**\n" + "\n".join(f"`{f}` -> {err}" for f, err in report["fehler"]))
+
+        await interaction.followup.send("\n".join(report_parts)[:1900], ephemeral=True)
+
 async def setup(bot: "MyBot"):
     await bot.add_cog(MassCommandsCog(bot))
\ No newline at end of file
@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from main import MyBot
+    from cogs.masscommands._batch import MassCommandBatch
     from services.kassen_service import KassenService
     from services.permission_service import PermissionService
     from services.personal_service import PersonalService
@@ -15,13 +16,16 @@ SYNTAX = """
 kasse einzahlen <geld> <schwarzgeld> <Grund>
 kasse auszahlen <user_id_oder_dn> <geld> <schwarzgeld> <Grund>
 """
+SUMMARY_DESCRIPTION_LIMIT = 3800 # Discord erlaubt max. 4096 Zeichen pro Embed-Beschreibung
 
 class MC_KasseModule:
     def __init__(self, bot: "MyBot"):
         self.bot = bot
 
-    async def _resolve_user(self, identifier: str) -> discord.User | None:
-        """Findet einen User anhand von ID oder DN."""
+    async def _resolve_user(self, identifier: str, batch: "MassCommandBatch" = None) -> discord.User | None:
+        """Findet einen User anhand von ID oder DN (bevorzugt aus den vorab aufgelösten Kennungen)."""
+        if batch and batch.members.get(identifier):
+            return batch.members[identifier]
         user_id = None
         if identifier.isdigit() and len(identifier) > 5:
             user_id = int(identifier)
@@ -39,8 +43,27 @@ class MC_KasseModule:
                 return None
         return None
 
+    def validate(self, interaction: discord.Interaction, tokens: list[str]) -> str | None:
+        """Prüft eine Zeile vor der Ausführung (Format & Berechtigung)."""
+        sub_cmd = tokens[1].lower() if len(tokens) > 1 else ""
+        if sub_cmd not in ("einzahlen", "auszahlen"): return f"Unbekanntes Kassen-Subkommando: '{sub_cmd}'"
+        if sub_cmd == "einzahlen" and len(tokens) < 5: return "Format: kasse einzahlen <geld> <schwarzgeld> <Grund>"
+        if sub_cmd == "auszahlen" and len(tokens) < 6: return "Format: kasse auszahlen <user_id_oder_dn> <geld> <schwarzgeld> <Grund>"
+        permission_service: PermissionService = self.bot.get_cog("PermissionService")
+        if not permission_service or not permission_service.has_permission(interaction.user, f"kasse.{sub_cmd}"):
+            return f"Keine Berechtigung für 'kasse.{sub_cmd}'."
+        return None
+
+    def group_keys(self, tokens: list[str]) -> set[str]:
+        """Alle Buchungen teilen sich den Kassenstand und laufen daher nacheinander."""
+        return {"kasse"}
+
+    def identifiers(self, tokens: list[str]) -> set[str]:
+        """Mitglieds-Kennungen der Zeile, die der Batch vorab auflösen kann."""
+        return {tokens[2]} if tokens[1].lower() == "auszahlen" else set()
+
     async def handle(self, interaction: discord.Interaction, tokens: list[str],
-                      line: str, line_no: int, errors: list, successes: list):
+                      line: str, line_no: int, errors: list, successes: list, batch: "MassCommandBatch" = None):
 
         sub_cmd = tokens[1].lower() if len(tokens) > 1 else ""
         
@@ -61,9 +84,8 @@ class MC_KasseModule:
                 reason = " ".join(tokens[4:])
                 if not reason: raise ValueError("Ein Grund ist erforderlich.")
                 geld, schwarzgeld = int(geld_str), int(schwarzgeld_str)
-                
-                await kassen_service.update_kassenstand(geld, schwarzgeld)
-                
+                booking = {"geld_diff": geld, "schwarzgeld_diff": schwarzgeld, "typ": "einzahlung", "grund": reason,
+                           "ausgefuehrt_von": interaction.user.id, "empfaenger": None}
                 embed = discord.Embed(
                     title="💵 Einzahlung",
                     description=f"👤 **Von:** {interaction.user.mention}\n"
@@ -72,9 +94,7 @@ class MC_KasseModule:
                     color=discord.Color.green()
                 )
                 embed.add_field(name="📌 Grund", value=reason, inline=False)
-                
-                await kassen_service.log_transaction(embed)
-                successes.append((line_no, f"Einzahlung von {geld}$ / {schwarzgeld}$ verbucht."))
+                success_message = f"Einzahlung von {geld}$ / {schwarzgeld}$ verbucht."
 
             elif sub_cmd == "auszahlen":
                 if len(tokens) < 6: raise ValueError("Format: kasse auszahlen <user_id_oder_dn> <geld> <schwarzgeld> <Grund>")
@@ -84,15 +104,12 @@ class MC_KasseModule:
                 if not reason: raise ValueError("Ein Grund ist erforderlich.")
                 geld, schwarzgeld = int(geld_str), int(schwarzgeld_str)
                 
-                user = await self._resolve_user(identifier)
+                user = await self._resolve_user(identifier, batch)
                 if not user:
                     raise ValueError(f"User mit Kennung '{identifier}' nicht gefunden.")
 
-                kassenstand = await kassen_service.get_kassenstand()
-                if geld > kassenstand.get('geld', 0) or schwarzgeld > kassenstand.get('schwarzgeld', 0):
-                    raise ValueError("Nicht genug Geld in der Kasse.")
-                
-                await kassen_service.update_kassenstand(-geld, -schwarzgeld)
+                booking = {"geld_diff": -geld, "schwarzgeld_diff": -schwarzgeld, "typ": "auszahlung", "grund": reason,
+                           "ausgefuehrt_von": interaction.user.id, "empfaenger": user.id, "empfaenger_mention": user.mention}
                 embed = discord.Embed(
                     title="💸 Auszahlung",
                     description=f"👤 **Von:** {interaction.user.mention}\n"
@@ -102,11 +119,21 @@ class MC_KasseModule:
                                 f"📌 **Grund:** {reason}".replace(",", "."),
                     color=discord.Color.red()
                 )
-                await kassen_service.log_transaction(embed)
-                successes.append((line_no, f"Auszahlung von {geld}$ / {schwarzgeld}$ an {user.mention} verbucht."))
+                success_message = f"Auszahlung von {geld}$ / {schwarzgeld}$ an {user.mention} verbucht."
             
             else:
-                errors.append((line_no, line, f"Unbekanntes Kassen-Subkommando: '{sub_cmd}'"))
+                return errors.append((line_no, line, f"Unbekanntes Kassen-Subkommando: '{sub_cmd}'"))
+
+            if batch:
+                # Alle Buchungen der Datei werden in `finalize` gemeinsam verbucht
+                booking.update(line_no=line_no, success_message=success_message)
+                return batch.module_state.setdefault(COMMAND_NAME, []).append(booking)
+
+            result = await kassen_service.book(booking["geld_diff"], booking["schwarzgeld_diff"], booking["typ"], booking["grund"], booking["ausgefuehrt_von"], booking["empfaenger"])
+            if not result.get("success"):
+                raise ValueError(result.get("error", "Buchung fehlgeschlagen."))
+            await kassen_service.log_transaction(embed)
+            successes.append((line_no, success_message))
 
             if kassen_commands_cog := self.bot.get_cog("KassenCommands"):
                 await kassen_commands_cog.send_current_kassenstand()
@@ -114,4 +141,53 @@ class MC_KasseModule:
         except ValueError as e:
             errors.append((line_no, line, f"Formatfehler oder ungültiger Wert: {e}"))
         except Exception as e:
-            errors.append((line_no, line, f"Allgemeiner Fehler: {e}"))
\ No newline at end of file
+            errors.append((line_no, line, f"Allgemeiner Fehler: {e}"))
+
+    async def finalize(self, interaction: discord.Interaction, batch: "MassCommandBatch"):
+        """Verbucht alle Buchungen der Datei in einer Transaktion mit einer Sammel-Lognachricht."""
+        bookings = batch.module_state.pop(COMMAND_NAME, [])
+        if not bookings: return
+        kassen_service: KassenService = self.bot.get_cog("KassenService")
+
+        result = await kassen_service.book_many(bookings)
+        if not result.get("success"):
+            for booking in bookings:
+                line = batch.line(booking["line_no"])
+                line.errors.append((line.line_no, line.raw, result.get("error", "Buchung fehlgeschlagen.")))
+            return
+
+        booked = []
+        for booking, booking_result in zip(bookings, result["results"]):
+            line = batch.line(booking["line_no"])
+            if booking_result["success"]:
+                line.successes.append((line.line_no, booking["success_message"]))
+                booked.append(booking)
+            else:
+                line.errors.append((line.line_no, line.raw, f"Formatfehler oder ungültiger Wert: {booking_result['error']}"))
+        if not booked: return
+
+        await kassen_service.log_transaction(self._build_summary_embed(interaction, booked))
+        if kassen_commands_cog := self.bot.get_cog("KassenCommands"):
+            await kassen_commands_cog.send_current_kassenstand()
+
+    def _build_summary_embed(self, interaction: discord.Interaction, booked: list) -> discord.Embed:
+        """Fasst alle Buchungen einer MassCommands-Datei in einer Lognachricht zusammen."""
+        geld_sum = sum(b["geld_diff"] for b in booked)
+        schwarzgeld_sum = sum(b["schwarzgeld_diff"] for b in booked)
+        entries = []
+        for b in booked:
+            ziel = f" an {b['empfaenger_mention']}" if b.get("empfaenger_mention") else ""
+            entries.append(f"{'💵' if b['typ'] == 'einzahlung' else '💸'} {b['geld_diff']:+,}$ / {b['schwarzgeld_diff']:+,}${ziel} – {b['grund']}".replace(",", "."))
+
+        description = ""
+        for index, entry in enumerate(entries):
+            if len(description) + len(entry) > SUMMARY_DESCRIPTION_LIMIT:
+                description += f"… und {len(entries) - index} weitere Buchungen"
+                break
+            description += entry + "\n"
+
+        embed = discord.Embed(title=f"🧾 Sammelbuchung ({len(booked)} Buchungen)", description=description, color=discord.Color.blue())
+        embed.add_field(name="👤 Von", value=interaction.user.mention, inline=True)
+        embed.add_field(name="💰 Geld gesamt", value=f"{geld_sum:+,}$".replace(",", "."), inline=True)
+        embed.add_field(name="🖤 Schwarzgeld gesamt", value=f"{schwarzgeld_sum:+,}$".replace(",", "."), inline=True)
+        return embed
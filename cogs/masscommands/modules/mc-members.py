@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING, List
 
 if TYPE_CHECKING:
     from main import MyBot
+    from cogs.masscommands._batch import MassCommandBatch
     from services.permission_service import PermissionService
 
 # --- Modul-Konfiguration & Konstanten ---
@@ -22,6 +23,11 @@ Rang-Keys (1-17):
 14=Hauptmann, 15=Major, 16=Oberstleutnant, 17=Oberst
 """
 
+# Mindestanzahl an Tokens je Subkommando (inkl. "member <subkommando>")
+MIN_TOKENS = {"add": 6, "remove": 3, "setunit": 5, "changerank": 4, "changedn": 4}
+# Subkommandos, die DNs anlegen, entfernen oder verschieben
+STRUCTURAL_COMMANDS = {"add", "remove", "changedn"}
+
 class MC_MemberModule:
     def __init__(self, bot: "MyBot"):
         self.bot = bot
@@ -52,12 +58,34 @@ class MC_MemberModule:
                     results = await cursor.fetchall()
                     return [dict(zip([desc[0] for desc in cursor.description], row)) for row in results]
 
-    async def _resolve_user(self, guild: discord.Guild, identifier: str) -> discord.Member | None:
+    async def _execute_transaction(self, statements: List[tuple], disable_foreign_keys: bool = False):
+        """Führt mehrere Statements in einer Transaktion aus (alles oder nichts)."""
+        async with self.bot.db_pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    if disable_foreign_keys: await cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
+                    try:
+                        for query, args in statements:
+                            await cursor.execute(query, args)
+                    finally:
+                        if disable_foreign_keys: await cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def _resolve_user(self, guild: discord.Guild, identifier: str, batch: "MassCommandBatch" = None) -> discord.Member | None:
         """Findet ein Mitglied auf dem Server anhand von DN oder ID."""
+        if batch and identifier in batch.members:
+            return batch.members[identifier]
         user_id = None
         if identifier.isdigit() and len(identifier) > 15:
             # Es ist wahrscheinlich eine Discord-ID
             user_id = int(identifier)
+        elif batch and batch.dn_registry_loaded and identifier.isdigit():
+            # DN über das DN-Verzeichnis des Batches auflösen (bleibt bei DN-Änderungen aktuell)
+            user_id = batch.discord_id_by_dn.get(int(identifier))
         else:
             # Es könnte eine DN sein, versuche Discord-ID aus DB zu holen
             details = await self._execute_query(
@@ -69,6 +97,8 @@ class MC_MemberModule:
                 user_id = details.get('discord_id')
         
         if user_id:
+            if member := guild.get_member(user_id):
+                return member
             try:
                 return await guild.fetch_member(user_id)
             except discord.NotFound:
@@ -93,13 +123,47 @@ class MC_MemberModule:
             return guild.get_role(int(identifier))
         return discord.utils.get(guild.roles, name=identifier)
 
-    async def _check_dn_exists(self, dn: int) -> bool:
-        """Prüft ob eine DN bereits existiert."""
+    async def _check_dn_exists(self, dn: int, batch: "MassCommandBatch" = None) -> bool:
+        """Prüft ob eine DN bereits existiert (im Batch über das vorab geladene DN-Verzeichnis)."""
+        if batch and (exists := batch.dn_exists(dn)) is not None:
+            return exists
         result = await self._execute_query("SELECT dn FROM members WHERE dn = %s", (dn,), fetch="one")
         return result is not None
 
+    def validate(self, interaction: discord.Interaction, tokens: list[str]) -> str | None:
+        """Prüft eine Zeile vor der Ausführung (Format & Berechtigung)."""
+        if len(tokens) < 3: return "Zu wenige Argumente für 'member'."
+        sub_cmd = tokens[1].lower()
+        if sub_cmd not in MIN_TOKENS: return f"Unbekanntes Member-Subkommando: '{sub_cmd}'"
+        if len(tokens) < MIN_TOKENS[sub_cmd]: return f"Formatfehler: Zu wenige Argumente für '{sub_cmd}'."
+        permission_service: PermissionService = self.bot.get_cog("PermissionService")
+        if not permission_service or not permission_service.has_permission(interaction.user, f"mitglieder.{sub_cmd}"):
+            return f"Keine Berechtigung für 'mitglieder.{sub_cmd}'."
+        return None
+
+    def group_keys(self, tokens: list[str]) -> set[str]:
+        """Kennungen, deren Zeilen in Dateireihenfolge nacheinander laufen müssen."""
+        sub_cmd = tokens[1].lower()
+        if sub_cmd == "add": return {tokens[2], tokens[5]}
+        if sub_cmd == "changedn": return {tokens[2], tokens[3]}
+        return {tokens[2]}
+
+    def identifiers(self, tokens: list[str]) -> set[str]:
+        """Mitglieds-Kennungen der Zeile, die der Batch vorab auflösen kann."""
+        sub_cmd = tokens[1].lower()
+        if sub_cmd == "add": return {tokens[5]}
+        if sub_cmd == "setunit": return {tokens[2]}
+        return set()
+
+    def volatile_keys(self, tokens: list[str]) -> set[str]:
+        """Kennungen, deren Zuordnung sich durch diese Zeile ändert."""
+        sub_cmd = tokens[1].lower()
+        if sub_cmd in ("add", "remove"): return {tokens[2]}
+        if sub_cmd == "changedn": return {tokens[2], tokens[3]}
+        return set()
+
     async def handle(self, interaction: discord.Interaction, tokens: list[str],
-                     line: str, line_no: int, errors: list, successes: list):
+                     line: str, line_no: int, errors: list, successes: list, batch: "MassCommandBatch" = None):
 
         if len(tokens) < 3:
             return errors.append((line_no, line, "Zu wenige Argumente für 'member'."))
@@ -111,6 +175,10 @@ class MC_MemberModule:
             return errors.append((line_no, line, f"Keine Berechtigung für 'mitglieder.{sub_cmd}'."))
 
         try:
+            if batch and sub_cmd in STRUCTURAL_COMMANDS:
+                # Vorgemerkte Updates müssen vor DN-Änderungen geschrieben sein
+                await batch.flush()
+
             if sub_cmd == "add":
                 if len(tokens) < 6: 
                     raise ValueError("Format: add <dn> \"<name>\" <rang_key> <user_id>")
@@ -123,11 +191,11 @@ class MC_MemberModule:
                 dn = int(dn_str)
                 
                 # Prüfe ob DN bereits existiert
-                if await self._check_dn_exists(dn):
+                if await self._check_dn_exists(dn, batch):
                     raise ValueError(f"Die Dienstnummer `{dn}` ist bereits vergeben.")
                 
                 # User finden
-                user = await self._resolve_user(interaction.guild, user_id_str)
+                user = await self._resolve_user(interaction.guild, user_id_str, batch)
                 if not user:
                     raise ValueError(f"User mit ID '{user_id_str}' nicht gefunden.")
                 
@@ -142,11 +210,14 @@ class MC_MemberModule:
                     raise ValueError(f"Die Rolle {rank_role.mention} ist kein gültiger Rang.")
                 
                 # In Datenbank einfügen
-                await self._execute_query(
-                    "INSERT INTO members (dn, name, rank, hired_at, discord_id) VALUES (%s, %s, %s, NOW(), %s)",
-                    (dn, name, rank_id, user.id)
-                )
-                await self._execute_query("INSERT INTO units (dn) VALUES (%s)", (dn,))
+                await self._execute_transaction([
+                    ("INSERT INTO members (dn, name, rank, hired_at, discord_id) VALUES (%s, %s, %s, NOW(), %s)", (dn, name, rank_id, user.id)),
+                    ("INSERT INTO units (dn) VALUES (%s)", (dn,)),
+                ])
+                if personal_service := self.bot.get_cog("PersonalService"):
+                    personal_service.dn_allocator.claim(str(dn))
+                    personal_service.dn_allocator.commit(str(dn))
+                if batch: batch.set_member_dn(user.id, dn)
                 
                 # Discord-Rollen setzen
                 try:
@@ -167,16 +238,17 @@ class MC_MemberModule:
                 dn = int(dn_str)
                 
                 # Prüfe ob DN existiert
-                if not await self._check_dn_exists(dn):
+                if not await self._check_dn_exists(dn, batch):
                     raise ValueError(f"Die Dienstnummer `{dn}` wurde nicht gefunden.")
                 
                 # Aus Datenbank entfernen
-                async with self.bot.db_pool.acquire() as conn:
-                    async with conn.cursor() as cursor:
-                        await cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
-                        await cursor.execute("DELETE FROM units WHERE dn = %s", (dn,))
-                        await cursor.execute("DELETE FROM members WHERE dn = %s", (dn,))
-                        await cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+                await self._execute_transaction([
+                    ("DELETE FROM units WHERE dn = %s", (dn,)),
+                    ("DELETE FROM members WHERE dn = %s", (dn,)),
+                ], disable_foreign_keys=True)
+                if personal_service := self.bot.get_cog("PersonalService"):
+                    personal_service.dn_allocator.release(str(dn))
+                if batch: batch.forget_dn(dn)
 
             elif sub_cmd == "setunit":
                 if len(tokens) < 5: 
@@ -185,15 +257,18 @@ class MC_MemberModule:
                 user_identifier, unit_role_id_str, status_str = tokens[2], tokens[3], tokens[4]
                 
                 # User finden
-                user = await self._resolve_user(interaction.guild, user_identifier)
+                user = await self._resolve_user(interaction.guild, user_identifier, batch)
                 if not user:
                     raise ValueError(f"User mit Kennung '{user_identifier}' nicht gefunden.")
                 
-                # DN des Users ermitteln
-                user_data = await self._execute_query("SELECT dn FROM members WHERE discord_id = %s", (user.id,), fetch="one")
-                if not user_data:
+                # DN des Users ermitteln (im Batch aus dem DN-Verzeichnis, ohne eigene Abfrage)
+                if batch and batch.dn_registry_loaded:
+                    dn = batch.dn_for_user(user.id)
+                else:
+                    user_data = await self._execute_query("SELECT dn FROM members WHERE discord_id = %s", (user.id,), fetch="one")
+                    dn = user_data['dn'] if user_data else None
+                if not dn:
                     raise ValueError(f"{user.mention} ist nicht in der Datenbank registriert.")
-                dn = user_data['dn']
                 
                 # Unit-Rolle finden
                 unit_role = self._resolve_unit_role(interaction.guild, unit_role_id_str)
@@ -214,18 +289,22 @@ class MC_MemberModule:
                 else:
                     raise ValueError("Status muss 'true/false', '1/0' oder 'aktiv/inaktiv' sein.")
                 
-                # Datenbank aktualisieren
+                # Discord-Rolle erst nach dem Datenbank-Update setzen
+                async def apply_unit_role():
+                    try:
+                        if status:
+                            await user.add_roles(unit_role, reason=f"Unit-Status gesetzt: {unit_role.name}")
+                        else:
+                            await user.remove_roles(unit_role, reason=f"Unit-Status entfernt: {unit_role.name}")
+                    except discord.HTTPException as e:
+                        return successes.append((line_no, f"DB-Update erfolgreich, aber Rolle konnte nicht geändert werden: {e}"))
+                    successes.append((line_no, f"Aktion '{sub_cmd}' erfolgreich ausgeführt."))
+
+                if batch:
+                    # Wird gebündelt mit den übrigen Zeilen der Datei geschrieben
+                    return await batch.stage_write(line_no, "units", unit_name, dn, status, f"Aktion '{sub_cmd}' erfolgreich ausgeführt.", apply_unit_role)
                 await self._execute_query(f"UPDATE units SET `{unit_name}` = %s WHERE dn = %s", (status, dn))
-                
-                # Discord-Rolle setzen
-                try:
-                    if status:
-                        await user.add_roles(unit_role, reason=f"Unit-Status gesetzt: {unit_role.name}")
-                    else:
-                        await user.remove_roles(unit_role, reason=f"Unit-Status entfernt: {unit_role.name}")
-                except discord.HTTPException as e:
-                    successes.append((line_no, f"DB-Update erfolgreich, aber Rolle konnte nicht geändert werden: {e}"))
-                    return
+                return await apply_unit_role()
 
             elif sub_cmd == "changerank":
                 if len(tokens) < 4: 
@@ -238,7 +317,7 @@ class MC_MemberModule:
                 dn = int(dn_str)
                 
                 # Prüfe ob DN existiert
-                if not await self._check_dn_exists(dn):
+                if not await self._check_dn_exists(dn, batch):
                     raise ValueError(f"Die Dienstnummer `{dn}` wurde nicht gefunden.")
                 
                 # Neue Rang-Rolle über Rang-Key finden
@@ -252,6 +331,8 @@ class MC_MemberModule:
                     raise ValueError(f"{new_rank_role.mention} ist kein gültiger Rang.")
                 
                 # Datenbank aktualisieren
+                if batch:
+                    return await batch.stage_write(line_no, "members", "rank", dn, new_rank_id, f"Aktion '{sub_cmd}' erfolgreich ausgeführt.")
                 await self._execute_query("UPDATE members SET rank = %s WHERE dn = %s", (new_rank_id, dn))
 
             elif sub_cmd == "changedn":
@@ -266,20 +347,23 @@ class MC_MemberModule:
                 current_dn, new_dn = int(current_dn_str), int(new_dn_str)
                 
                 # Prüfe ob aktuelle DN existiert
-                if not await self._check_dn_exists(current_dn):
+                if not await self._check_dn_exists(current_dn, batch):
                     raise ValueError(f"Die aktuelle DN `{current_dn}` wurde nicht gefunden.")
                 
                 # Prüfe ob neue DN bereits vergeben ist
-                if await self._check_dn_exists(new_dn):
+                if await self._check_dn_exists(new_dn, batch):
                     raise ValueError(f"Die neue DN `{new_dn}` ist bereits vergeben.")
                 
                 # Datenbank aktualisieren
-                async with self.bot.db_pool.acquire() as conn:
-                    async with conn.cursor() as cursor:
-                        await cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
-                        await cursor.execute("UPDATE members SET dn = %s WHERE dn = %s", (new_dn, current_dn))
-                        await cursor.execute("UPDATE units SET dn = %s WHERE dn = %s", (new_dn, current_dn))
-                        await cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+                await self._execute_transaction([
+                    ("UPDATE members SET dn = %s WHERE dn = %s", (new_dn, current_dn)),
+                    ("UPDATE units SET dn = %s WHERE dn = %s", (new_dn, current_dn)),
+                ], disable_foreign_keys=True)
+                if personal_service := self.bot.get_cog("PersonalService"):
+                    personal_service.dn_allocator.release(str(current_dn))
+                    personal_service.dn_allocator.claim(str(new_dn))
+                    personal_service.dn_allocator.commit(str(new_dn))
+                if batch: batch.move_dn(current_dn, new_dn)
 
             else:
                 raise ValueError(f"Unbekanntes Member-Subkommando: '{sub_cmd}'")
@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING, List
 
 if TYPE_CHECKING:
     from main import MyBot
+    from cogs.masscommands._batch import MassCommandBatch
     from services.personal_service import PersonalService
     from services.permission_service import PermissionService
 
@@ -19,14 +20,18 @@ personal rename <dn_oder_id> "<neuer_name>"
 """
 PERSONAL_CHANNEL_ID = 1097625981671448698
 MGMT_ID = 1097648080020574260
+# Mindestanzahl an Tokens je Subkommando (inkl. "personal <subkommando>")
+MIN_TOKENS = {"einstellen": 6, "kuendigen": 4, "uprank": 5, "derank": 5, "neuedn": 4, "rename": 4}
 
 class MC_PersonalModule:
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.personal_service: PersonalService = self.bot.get_cog("PersonalService")
 
-    async def _resolve_user(self, guild: discord.Guild, identifier: str) -> discord.Member | None:
+    async def _resolve_user(self, guild: discord.Guild, identifier: str, batch: "MassCommandBatch" = None) -> discord.Member | None:
         """Findet ein Mitglied auf dem Haupt-Server anhand von DN oder ID."""
+        if batch and identifier in batch.members:
+            return batch.members[identifier]
         if not self.personal_service: return None
         
         user_id = None
@@ -52,8 +57,36 @@ class MC_PersonalModule:
             return guild.get_role(int(identifier))
         return discord.utils.get(guild.roles, name=identifier)
 
+    def validate(self, interaction: discord.Interaction, tokens: list[str]) -> str | None:
+        """Prüft eine Zeile vor der Ausführung (Format & Berechtigung)."""
+        if len(tokens) < 3: return "Zu wenige Argumente für 'personal'."
+        sub_cmd = tokens[1].lower()
+        if sub_cmd not in MIN_TOKENS: return f"Unbekanntes Personal-Subkommando: '{sub_cmd}'"
+        if len(tokens) < MIN_TOKENS[sub_cmd]: return f"Formatfehler: Zu wenige Argumente für '{sub_cmd}'."
+        permission_service: PermissionService = self.bot.get_cog("PermissionService")
+        if not permission_service or not permission_service.has_permission(interaction.user, f"personal.{sub_cmd}"):
+            return f"Keine Berechtigung für 'personal.{sub_cmd}'."
+        return None
+
+    def group_keys(self, tokens: list[str]) -> set[str]:
+        """Kennungen, deren Zeilen in Dateireihenfolge nacheinander laufen müssen."""
+        if tokens[1].lower() == "neuedn": return {tokens[2], tokens[3]}
+        return {tokens[2]}
+
+    def identifiers(self, tokens: list[str]) -> set[str]:
+        """Mitglieds-Kennungen der Zeile, die der Batch vorab auflösen kann."""
+        return {tokens[2]}
+
+    def volatile_keys(self, tokens: list[str]) -> set[str]:
+        """Kennungen, deren Zuordnung sich durch diese Zeile ändert."""
+        sub_cmd = tokens[1].lower()
+        if sub_cmd == "neuedn": return {tokens[2], tokens[3]}
+        # Uprank/Derank kann über einen Divisionswechsel die DN ändern
+        if sub_cmd in ("kuendigen", "uprank", "derank"): return {tokens[2]}
+        return set()
+
     async def handle(self, interaction: discord.Interaction, tokens: list[str],
-                      line: str, line_no: int, errors: list, successes: list):
+                      line: str, line_no: int, errors: list, successes: list, batch: "MassCommandBatch" = None):
 
         if len(tokens) < 3:
             return errors.append((line_no, line, "Zu wenige Argumente für 'personal'."))
@@ -68,25 +101,30 @@ class MC_PersonalModule:
              return errors.append((line_no, line, f"Keine Berechtigung für 'personal.{sub_cmd}'."))
 
         try:
+            if batch:
+                # Personalaktionen ändern Rang/DN direkt; vorgemerkte Updates müssen vorher geschrieben sein
+                await batch.flush()
+
             result = None
             user = None
 
             if sub_cmd == "einstellen":
                 if len(tokens) < 6: raise ValueError("Format: einstellen <user_id> \"<name>\" <rang_id> \"<grund>\"")
-                user = await self._resolve_user(interaction.guild, tokens[2])
+                user = await self._resolve_user(interaction.guild, tokens[2], batch)
                 name, rank_id_str, reason = tokens[3], tokens[4], tokens[5]
                 rank_role = self._resolve_role(interaction.guild, rank_id_str)
                 if not user or not rank_role: raise ValueError("User oder Rang konnte nicht gefunden werden.")
                 
                 result = await self.personal_service.hire_member(interaction.guild, user, name, rank_role, reason)
                 if result.get("success"):
+                    if batch and result.get("dn"): batch.set_member_dn(user.id, result['dn'])
                     embed = discord.Embed(title="🆕 Einstellung", color=discord.Color.green(), description=f"**Hiermit wird {result['user'].mention} als {result['rank_role'].mention} eingestellt.**\n\n**Grund:** {result['reason']}\n**Dienstnummer:** `{result['dn']}`\n\nHochachtungsvoll,\n<@&{MGMT_ID}>").set_footer(text=f"U.S. ARMY Management | ausgeführt von {interaction.user.display_name}")
                     if channel := self.bot.get_channel(PERSONAL_CHANNEL_ID):
                         await channel.send(result['user'].mention, embed=embed)
 
             else:
                 user_identifier = tokens[2]
-                user = await self._resolve_user(interaction.guild, user_identifier)
+                user = await self._resolve_user(interaction.guild, user_identifier, batch)
                 if not user: raise ValueError(f"User mit Kennung '{user_identifier}' nicht gefunden.")
 
                 if sub_cmd == "kuendigen":
@@ -94,6 +132,7 @@ class MC_PersonalModule:
                     reason = tokens[3]
                     result = await self.personal_service.fire_member(user, reason)
                     if result.get("success"):
+                        if batch: batch.forget_dn(result['dn'])
                         embed = discord.Embed(title="📢 Kündigung", color=discord.Color.red(), description=f"**Hiermit wird {result['user'].mention} offiziell aus der Army entlassen.**\n\n**Grund:** {result['reason']}\n**Dienstnummer:** `{result['dn']}`\n\nHochachtungsvoll,\n<@&{MGMT_ID}>").set_footer(text=f"U.S. ARMY Management | ausgeführt von {interaction.user.display_name}")
                         if channel := self.bot.get_channel(PERSONAL_CHANNEL_ID):
                             await channel.send(result['user'].mention, embed=embed)
@@ -110,6 +149,7 @@ class MC_PersonalModule:
                         result = await self.personal_service.demote_member(interaction.guild, user, new_rank_role, reason)
 
                     if result.get("success"):
+                        if batch and result.get("dn_changed"): batch.set_member_dn(user.id, result['new_dn'])
                         is_uprank = sub_cmd == "uprank"
                         title = "Beförderung" if is_uprank else "Degradierung"
                         color = discord.Color.green() if is_uprank else discord.Color.red()
@@ -126,6 +166,7 @@ class MC_PersonalModule:
                     new_dn = tokens[3]
                     result = await self.personal_service.change_dn(user, new_dn)
                     if result.get("success"):
+                         if batch: batch.set_member_dn(user.id, result['new_dn'])
                          embed = discord.Embed(title="🔄 Dienstnummer Änderung", color=discord.Color.blue(), description=f"**Dienstnummer-Update für {user.mention}!**\n\n**Alte DN:** `{result['old_dn']}`\n**Neue DN:** `{result['new_dn']}`").set_footer(text=f"U.S. ARMY Management | ausgeführt von {interaction.user.display_name}")
                          if channel := self.bot.get_channel(PERSONAL_CHANNEL_ID):
                             await channel.send(user.mention, embed=embed)
@@ -3,9 +3,9 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from typing import TYPE_CHECKING, Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
 import yaml
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from utils.decorators import has_permission, log_on_completion
 
@@ -13,6 +13,76 @@ if TYPE_CHECKING:
     from main import MyBot
     from services.sanction_service import SanctionService
 
+class SanctionPaginationView(discord.ui.View):
+    """Blättert per Keyset-Pagination durch Sanktionen, es wird immer nur die angezeigte Seite geladen."""
+    def __init__(self, interaction: discord.Interaction, service: "SanctionService", title: str, filters: Dict[str, Any]):
+        super().__init__(timeout=180)
+        self.interaction = interaction
+        self.service = service
+        self.title = title
+        self.filters = filters
+        self.items_per_page = 10
+        self.cursors: List[Tuple[datetime, int] | None] = [None] # Startschlüssel je besuchter Seite
+        self.current_page = 0
+        self.has_next = False
+        self.alle = filters.get("erledigt") is None
+
+    async def show_page(self, page_number: int):
+        self.current_page = page_number
+        rows = await self.service.get_sanctions_page(after=self.cursors[page_number], limit=self.items_per_page, **self.filters)
+        self.has_next = len(rows) > self.items_per_page
+        sanctions = rows[:self.items_per_page]
+        if self.has_next and len(self.cursors) == page_number + 1:
+            self.cursors.append((sanctions[-1]['erstellt_am'], sanctions[-1]['id']))
+
+        embed = discord.Embed(title=self.title, color=discord.Color.blue() if self.alle else discord.Color.orange())
+        if not sanctions:
+            embed.description = "ℹ️ Keine Sanktionen für diese Filter gefunden."
+        for sanction in sanctions:
+            status_icon = "✅" if sanction['erledigt'] else "⏳"
+            erledigt_text = ""
+            
+            if sanction['erledigt']:
+                erledigt_am = sanction['erledigt_am'].strftime("%d.%m.%Y") if sanction['erledigt_am'] else "Unbekannt"
+                erledigt_text = f"\n**Erledigt:** {erledigt_am} von {sanction['erledigt_von_name']}"
+            
+            field_value = (
+                f"**Strafe:** {sanction['strafe']}\n"
+                f"**Grund:** {sanction['grund']}\n"
+                f"**Fällig:** {sanction['zahlungsdatum']}\n"
+                f"**Erstellt:** {sanction['erstellt_am'].strftime('%d.%m.%Y')} von {sanction['erstellt_von_name']}"
+                f"{erledigt_text}"
+            )
+            
+            # Kürzen falls zu lang
+            if len(field_value) > 1024:
+                field_value = field_value[:1020] + "..."
+            
+            embed.add_field(
+                name=f"{status_icon} ID {sanction['id']} - {sanction['user_name']}",
+                value=field_value,
+                inline=False
+            )
+        embed.set_footer(text=f"Seite {self.current_page + 1}{' / weitere vorhanden' if self.has_next else ''}")
+
+        self.update_buttons()
+        if self.interaction.response.is_done(): await self.interaction.edit_original_response(embed=embed, view=self)
+        else: await self.interaction.response.send_message(embed=embed, view=self, ephemeral=True)
+
+    def update_buttons(self):
+        self.children[0].disabled = self.current_page == 0
+        self.children[1].disabled = not self.has_next
+
+    @discord.ui.button(label="Zurück", style=discord.ButtonStyle.grey)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        await self.show_page(self.current_page - 1)
+
+    @discord.ui.button(label="Weiter", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        await self.show_page(self.current_page + 1)
+
 class SanctionCommands(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
@@ -41,9 +111,6 @@ class SanctionCommands(commands.Cog):
         if not service: 
             return await interaction.followup.send("Fehler: Sanction-Service nicht gefunden.", ephemeral=True)
 
-        # Verwarnungen aus der Strafe extrahieren und verarbeiten
-        neue_verwarnungen = await service.extract_and_process_warnings(user, strafe)
-        
         # Sanktions-Channel holen
         channel = self.bot.get_channel(self._config.get('sanktion_channel_id'))
         if not channel:
@@ -108,11 +175,8 @@ class SanctionCommands(commands.Cog):
         # LSPD Logo (falls vorhanden)
         embed.set_thumbnail(url="https://i.ibb.co/b5F0vJN/lspd.png")  # Ersetze mit tatsächlicher URL
         
-        # Nachricht senden
-        await channel.send(content=user.mention, embed=embed)
-        
-        # Sanktion in Datenbank speichern
-        await service.save_sanction_to_db(
+        # Sanktion und Verwarnungen speichern, Verwarnungs-Rollen vergeben
+        result = await service.issue_sanction(
             user=user,
             strafe=strafe,
             grund=grund,
@@ -120,79 +184,58 @@ class SanctionCommands(commands.Cog):
             erstellt_von=interaction.user,
             deckname=deckname.strip(" []") if deckname else None
         )
+        if not result["success"]:
+            return await interaction.followup.send(f"❌ {result['error']}", ephemeral=True)
+        
+        # Nachricht senden
+        await channel.send(content=user.mention, embed=embed)
         
         # Erfolgsmeldung
-        await interaction.followup.send(
-            f"✅ Sanktion für {user.mention} wurde erfolgreich erstellt und in der Datenbank gespeichert.", 
-            ephemeral=True
-        )
+        message = f"✅ Sanktion für {user.mention} wurde erfolgreich erstellt und in der Datenbank gespeichert."
+        if result["warning"]:
+            message += f"\n⚠️ {result['warning']}"
+        await interaction.followup.send(message, ephemeral=True)
 
-    @app_commands.command(name="sanktionen-anzeigen", description="Zeigt offene Sanktionen an.")
+    @app_commands.command(name="sanktionen-anzeigen", description="Zeigt Sanktionen seitenweise an.")
     @app_commands.describe(
         user="Zeige nur Sanktionen für einen bestimmten User (Optional)",
-        alle="Zeige alle Sanktionen (auch erledigte) an"
+        status="Welche Sanktionen angezeigt werden (Standard: offene)",
+        ersteller="Zeige nur Sanktionen, die von diesem Mitglied erstellt wurden (Optional)",
+        von="Erstellt ab (Optional, Format: DD.MM.YYYY)",
+        bis="Erstellt bis einschließlich (Optional, Format: DD.MM.YYYY)"
     )
+    @app_commands.choices(status=[
+        app_commands.Choice(name="Offen", value="offen"),
+        app_commands.Choice(name="Erledigt", value="erledigt"),
+        app_commands.Choice(name="Alle", value="alle")
+    ])
     @has_permission("sanktion.view")
-    async def sanktionen_anzeigen(self, interaction: discord.Interaction, user: discord.Member = None, alle: bool = False):
+    async def sanktionen_anzeigen(self, interaction: discord.Interaction, user: discord.Member = None, status: str = "offen",
+                                  ersteller: discord.Member = None, von: str = None, bis: str = None):
         await interaction.response.defer(ephemeral=True)
         
         service: SanctionService = self.bot.get_cog("SanctionService")
         if not service:
             return await interaction.followup.send("Fehler: Sanction-Service nicht gefunden.", ephemeral=True)
 
-        # Sanktionen aus der Datenbank holen
-        if alle:
-            sanctions = await service.get_all_sanctions(user.id if user else None, limit=20)
-            title = f"Alle Sanktionen{' für ' + user.display_name if user else ''}"
-        else:
-            sanctions = await service.get_open_sanctions(user.id if user else None)
-            title = f"Offene Sanktionen{' für ' + user.display_name if user else ''}"
-
-        if not sanctions:
-            status = "alle" if alle else "offene"
-            user_text = f" für {user.display_name}" if user else ""
-            return await interaction.followup.send(f"ℹ️ Keine {status} Sanktionen{user_text} gefunden.", ephemeral=True)
-
-        # Embed erstellen
-        embed = discord.Embed(
-            title=title,
-            color=discord.Color.orange() if not alle else discord.Color.blue()
-        )
-
-        # Sanktionen auflisten (max. 10 pro Nachricht)
-        sanctions_shown = sanctions[:10]
-        
-        for sanction in sanctions_shown:
-            status_icon = "✅" if sanction['erledigt'] else "⏳"
-            erledigt_text = ""
-            
-            if sanction['erledigt']:
-                erledigt_am = sanction['erledigt_am'].strftime("%d.%m.%Y") if sanction['erledigt_am'] else "Unbekannt"
-                erledigt_text = f"\n**Erledigt:** {erledigt_am} von {sanction['erledigt_von_name']}"
-            
-            field_value = (
-                f"**Strafe:** {sanction['strafe']}\n"
-                f"**Grund:** {sanction['grund']}\n"
-                f"**Fällig:** {sanction['zahlungsdatum']}\n"
-                f"**Erstellt:** {sanction['erstellt_am'].strftime('%d.%m.%Y')} von {sanction['erstellt_von_name']}"
-                f"{erledigt_text}"
-            )
-            
-            # Kürzen falls zu lang
-            if len(field_value) > 1024:
-                field_value = field_value[:1020] + "..."
-            
-            embed.add_field(
-                name=f"{status_icon} ID {sanction['id']} - {sanction['user_name']}",
-                value=field_value,
-                inline=False
-            )
+        try:
+            von_datum = datetime.strptime(von, "%d.%m.%Y") if von else None
+            bis_datum = datetime.strptime(bis, "%d.%m.%Y") + timedelta(days=1) if bis else None
+        except ValueError:
+            return await interaction.followup.send("❌ Ungültiges Datum. Bitte verwende das Format DD.MM.YYYY.", ephemeral=True)
 
-        # Info falls mehr Sanktionen vorhanden
-        if len(sanctions) > 10:
-            embed.set_footer(text=f"Zeige {len(sanctions_shown)} von {len(sanctions)} Sanktionen. Verwende Filter für spezifischere Ergebnisse.")
+        filters = {
+            "erledigt": {"offen": False, "erledigt": True}.get(status),
+            "user_id": user.id if user else None,
+            "erstellt_von_id": ersteller.id if ersteller else None,
+            "von": von_datum,
+            "bis": bis_datum,
+        }
+        status_text = {"offen": "Offene", "erledigt": "Erledigte"}.get(status, "Alle")
+        title = f"{status_text} Sanktionen{' für ' + user.display_name if user else ''}"
 
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        view = SanctionPaginationView(interaction, service, title, filters)
+        await view.show_page(0)
 
     @app_commands.command(name="sanktion-erledigt", description="Markiert eine Sanktion als erledigt.")
     @app_commands.describe(
@@ -277,22 +320,12 @@ class SanctionCommands(commands.Cog):
             return await interaction.followup.send("Fehler: Sanction-Service nicht gefunden.", ephemeral=True)
 
         # Statistiken sammeln
-        alle_sanktionen = await service.get_all_sanctions(limit=1000)
-        offene_sanktionen = await service.get_open_sanctions()
+        stats = await service.get_statistics()
         
-        if not alle_sanktionen:
+        if not stats['gesamt']:
             return await interaction.followup.send("ℹ️ Keine Sanktionen in der Datenbank gefunden.", ephemeral=True)
 
-        erledigte_count = len([s for s in alle_sanktionen if s['erledigt']])
-        offene_count = len(offene_sanktionen)
-        
-        # Top 5 bestrafete User
-        user_counts = {}
-        for sanction in alle_sanktionen:
-            user_name = sanction['user_name']
-            user_counts[user_name] = user_counts.get(user_name, 0) + 1
-        
-        top_users = sorted(user_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        top_users = stats['top_users']
 
         embed = discord.Embed(
             title="📊 Sanktionen-Statistik",
@@ -302,17 +335,17 @@ class SanctionCommands(commands.Cog):
         
         embed.add_field(
             name="📋 Gesamt",
-            value=f"**{len(alle_sanktionen)}** Sanktionen",
+            value=f"**{stats['gesamt']}** Sanktionen",
             inline=True
         )
         embed.add_field(
             name="⏳ Offen",
-            value=f"**{offene_count}** Sanktionen",
+            value=f"**{stats['offen']}** Sanktionen",
             inline=True
         )
         embed.add_field(
             name="✅ Erledigt",
-            value=f"**{erledigte_count}** Sanktionen",
+            value=f"**{stats['erledigt']}** Sanktionen",
             inline=True
         )
         
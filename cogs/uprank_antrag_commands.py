@@ -4,9 +4,8 @@ import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
 import yaml
-import math
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple, Callable, Awaitable
 import asyncio
 
 from utils.decorators import has_permission, log_on_completion
@@ -16,24 +15,28 @@ if TYPE_CHECKING:
     from services.uprank_antrag_service import UprankAntragService
 
 class HistoryPaginationView(discord.ui.View):
-    def __init__(self, interaction: Interaction, title: str, results: List[Dict[str, Any]]):
+    def __init__(self, interaction: Interaction, title: str, fetch_page: Callable[[Tuple[datetime, int] | None, int], Awaitable[List[Dict[str, Any]]]]):
         super().__init__(timeout=180)
         self.interaction = interaction
         self.title = title
-        self.results = results
+        self.fetch_page = fetch_page
         self.current_page = 0
         self.items_per_page = 5
-        self.total_pages = math.ceil(len(self.results) / self.items_per_page) if self.results else 1
+        self.cursors: List[Tuple[datetime, int] | None] = [None] # Startschlüssel je besuchter Seite
+        self.has_next = False
     async def show_page(self, page_number: int):
         self.current_page = page_number
-        start_index = self.current_page * self.items_per_page
-        end_index = start_index + self.items_per_page
+        rows = await self.fetch_page(self.cursors[page_number], self.items_per_page)
+        self.has_next = len(rows) > self.items_per_page
+        results = rows[:self.items_per_page]
+        if self.has_next and len(self.cursors) == page_number + 1:
+            self.cursors.append((results[-1]['created_at'], results[-1]['id']))
         embed = discord.Embed(title=self.title, color=discord.Color.blurple())
-        if not self.results:
+        if not results:
             embed.description = "Keine Einträge gefunden."
         else:
             status_map = {"pending": "⏳ Ausstehend", "approved": "✅ Genehmigt", "rejected": "❌ Abgelehnt", "deleted": "🗑️ Gelöscht"}
-            for item in self.results[start_index:end_index]:
+            for item in results:
                 timestamp = int(item['created_at'].timestamp())
                 status = status_map.get(item['status'], "❓ Unbekannt")
                 requester_id = item['requester_id']
@@ -43,13 +46,13 @@ class HistoryPaginationView(discord.ui.View):
                                f"**Eingereicht von:** <@{requester_id}>\n"
                                f"**Grund:** {item['reason'][:150]}")
                 embed.add_field(name=field_name, value=field_value, inline=False)
-        embed.set_footer(text=f"Seite {self.current_page + 1} / {self.total_pages}")
+        embed.set_footer(text=f"Seite {self.current_page + 1}{' / weitere vorhanden' if self.has_next else ''}")
         self.update_buttons()
         if self.interaction.response.is_done(): await self.interaction.edit_original_response(embed=embed, view=self)
         else: await self.interaction.response.send_message(embed=embed, view=self, ephemeral=True)
     def update_buttons(self):
         self.children[0].disabled = self.current_page == 0
-        self.children[1].disabled = self.current_page >= self.total_pages - 1
+        self.children[1].disabled = not self.has_next
     @discord.ui.button(label="Zurück", style=discord.ButtonStyle.grey)
     async def previous_page(self, interaction: Interaction, button: discord.ui.Button):
         await interaction.response.defer()
@@ -175,9 +178,8 @@ class UprankAntragCommands(commands.Cog):
     @has_permission("uprank.verlauf.view")
     async def verlauf_benutzer(self, interaction: Interaction, soldat: discord.Member):
         service: "UprankAntragService" = self.bot.get_cog("UprankAntragService")
-        history = await service.get_uprank_history_for_user(soldat.id)
         title = f"Rangänderungsverlauf für {soldat.display_name}"
-        view = HistoryPaginationView(interaction, title, history)
+        view = HistoryPaginationView(interaction, title, lambda after, limit: service.get_uprank_history_for_user(soldat.id, after, limit))
         await view.show_page(0)
     @uprank_verlauf_group.command(name="woche", description="Zeigt alle Anträge aus einer bestimmten Woche an.")
     @has_permission("uprank.verlauf.view")
@@ -189,9 +191,8 @@ class UprankAntragCommands(commands.Cog):
             await interaction.edit_original_response(content="❌ Ungültiges Datumsformat. Bitte benutze `TT.MM.JJJJ`.")
             return
         week_identifier = service.get_week_identifier(date_obj)
-        history = await service.get_uprank_history_for_week(week_identifier)
         title = f"Rangänderungsanträge aus Kalenderwoche {week_identifier}"
-        view = HistoryPaginationView(interaction, title, history)
+        view = HistoryPaginationView(interaction, title, lambda after, limit: service.get_uprank_history_for_week(week_identifier, after, limit))
         await view.show_page(0)
     uprank_panel_group = app_commands.Group(name="uprank-panel", description="Verwaltet die Antrags-Panels.")
     @uprank_panel_group.command(name="erstellen", description="Postet das Panel in einem spezifischen Kanal.")
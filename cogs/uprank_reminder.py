@@ -1,9 +1,18 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, time, timedelta, timezone
 import asyncio
+from typing import TYPE_CHECKING
 from utils.decorators import has_permission, log_on_completion
+from utils.broadcast import broadcast
+
+if TYPE_CHECKING:
+    from services.scheduler_service import SchedulerService
+
+# --- Konstanten ---
+REMINDER_TIME = time(12, 0) # Freitag und Sonntag, UTC
+REMINDER_CATCH_UP = timedelta(hours=2)
 
 class UprankReminder(commands.Cog):
     def __init__(self, bot):
@@ -26,33 +35,35 @@ class UprankReminder(commands.Cog):
         # Leitungsebene (Division 1) Konfiguration - separate Behandlung
         self.division1_channel_id = 1097626041083756604  # Channel ID für Division 1
         self.division1_role_id = 1097650390230630580     # Division 1 Rolle ID
-        
-        # Task starten, wenn der Bot bereit ist
-        self.uprank_reminder_task.start()
+    
+    async def cog_load(self):
+        """Registriert die Erinnerungen beim zentralen Zeitplaner"""
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            await self.on_scheduler_ready(scheduler)
     
     def cog_unload(self):
-        """Stoppt den Task beim Entladen des Cogs"""
-        self.uprank_reminder_task.cancel()
+        """Meldet die Erinnerungen beim Entladen des Cogs ab"""
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            scheduler.unregister("uprank_reminder.freitag")
+            scheduler.unregister("uprank_reminder.sonntag")
     
-    @tasks.loop(hours=24)
-    async def uprank_reminder_task(self):
-        """Läuft täglich und prüft, ob es Freitag 12:00 oder Sonntag 12:00 ist"""
-        now = datetime.now(timezone.utc)
-        
-        # Prüfen ob es Freitag 12:00 ist (4 = Freitag in Python)
-        if now.weekday() == 4 and now.hour == 12:
-            await self.send_uprank_reminders()
-            await self.send_division1_voting_reminder()
-        
-        # Prüfen ob es Sonntag 12:00 ist (6 = Sonntag in Python)
-        elif now.weekday() == 6 and now.hour == 12:
-            await self.send_sunday_reminders()
-            await self.send_division1_sunday_reminder()
+    @commands.Cog.listener()
+    async def on_scheduler_ready(self, scheduler: "SchedulerService"):
+        # 4 = Freitag, 6 = Sonntag in Python
+        await scheduler.register_cron("uprank_reminder.freitag", self.friday_reminders, weekdays=(4,), at=REMINDER_TIME,
+                                      tz="UTC", catch_up=REMINDER_CATCH_UP)
+        await scheduler.register_cron("uprank_reminder.sonntag", self.sunday_reminders, weekdays=(6,), at=REMINDER_TIME,
+                                      tz="UTC", catch_up=REMINDER_CATCH_UP)
     
-    @uprank_reminder_task.before_loop
-    async def before_uprank_reminder_task(self):
-        """Wartet bis der Bot bereit ist"""
-        await self.bot.wait_until_ready()
+    async def friday_reminders(self, scheduled_for: datetime):
+        """Freitag 12:00: Uprank-Fristen und Abstimmungs-Erinnerung für Division 1"""
+        await self.send_uprank_reminders()
+        await self.send_division1_voting_reminder()
+    
+    async def sunday_reminders(self, scheduled_for: datetime):
+        """Sonntag 12:00: Reminder für alle Rollen inkl. Division 1"""
+        await self.send_sunday_reminders()
+        await self.send_division1_sunday_reminder()
     
     async def send_uprank_reminders(self):
         """Sendet die Uprank-Erinnerungen in die konfigurierten Channels (OHNE Division 1)"""
@@ -70,20 +81,18 @@ class UprankReminder(commands.Cog):
         timestamp = int(deadline.timestamp())
         
         # Nachrichten für jeden Channel mit der entsprechenden Rolle senden (Division 1 ausgeschlossen)
+        await self._broadcast_to_roles(lambda role_id: f"<@&{role_id}> | Die Uprank-Frist endet <t:{timestamp}:R>.", "Uprank-Erinnerung")
+    
+    async def _broadcast_to_roles(self, build_message, label: str):
+        """Sendet gleichzeitig in alle Channels aus channel_role_pairs, jeweils mit Ping der zugehörigen Rolle"""
+        channel_roles = {}
         for channel_id, role_id in self.channel_role_pairs.items():
-            channel = self.bot.get_channel(channel_id)
-            if channel:
-                message = f"<@&{role_id}> | Die Uprank-Frist endet <t:{timestamp}:R>."
-                
-                try:
-                    await channel.send(message)
-                    print(f"Uprank-Erinnerung gesendet in Channel: {channel.name} für Rolle: {role_id}")
-                except discord.Forbidden:
-                    print(f"Keine Berechtigung zum Senden in Channel: {channel.name}")
-                except Exception as e:
-                    print(f"Fehler beim Senden der Nachricht in {channel.name}: {e}")
+            if channel := self.bot.get_channel(channel_id):
+                channel_roles[channel] = role_id
             else:
                 print(f"Channel mit ID {channel_id} nicht gefunden")
+        await broadcast(channel_roles, lambda channel: {"content": build_message(channel_roles[channel])}, label=label,
+                        write_queue=self.bot.get_cog("WriteQueueService"))
     
     async def send_division1_voting_reminder(self):
         """Sendet die Abstimmungs-Erinnerung für Division 1 (Freitag 12:00)"""
@@ -103,20 +112,7 @@ class UprankReminder(commands.Cog):
     
     async def send_sunday_reminders(self):
         """Sendet die Sonntag-Reminder für alle Rollen (Sonntag 12:00)"""
-        for channel_id, role_id in self.channel_role_pairs.items():
-            channel = self.bot.get_channel(channel_id)
-            if channel:
-                message = f"<@&{role_id}> | REMINDER!"
-                
-                try:
-                    await channel.send(message)
-                    print(f"Sonntag-Reminder gesendet in Channel: {channel.name} für Rolle: {role_id}")
-                except discord.Forbidden:
-                    print(f"Keine Berechtigung zum Senden in Channel: {channel.name}")
-                except Exception as e:
-                    print(f"Fehler beim Senden des Sonntag-Reminders in {channel.name}: {e}")
-            else:
-                print(f"Channel mit ID {channel_id} nicht gefunden")
+        await self._broadcast_to_roles(lambda role_id: f"<@&{role_id}> | REMINDER!", "Sonntag-Reminder")
     
     async def send_division1_sunday_reminder(self):
         """Sendet den Sonntag-Reminder für Division 1 (Sonntag 12:00)"""
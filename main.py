@@ -156,7 +156,8 @@ class MyBot(commands.Bot):
                 # --- ENDE: NEUE AUSNAHME HINZUGEFÜGT ---
                 dirs[:] = [d for d in dirs if d != '__pycache__']
                 for file in files:
-                    if file.endswith('.py') and file != '__init__.py':
+                    # Dateien mit führendem Unterstrich sind Hilfsmodule und keine Cogs
+                    if file.endswith('.py') and not file.startswith('_'):
                         rel_path = os.path.splitext(os.path.relpath(os.path.join(root, file), './'))[0]
                         module_path = rel_path.replace(os.sep, '.')
                         try:
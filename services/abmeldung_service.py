@@ -1,9 +1,13 @@
 import discord
-from discord.ext import commands, tasks
-from datetime import datetime, date
+from discord.ext import commands
+import asyncio
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
 import aiomysql
 from typing import TYPE_CHECKING, List, Optional, Dict, Any
 
+from utils.expiry_scheduler import ExpiryScheduler
+
 if TYPE_CHECKING:
     from main import MyBot
 
@@ -12,20 +16,24 @@ ABMELDE_CHANNEL_ID = 1213569286514413638
 LOG_CHANNEL_ID = 1415459096664215658
 ABGEMELDET_ROLLE_ID = 1367223382646591508
 GUILD_ID = 934974535369891840
+LOCAL_TZ = ZoneInfo("Europe/Berlin")
 
 class AbmeldungService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "AbmeldungService"
+        self.expiries = ExpiryScheduler(self._expire_abmeldungen, name="Abmeldungen")
+        self._expiry_loader: asyncio.Task | None = None
 
     async def cog_load(self):
         """Wird beim Laden des Cogs ausgeführt."""
         await self._ensure_table_exists()
-        self.abmelde_cleanup_task.start()
-        print("AbmeldungService geladen, DB-Tabelle sichergestellt und Cleanup-Task gestartet.")
+        self._expiry_loader = asyncio.create_task(self._load_expiries())
+        print("AbmeldungService geladen, DB-Tabelle sichergestellt und Ablauf-Planung gestartet.")
 
     def cog_unload(self):
-        self.abmelde_cleanup_task.cancel()
+        if self._expiry_loader: self._expiry_loader.cancel()
+        self.expiries.stop()
 
     async def _execute_query(self, query: str, args: tuple = None, fetch: str = None):
         """Eine Helfer-Methode für alle Datenbank-Abfragen."""
@@ -80,6 +88,7 @@ class AbmeldungService(commands.Cog):
         """
         args = (dn, user.id, str(user), start_date, end_date, reason, message_id, datetime.now())
         await self._execute_query(query, args)
+        self.expiries.schedule(int(dn), self._expires_at(end_date))
 
     async def remove_abmeldung_by_user_id(self, user_id: int) -> Optional[int]:
         """Löscht eine Abmeldung anhand der User-ID und gibt die Nachrichten-ID zurück."""
@@ -88,52 +97,72 @@ class AbmeldungService(commands.Cog):
             return None
         
         await self._execute_query("DELETE FROM abmeldungen WHERE user_id = %s", (user_id,))
+        self.expiries.cancel(abmeldung["dn"])
         return abmeldung.get("message_id")
 
-    # --- Hintergrund-Task ---
-    @tasks.loop(hours=24)
-    async def abmelde_cleanup_task(self):
-        """Entfernt täglich abgelaufene Abmeldungen aus der DB und Discord."""
-        guild = self.bot.get_guild(GUILD_ID)
-        if not guild: return
+    # --- Ablauf ---
+    @staticmethod
+    def _expires_at(end_date: date) -> datetime:
+        """Eine Abmeldung endet um Mitternacht (deutsche Zeit) nach dem letzten Tag."""
+        return datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=LOCAL_TZ)
 
-        abgelaufene = await self._execute_query("SELECT * FROM abmeldungen WHERE end_date < CURDATE()", fetch="all")
+    async def _load_expiries(self):
+        """Plant alle Abmeldungen aus der DB ein; bereits abgelaufene werden sofort beendet."""
+        await self.bot.wait_until_ready()
+        rows = await self._execute_query("SELECT dn, end_date FROM abmeldungen", fetch="all") or []
+        for row in rows:
+            self.expiries.schedule(row["dn"], self._expires_at(row["end_date"]))
+        self.expiries.start()
+
+    async def _expire_abmeldungen(self, dns: List[int]):
+        """Beendet abgelaufene Abmeldungen gesammelt: Rolle, Nachricht, Log, DB und eine Übersicht-Aktualisierung."""
+        today = datetime.now(LOCAL_TZ).date()
+        format_strings = ','.join(['%s'] * len(dns))
+        abgelaufene = await self._execute_query(
+            f"SELECT * FROM abmeldungen WHERE dn IN ({format_strings}) AND end_date < %s",
+            (*dns, today), fetch="all"
+        )
         if not abgelaufene: return
 
-        log_channel = guild.get_channel(LOG_CHANNEL_ID)
-        abmelde_channel = guild.get_channel(ABMELDE_CHANNEL_ID)
-        abgemeldet_rolle = guild.get_role(ABGEMELDET_ROLLE_ID)
+        guild = self.bot.get_guild(GUILD_ID)
+        if guild:
+            log_channel = guild.get_channel(LOG_CHANNEL_ID)
+            abmelde_channel = guild.get_channel(ABMELDE_CHANNEL_ID)
+            abgemeldet_rolle = guild.get_role(ABGEMELDET_ROLLE_ID)
+            await asyncio.gather(*(
+                self._end_abmeldung(guild, eintrag, log_channel, abmelde_channel, abgemeldet_rolle)
+                for eintrag in abgelaufene
+            ))
+
+        dns_to_delete = [eintrag["dn"] for eintrag in abgelaufene]
+        format_strings = ','.join(['%s'] * len(dns_to_delete))
+        await self._execute_query(f"DELETE FROM abmeldungen WHERE dn IN ({format_strings})", tuple(dns_to_delete))
+        
+        commands_cog = self.bot.get_cog("AbmeldungCommands")
+        if commands_cog:
+            await commands_cog.update_abmeldungs_uebersicht_async()
+
+    async def _end_abmeldung(self, guild: discord.Guild, eintrag: Dict[str, Any], log_channel, abmelde_channel, abgemeldet_rolle):
+        write_queue = self.bot.get_cog("WriteQueueService")
+        async def run(factory):
+            return await write_queue.submit(factory) if write_queue else await factory()
 
-        dns_to_delete = []
-        for eintrag in abgelaufene:
-            dns_to_delete.append(eintrag["dn"])
-            
+        try:
             if abmelde_channel and eintrag["message_id"]:
                 try:
-                    msg = await abmelde_channel.fetch_message(eintrag["message_id"])
-                    await msg.delete()
+                    await run(lambda: abmelde_channel.get_partial_message(eintrag["message_id"]).delete())
                 except discord.NotFound: pass
-            
+
             member = guild.get_member(eintrag["user_id"])
             if member and abgemeldet_rolle and abgemeldet_rolle in member.roles:
-                await member.remove_roles(abgemeldet_rolle, reason="Abmeldung abgelaufen")
+                await run(lambda: member.remove_roles(abgemeldet_rolle, reason="Abmeldung abgelaufen"))
 
             if log_channel:
                 embed = discord.Embed(title="Abmeldung automatisch beendet", color=discord.Color.dark_grey())
                 embed.add_field(name="Benutzer", value=f"<@{eintrag['user_id']}>", inline=False)
-                await log_channel.send(embed=embed)
-        
-        if dns_to_delete:
-            format_strings = ','.join(['%s'] * len(dns_to_delete))
-            await self._execute_query(f"DELETE FROM abmeldungen WHERE dn IN ({format_strings})", tuple(dns_to_delete))
-        
-        commands_cog = self.bot.get_cog("AbmeldungCommands")
-        if commands_cog:
-            await commands_cog.update_abmeldungs_uebersicht_async()
-
-    @abmelde_cleanup_task.before_loop
-    async def before_cleanup(self):
-        await self.bot.wait_until_ready()
+                await run(lambda: log_channel.send(embed=embed))
+        except discord.HTTPException as e:
+            print(f"Fehler beim Beenden der Abmeldung von DN {eintrag['dn']}: {e}")
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(AbmeldungService(bot))
\ No newline at end of file
@@ -1,13 +1,15 @@
 import discord
 from discord.ext import commands
 import aiomysql
-from typing import TYPE_CHECKING, Dict, Any
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Any, List
 
 if TYPE_CHECKING:
     from main import MyBot
 
 # --- Konstanten ---
 KASSEN_CHANNEL_ID = 1213569335168081941
+SNAPSHOT_INTERVAL = 100 # Alle N Buchungen wird ein Kassenstand-Snapshot geschrieben
 
 class KassenService(commands.Cog):
     def __init__(self, bot: "MyBot"):
@@ -38,6 +40,35 @@ class KassenService(commands.Cog):
         """)
         # Stelle sicher, dass der eine Eintrag existiert
         await self._execute_query("INSERT IGNORE INTO kasse (id, geld, schwarzgeld) VALUES (1, 0, 0)")
+        # Unveränderliches Buchungsjournal; die Zeile in `kasse` ist der laufende Stand daraus
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS kasse_ledger (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                geld_diff BIGINT NOT NULL DEFAULT 0,
+                schwarzgeld_diff BIGINT NOT NULL DEFAULT 0,
+                typ VARCHAR(20) NOT NULL,
+                grund TEXT NULL,
+                ausgefuehrt_von BIGINT NULL,
+                empfaenger BIGINT NULL,
+                erstellt_am DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_kasse_ledger_erstellt (erstellt_am)
+            )
+        """)
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS kasse_snapshots (
+                ledger_id BIGINT PRIMARY KEY,
+                geld BIGINT NOT NULL,
+                schwarzgeld BIGINT NOT NULL,
+                erstellt_am DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_kasse_snapshots_erstellt (erstellt_am)
+            )
+        """)
+        # Bestehenden Kassenstand einmalig als Eröffnungsbuchung übernehmen
+        await self._execute_query("""
+            INSERT INTO kasse_ledger (geld_diff, schwarzgeld_diff, typ, grund)
+            SELECT geld, schwarzgeld, 'eroeffnung', 'Übernahme des bisherigen Kassenstands' FROM kasse
+            WHERE id = 1 AND NOT EXISTS (SELECT 1 FROM kasse_ledger)
+        """)
 
     # --- Öffentliche API-Methoden ---
 
@@ -47,9 +78,85 @@ class KassenService(commands.Cog):
         return result if result else {"geld": 0, "schwarzgeld": 0}
 
     async def update_kassenstand(self, geld_diff: int, schwarzgeld_diff: int):
-        """Ändert den Kassenstand in der Datenbank."""
-        query = "UPDATE kasse SET geld = geld + %s, schwarzgeld = schwarzgeld + %s WHERE id = 1"
-        await self._execute_query(query, (geld_diff, schwarzgeld_diff))
+        """Ändert den Kassenstand ohne Deckungsprüfung (als Korrekturbuchung im Journal)."""
+        await self.book(geld_diff, schwarzgeld_diff, "korrektur", allow_negative=True)
+
+    async def book(self, geld_diff: int, schwarzgeld_diff: int, typ: str, grund: str = None,
+                   ausgefuehrt_von: int = None, empfaenger: int = None, allow_negative: bool = False) -> Dict[str, Any]:
+        """Verbucht eine einzelne Ein- oder Auszahlung atomar inkl. Deckungsprüfung."""
+        booking = {"geld_diff": geld_diff, "schwarzgeld_diff": schwarzgeld_diff, "typ": typ, "grund": grund,
+                   "ausgefuehrt_von": ausgefuehrt_von, "empfaenger": empfaenger}
+        result = await self.book_many([booking], allow_negative=allow_negative)
+        if not result["success"]:
+            return result
+        return {**result["results"][0], "kassenstand": result["kassenstand"]}
+
+    async def book_many(self, bookings: List[Dict[str, Any]], allow_negative: bool = False) -> Dict[str, Any]:
+        """
+        Verbucht mehrere Buchungen in einer Transaktion in der übergebenen Reihenfolge.
+        Buchungen ohne Deckung werden einzeln abgelehnt, alle übrigen gemeinsam geschrieben.
+        """
+        pool: aiomysql.Pool = self.bot.db_pool
+        results: List[Dict[str, Any]] = []
+        try:
+            async with pool.acquire() as conn:
+                await conn.begin()
+                try:
+                    async with conn.cursor(aiomysql.DictCursor) as cursor:
+                        await cursor.execute("SELECT geld, schwarzgeld FROM kasse WHERE id = 1 FOR UPDATE")
+                        stand = await cursor.fetchone() or {"geld": 0, "schwarzgeld": 0}
+                        geld, schwarzgeld = stand["geld"], stand["schwarzgeld"]
+
+                        accepted = []
+                        for booking in bookings:
+                            new_geld, new_schwarzgeld = geld + booking["geld_diff"], schwarzgeld + booking["schwarzgeld_diff"]
+                            if not allow_negative and ((booking["geld_diff"] < 0 and new_geld < 0) or (booking["schwarzgeld_diff"] < 0 and new_schwarzgeld < 0)):
+                                results.append({"success": False, "error": "Nicht genug Geld in der Kasse."})
+                                continue
+                            geld, schwarzgeld = new_geld, new_schwarzgeld
+                            accepted.append(booking)
+                            results.append({"success": True})
+
+                        if accepted:
+                            await cursor.executemany(
+                                "INSERT INTO kasse_ledger (geld_diff, schwarzgeld_diff, typ, grund, ausgefuehrt_von, empfaenger) VALUES (%s, %s, %s, %s, %s, %s)",
+                                [(b["geld_diff"], b["schwarzgeld_diff"], b["typ"], b.get("grund"), b.get("ausgefuehrt_von"), b.get("empfaenger")) for b in accepted]
+                            )
+                            # Bei mehrzeiligen INSERTs liefert LAST_INSERT_ID() die ID der ersten Zeile;
+                            # die Sperre auf `kasse` verhindert parallele Buchungen dazwischen
+                            first_id = cursor.lastrowid
+                            await cursor.execute("SELECT MAX(id) AS last_id FROM kasse_ledger")
+                            last_id = (await cursor.fetchone())["last_id"]
+                            await cursor.execute("UPDATE kasse SET geld = %s, schwarzgeld = %s WHERE id = 1", (geld, schwarzgeld))
+                            if last_id // SNAPSHOT_INTERVAL > (first_id - 1) // SNAPSHOT_INTERVAL:
+                                await cursor.execute("INSERT INTO kasse_snapshots (ledger_id, geld, schwarzgeld) VALUES (%s, %s, %s)", (last_id, geld, schwarzgeld))
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        except Exception as e:
+            print(f"[KassenService] Buchung fehlgeschlagen: {e}")
+            return {"success": False, "error": f"Datenbankfehler: {e}"}
+        return {"success": True, "results": results, "kassenstand": {"geld": geld, "schwarzgeld": schwarzgeld}}
+
+    async def get_kassenstand_at(self, zeitpunkt: datetime) -> Dict[str, int]:
+        """Rekonstruiert den Kassenstand zu einem Zeitpunkt aus dem letzten Snapshot und den Buchungen danach."""
+        snapshot = await self._execute_query(
+            "SELECT ledger_id, geld, schwarzgeld FROM kasse_snapshots WHERE erstellt_am <= %s ORDER BY ledger_id DESC LIMIT 1",
+            (zeitpunkt,), fetch="one"
+        ) or {"ledger_id": 0, "geld": 0, "schwarzgeld": 0}
+        diff = await self._execute_query(
+            "SELECT COALESCE(SUM(geld_diff), 0) AS geld, COALESCE(SUM(schwarzgeld_diff), 0) AS schwarzgeld FROM kasse_ledger WHERE id > %s AND erstellt_am <= %s",
+            (snapshot["ledger_id"], zeitpunkt), fetch="one"
+        )
+        return {"geld": int(snapshot["geld"] + diff["geld"]), "schwarzgeld": int(snapshot["schwarzgeld"] + diff["schwarzgeld"])}
+
+    async def get_transactions(self, von: datetime, bis: datetime, limit: int = 100) -> List[Dict[str, Any]]:
+        """Gibt die Buchungen eines Zeitraums zurück (neueste zuerst)."""
+        return await self._execute_query(
+            "SELECT * FROM kasse_ledger WHERE erstellt_am BETWEEN %s AND %s ORDER BY id DESC LIMIT %s",
+            (von, bis, limit), fetch="all"
+        ) or []
 
     async def log_transaction(self, embed: discord.Embed):
         """Sendet eine Transaktion in den Kassen-Log-Channel."""
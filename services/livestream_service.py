@@ -3,35 +3,94 @@
 import discord
 import aiohttp
 import aiomysql
-from discord.ext import commands, tasks
+import asyncio
+from discord.ext import commands
 import os
-from typing import TYPE_CHECKING, Dict, Any, List, Tuple
+import math
+import yaml
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Dict, Any, List, Set, Tuple
 
 if TYPE_CHECKING:
     from main import MyBot
+    from services.scheduler_service import SchedulerService
 
 # --- Konstanten ---
 TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
-DISCORD_NOTIFICATION_CHANNEL_ID = 1180993957191221338
+DISCORD_NOTIFICATION_CHANNEL_ID = 1180993957191221338 # Fallback, falls keine Ziele konfiguriert sind
+CONFIG_FILE = "config/livestream_config.yaml"
+TWITCH_BATCH_SIZE = 100 # Maximale Anzahl an user_login-Parametern pro Helix-Anfrage
+YOUTUBE_MAX_CONCURRENCY = 4
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
+YOUTUBE_DAILY_QUOTA_BUDGET = 9000 # Standardkontingent ist 10.000 Einheiten, Rest als Puffer für manuelle Aufrufe
+YOUTUBE_QUOTA_TZ = ZoneInfo("America/Los_Angeles") # Das Kontingent wird um Mitternacht Pacific Time zurückgesetzt
+YOUTUBE_QUOTA_KEY = "youtube_quota_usage"
+YOUTUBE_RECENT_VIDEOS = 5 # Neueste Uploads je Kanal, die auf "live" geprüft werden
+YOUTUBE_VIDEOS_BATCH_SIZE = 50 # Maximale Anzahl an IDs pro videos.list-Anfrage
+YOUTUBE_MIN_INTERVAL = timedelta(minutes=5)
+PROFILE_CACHE_TTL = timedelta(hours=24)
+TWITCH_TOKEN_REFRESH_MARGIN = timedelta(minutes=10) # Token so lange vor Ablauf erneuern
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=15)
 
 class LiveStreamService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "LiveStreamService"
         self.twitch_oauth_token = None
+        self.twitch_token_expires_at: datetime | None = None
+        self._twitch_token_lock = asyncio.Lock()
+        self.twitch_token_metrics = {"erneuerungen": 0, "nach_401": 0, "fehlgeschlagen": 0, "letzte_erneuerung": None}
+        self._session: aiohttp.ClientSession | None = None
+        self._youtube_semaphore = asyncio.Semaphore(YOUTUBE_MAX_CONCURRENCY)
+        self._uploads_playlists: Dict[str, str] = {}
+        self._etag_cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._profile_cache: Dict[Tuple[str, str], Tuple[str | None, int, datetime]] = {}
+        self._quota_day: str | None = None
+        self._quota_used = 0
+        self._next_youtube_check: datetime | None = None
+        self.notification_targets = self._load_notification_targets()
+        self._notification_queue: asyncio.Queue = asyncio.Queue()
+        self._notifier: asyncio.Task | None = None
 
     async def cog_load(self):
         """Initialisiert die DB-Tabelle und startet den Hintergrund-Task."""
         await self._create_tables_async()
-        self.check_stream_status.start()
+        await self._load_quota_usage()
+        self._notifier = asyncio.create_task(self._run_notifier())
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            await self.on_scheduler_ready(scheduler)
         print("LiveStream-Service geladen und Task gestartet.")
 
-    def cog_unload(self):
-        """Stoppt den Hintergrund-Task sauber."""
-        self.check_stream_status.cancel()
+    async def cog_unload(self):
+        """Stoppt den Hintergrund-Task sauber und schließt die HTTP-Session."""
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            scheduler.unregister("livestream.check")
+        if self._notifier: self._notifier.cancel()
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    @commands.Cog.listener()
+    async def on_scheduler_ready(self, scheduler: "SchedulerService"):
+        scheduler.register_interval("livestream.check", self.check_stream_status, timedelta(minutes=5))
+
+    def _load_notification_targets(self) -> List[Dict[str, Any]]:
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                targets = (yaml.safe_load(f) or {}).get("notification_targets") or []
+        except FileNotFoundError:
+            print(f"WARNUNG: {CONFIG_FILE} nicht gefunden, nutze Standard-Kanal für Stream-Benachrichtigungen.")
+            targets = [{"name": "standard", "channel_id": DISCORD_NOTIFICATION_CHANNEL_ID}]
+        return [t for t in targets if t.get("enabled", True) and t.get("channel_id")]
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Eine gemeinsame HTTP-Session für alle API-Aufrufe (Verbindungen werden wiederverwendet)."""
+        if not self._session or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=HTTP_TIMEOUT)
+        return self._session
 
     # --- Datenbank-Helfer ---
     async def _execute_query(self, query: str, args: tuple = None, fetch: str = None):
@@ -77,107 +136,281 @@ class LiveStreamService(commands.Cog):
     async def _get_twitch_token(self):
         url = "https://id.twitch.tv/oauth2/token"
         params = {"client_id": TWITCH_CLIENT_ID, "client_secret": TWITCH_CLIENT_SECRET, "grant_type": "client_credentials"}
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, params=params) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    self.twitch_oauth_token = data.get("access_token")
-                else:
-                    print(f"Fehler beim Abrufen des Twitch-Tokens: {resp.status}")
-                    self.twitch_oauth_token = None
-
-    async def _check_twitch_stream(self, streamer_login: str) -> bool:
-        if not self.twitch_oauth_token:
-            await self._get_twitch_token()
-        if not self.twitch_oauth_token: return False
-        
-        url = f"https://api.twitch.tv/helix/streams?user_login={streamer_login}"
-        headers = {"Client-ID": TWITCH_CLIENT_ID, "Authorization": f"Bearer {self.twitch_oauth_token}"}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as resp:
-                if resp.status == 401:
-                    await self._get_twitch_token()
-                    headers["Authorization"] = f"Bearer {self.twitch_oauth_token}"
-                    async with session.get(url, headers=headers) as resp2:
-                        data = await resp2.json()
-                else:
-                    data = await resp.json()
-                return len(data.get("data", [])) > 0
-
-    async def _check_youtube_live(self, channel_id: str) -> bool:
-        url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&channelId={channel_id}&eventType=live&type=video&key={YOUTUBE_API_KEY}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
+        async with self._get_session().post(url, params=params) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                self.twitch_oauth_token = data.get("access_token")
+                self.twitch_token_expires_at = datetime.now() + timedelta(seconds=data.get("expires_in", 0))
+                self.twitch_token_metrics["erneuerungen"] += 1
+                self.twitch_token_metrics["letzte_erneuerung"] = datetime.now()
+            else:
+                print(f"Fehler beim Abrufen des Twitch-Tokens: {resp.status}")
+                self.twitch_oauth_token = None
+                self.twitch_token_expires_at = None
+                self.twitch_token_metrics["fehlgeschlagen"] += 1
+
+    def _twitch_token_valid(self) -> bool:
+        return bool(self.twitch_oauth_token and self.twitch_token_expires_at
+                    and datetime.now() < self.twitch_token_expires_at - TWITCH_TOKEN_REFRESH_MARGIN)
+
+    async def _ensure_twitch_token(self, rejected_token: str | None = None) -> str:
+        """
+        Liefert ein gültiges App-Token und erneuert es rechtzeitig vor Ablauf.
+        Gleichzeitige Aufrufer warten auf dieselbe Erneuerung (single-flight).
+        `rejected_token` erzwingt eine Erneuerung, sofern nicht bereits ein neueres Token vorliegt.
+        """
+        if self._twitch_token_valid() and self.twitch_oauth_token != rejected_token:
+            return self.twitch_oauth_token
+        async with self._twitch_token_lock:
+            # Ein anderer Aufrufer hat das Token eventuell bereits erneuert
+            if not self._twitch_token_valid() or self.twitch_oauth_token == rejected_token:
+                if rejected_token: self.twitch_token_metrics["nach_401"] += 1
+                await self._get_twitch_token()
+        if not self.twitch_oauth_token: raise RuntimeError("Kein Twitch-Token verfügbar.")
+        return self.twitch_oauth_token
+
+    async def _twitch_get(self, url: str, params: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """GET gegen die Helix-API; wird das Token trotzdem abgelehnt, wird einmal erneuert und wiederholt."""
+        token = await self._ensure_twitch_token()
+        for attempt in range(2):
+            headers = {"Client-ID": TWITCH_CLIENT_ID, "Authorization": f"Bearer {token}"}
+            async with self._get_session().get(url, params=params, headers=headers) as resp:
+                if resp.status == 401 and attempt == 0:
+                    token = await self._ensure_twitch_token(rejected_token=token)
+                    continue
+                resp.raise_for_status()
+                return await resp.json()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Kennzahlen zu Twitch-Token und YouTube-Kontingent."""
+        return {
+            "twitch_token_gueltig_bis": self.twitch_token_expires_at,
+            **self.twitch_token_metrics,
+            "youtube_kontingent": (self._quota_used, YOUTUBE_DAILY_QUOTA_BUDGET),
+        }
+
+    async def _check_twitch_streams(self, streamer_logins: List[str]) -> Set[str]:
+        """Prüft bis zu 100 Logins pro Anfrage und gibt die Logins zurück, die gerade live sind."""
+        live_logins = set()
+        for i in range(0, len(streamer_logins), TWITCH_BATCH_SIZE):
+            chunk = streamer_logins[i:i + TWITCH_BATCH_SIZE]
+            data = await self._twitch_get("https://api.twitch.tv/helix/streams", [("user_login", login) for login in chunk] + [("first", "100")])
+            live_logins.update(stream["user_login"].lower() for stream in data.get("data", []))
+        return live_logins
+
+    # --- YouTube: Kontingent-schonende Live-Erkennung ---
+    def _current_quota_day(self) -> str:
+        return datetime.now(YOUTUBE_QUOTA_TZ).strftime("%Y-%m-%d")
+
+    async def _load_quota_usage(self):
+        """Lädt den heutigen Kontingent-Verbrauch, damit ein Neustart das Budget nicht zurücksetzt."""
+        row = await self._execute_query("SELECT config_value FROM bot_config WHERE config_key = %s", (YOUTUBE_QUOTA_KEY,), fetch="one")
+        day, _, used = (row['config_value'] if row else "").partition(":")
+        self._quota_day = self._current_quota_day()
+        self._quota_used = int(used) if day == self._quota_day and used.isdigit() else 0
+
+    async def _save_quota_usage(self):
+        query = "INSERT INTO bot_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)"
+        await self._execute_query(query, (YOUTUBE_QUOTA_KEY, f"{self._quota_day}:{self._quota_used}"))
+
+    def _youtube_check_due(self, channel_count: int) -> bool:
+        """
+        Verteilt das Tagesbudget gleichmäßig auf den Rest des Kontingent-Tages:
+        reicht es nicht für alle 5 Minuten, wird das Prüfintervall entsprechend verlängert.
+        """
+        if self._quota_day != self._current_quota_day():
+            self._quota_day, self._quota_used, self._next_youtube_check = self._current_quota_day(), 0, None
+
+        now = datetime.now(YOUTUBE_QUOTA_TZ)
+        if self._next_youtube_check and now < self._next_youtube_check: return False
+
+        cost = channel_count + math.ceil(channel_count * YOUTUBE_RECENT_VIDEOS / YOUTUBE_VIDEOS_BATCH_SIZE)
+        remaining = YOUTUBE_DAILY_QUOTA_BUDGET - self._quota_used
+        if remaining < cost:
+            return False
+
+        day_end = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        affordable_checks = remaining // cost
+        interval = max(YOUTUBE_MIN_INTERVAL, (day_end - now) / affordable_checks)
+        self._next_youtube_check = now + interval
+        return True
+
+    async def _youtube_get(self, endpoint: str, params: Dict[str, Any], cost: int = 1, use_etag: bool = True) -> Dict[str, Any]:
+        """GET gegen die YouTube Data API mit ETag-Unterstützung und Kontingent-Zählung."""
+        cache_key = f"{endpoint}?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        headers, cached = {}, None
+        if use_etag and (cached := self._etag_cache.get(cache_key)):
+            headers["If-None-Match"] = cached[0]
+
+        self._quota_used += cost
+        async with self._youtube_semaphore:
+            async with self._get_session().get(f"{YOUTUBE_API_URL}/{endpoint}", params={**params, "key": YOUTUBE_API_KEY}, headers=headers) as resp:
+                if resp.status == 304 and cached:
+                    return cached[1]
                 data = await resp.json()
-                return "items" in data and len(data["items"]) > 0
+                if resp.status == 403 and "quota" in str(data).lower():
+                    # Kontingent erschöpft: bis zum Reset keine weiteren YouTube-Abfragen
+                    self._quota_used = YOUTUBE_DAILY_QUOTA_BUDGET
+                resp.raise_for_status()
+        if use_etag and (etag := data.get("etag")):
+            self._etag_cache[cache_key] = (etag, data)
+        return data
+
+    async def _get_uploads_playlist(self, channel_id: str) -> str | None:
+        """Uploads-Playlist eines Kanals; für UC-Kanal-IDs ohne API-Aufruf ableitbar."""
+        if channel_id.startswith("UC"):
+            return "UU" + channel_id[2:]
+        if channel_id not in self._uploads_playlists:
+            data = await self._youtube_get("channels", {"part": "contentDetails", "id": channel_id})
+            items = data.get("items") or []
+            if not items: return None
+            self._uploads_playlists[channel_id] = items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
+        return self._uploads_playlists[channel_id]
+
+    async def _check_youtube_channels(self, channel_ids: List[str]) -> Dict[str, bool]:
+        """
+        Statt search.list (100 Einheiten pro Kanal) werden die neuesten Uploads je Kanal
+        (1 Einheit) gelesen und gesammelt über videos.list (1 Einheit pro 50 Videos) geprüft.
+        """
+        video_owner: Dict[str, str] = {}
+        checked: Set[str] = set()
+
+        async def collect(channel_id: str):
+            try:
+                playlist_id = await self._get_uploads_playlist(channel_id)
+                if not playlist_id: return
+                data = await self._youtube_get("playlistItems", {"part": "contentDetails", "playlistId": playlist_id, "maxResults": YOUTUBE_RECENT_VIDEOS})
+                for item in data.get("items", []):
+                    video_owner[item["contentDetails"]["videoId"]] = channel_id
+                checked.add(channel_id)
+            except Exception as e:
+                print(f"Fehler beim Abrufen der Uploads von {channel_id} (youtube): {e}")
+
+        await asyncio.gather(*(collect(channel_id) for channel_id in channel_ids))
+
+        live_channels: Set[str] = set()
+        video_ids = list(video_owner)
+        for i in range(0, len(video_ids), YOUTUBE_VIDEOS_BATCH_SIZE):
+            chunk = video_ids[i:i + YOUTUBE_VIDEOS_BATCH_SIZE]
+            data = await self._youtube_get("videos", {"part": "snippet", "id": ",".join(chunk), "maxResults": YOUTUBE_VIDEOS_BATCH_SIZE}, use_etag=False)
+            for video in data.get("items", []):
+                if video["snippet"].get("liveBroadcastContent") == "live":
+                    live_channels.add(video_owner[video["id"]])
+        return {channel_id: channel_id in live_channels for channel_id in checked}
 
     async def _get_user_data(self, platform: str, channel_id: str) -> Tuple[str | None, int]:
-        """Holt Profilbild und Farbe für das Embed."""
+        """Holt Profilbild und Farbe für das Embed (zwischengespeichert)."""
+        if cached := self._profile_cache.get((platform, channel_id)):
+            pfp, color, expires_at = cached
+            if datetime.now() < expires_at: return pfp, color
+        pfp, color = await self._fetch_user_data(platform, channel_id)
+        self._profile_cache[(platform, channel_id)] = (pfp, color, datetime.now() + PROFILE_CACHE_TTL)
+        return pfp, color
+
+    async def _fetch_user_data(self, platform: str, channel_id: str) -> Tuple[str | None, int]:
         if platform == "twitch":
-            url = f"https://api.twitch.tv/helix/users?login={channel_id}"
-            headers = {"Client-ID": TWITCH_CLIENT_ID, "Authorization": f"Bearer {self.twitch_oauth_token}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as resp:
-                    data = await resp.json()
-                    pfp = data["data"][0]["profile_image_url"] if data.get("data") else None
-                    return pfp, 0x9146FF
+            data = await self._twitch_get("https://api.twitch.tv/helix/users", [("login", channel_id)])
+            pfp = data["data"][0]["profile_image_url"] if data.get("data") else None
+            return pfp, 0x9146FF
         elif platform == "youtube":
-            url = f"https://www.googleapis.com/youtube/v3/channels?part=snippet&id={channel_id}&key={YOUTUBE_API_KEY}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    data = await resp.json()
-                    pfp = data["items"][0]["snippet"]["thumbnails"]["high"]["url"] if data.get("items") else None
-                    return pfp, 0xFF0000
+            data = await self._youtube_get("channels", {"part": "snippet", "id": channel_id})
+            pfp = data["items"][0]["snippet"]["thumbnails"]["high"]["url"] if data.get("items") else None
+            return pfp, 0xFF0000
         return None, discord.Color.default().value
 
     # --- Hintergrund-Task ---
-    @tasks.loop(minutes=5)
+    async def _fetch_live_states(self, streamers: List[dict]) -> Dict[int, bool]:
+        """
+        Ermittelt den Live-Status aller Streamer (Twitch gebündelt, YouTube nach verfügbarem Kontingent).
+        Streamer, deren Abfrage fehlschlägt, fehlen im Ergebnis und behalten ihren Status.
+        """
+        states: Dict[int, bool] = {}
+        twitch = [s for s in streamers if s['platform'] == "twitch"]
+        youtube = [s for s in streamers if s['platform'] == "youtube"]
+
+        if twitch:
+            try:
+                live_logins = await self._check_twitch_streams(sorted({s['channel_id'].lower() for s in twitch}))
+                states.update({s['id']: s['channel_id'].lower() in live_logins for s in twitch})
+            except Exception as e:
+                print(f"Fehler beim Überprüfen der Twitch-Streams: {e}")
+
+        channel_ids = sorted({s['channel_id'] for s in youtube})
+        if channel_ids and self._youtube_check_due(len(channel_ids)):
+            try:
+                youtube_states = await self._check_youtube_channels(channel_ids)
+                states.update({s['id']: youtube_states[s['channel_id']] for s in youtube if s['channel_id'] in youtube_states})
+            except Exception as e:
+                print(f"Fehler beim Überprüfen der YouTube-Streams: {e}")
+            finally:
+                await self._save_quota_usage()
+        return states
+
+    async def _write_live_states(self, changes: Dict[int, bool]):
+        """Schreibt alle geänderten is_live-Werte in einem Statement zurück."""
+        if not changes: return
+        cases = " ".join(["WHEN %s THEN %s"] * len(changes))
+        placeholders = ", ".join(["%s"] * len(changes))
+        args = [value for item in changes.items() for value in item] + list(changes.keys())
+        await self._execute_query(f"UPDATE streamers SET is_live = CASE id {cases} END WHERE id IN ({placeholders})", tuple(args))
+
     async def check_stream_status(self):
-        streamers = await self._execute_query("SELECT platform, channel_id, user_id, is_live FROM streamers", fetch="all")
+        streamers = await self._execute_query("SELECT id, platform, channel_id, user_id, is_live FROM streamers", fetch="all")
         if not streamers: return
 
-        channel = self.bot.get_channel(DISCORD_NOTIFICATION_CHANNEL_ID)
-        if not channel:
-            print("Stream-Benachrichtigungskanal nicht gefunden.")
-            return
+        states = await self._fetch_live_states(streamers)
+        changes = {s['id']: states[s['id']] for s in streamers if s['id'] in states and states[s['id']] != bool(s['is_live'])}
+        await self._write_live_states(changes)
 
+        # Die Zustellung läuft entkoppelt, damit langsame Discord-Aufrufe den Poller nicht bremsen
         for streamer in streamers:
-            platform, channel_id, user_id, is_live = streamer.values()
-            try:
-                if platform == "twitch":
-                    currently_live = await self._check_twitch_stream(channel_id)
-                    stream_url = f"https://twitch.tv/{channel_id}"
-                elif platform == "youtube":
-                    currently_live = await self._check_youtube_live(channel_id)
-                    stream_url = f"https://www.youtube.com/channel/{channel_id}/live"
-                else:
-                    continue
+            if changes.get(streamer['id']):
+                self._notification_queue.put_nowait(streamer)
 
-                if currently_live and not is_live:
-                    await self._execute_query("UPDATE streamers SET is_live = %s WHERE channel_id = %s", (True, channel_id))
-                    user = self.bot.get_user(user_id) or f"User-ID: {user_id}"
-                    user_mention = user.mention if isinstance(user, discord.User) else user
-                    
-                    pfp_url, color = await self._get_user_data(platform, channel_id)
-                    
-                    embed = discord.Embed(
-                        title=f"{platform.capitalize()} Stream ist LIVE!",
-                        description=f"{user_mention} ist jetzt live! Schaut doch mal vorbei:\n**[Hier zum Stream]({stream_url})**",
-                        color=color
-                    )
-                    if pfp_url:
-                        embed.set_thumbnail(url=pfp_url)
-                    await channel.send(embed=embed)
-
-                elif not currently_live and is_live:
-                    await self._execute_query("UPDATE streamers SET is_live = %s WHERE channel_id = %s", (False, channel_id))
+    # --- Benachrichtigungen ---
+    async def _run_notifier(self):
+        await self.bot.wait_until_ready()
+        while True:
+            streamer = await self._notification_queue.get()
+            try:
+                await self._announce_live(streamer)
             except Exception as e:
-                print(f"Fehler beim Überprüfen von Streamer {channel_id} ({platform}): {e}")
+                print(f"Fehler beim Benachrichtigen für Streamer {streamer['channel_id']} ({streamer['platform']}): {e}")
+            finally:
+                self._notification_queue.task_done()
 
-    @check_stream_status.before_loop
-    async def before_check_stream_status(self):
-        await self.bot.wait_until_ready()
+    async def _announce_live(self, streamer: dict):
+        platform, channel_id, user_id = streamer['platform'], streamer['channel_id'], streamer['user_id']
+        stream_url = f"https://twitch.tv/{channel_id}" if platform == "twitch" else f"https://www.youtube.com/channel/{channel_id}/live"
+        user = self.bot.get_user(user_id) or f"User-ID: {user_id}"
+        user_mention = user.mention if isinstance(user, discord.User) else user
+        
+        pfp_url, color = await self._get_user_data(platform, channel_id)
+        
+        embed = discord.Embed(
+            title=f"{platform.capitalize()} Stream ist LIVE!",
+            description=f"{user_mention} ist jetzt live! Schaut doch mal vorbei:\n**[Hier zum Stream]({stream_url})**",
+            color=color
+        )
+        if pfp_url:
+            embed.set_thumbnail(url=pfp_url)
+
+        targets = [t for t in self.notification_targets if platform in t.get("platforms", [platform])]
+        await asyncio.gather(*(self._send_to_target(target, embed) for target in targets))
+
+    async def _send_to_target(self, target: Dict[str, Any], embed: discord.Embed):
+        channel = self.bot.get_channel(target["channel_id"])
+        if not channel:
+            return print(f"Stream-Benachrichtigungskanal für Ziel '{target.get('name')}' nicht gefunden.")
+        content = f"<@&{target['ping_role_id']}>" if target.get("ping_role_id") else None
+        send = lambda: channel.send(content=content, embed=embed, allowed_mentions=discord.AllowedMentions(roles=True, users=False))
+        try:
+            if write_queue := self.bot.get_cog("WriteQueueService"):
+                await write_queue.submit(send)
+            else:
+                await send()
+        except discord.HTTPException as e:
+            print(f"Stream-Benachrichtigung an Ziel '{target.get('name')}' fehlgeschlagen: {e}")
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(LiveStreamService(bot))
\ No newline at end of file
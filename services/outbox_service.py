@@ -0,0 +1,204 @@
+import discord
+from discord.ext import commands
+import aiomysql
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List
+
+if TYPE_CHECKING:
+    from main import MyBot
+
+# --- Konstanten ---
+POLL_INTERVAL_SECONDS = 10
+MAX_PARALLEL_JOBS = 4
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY_SECONDS = 30
+BATCH_SIZE = 50
+KEEP_DONE_DAYS = 7
+
+class OutboxService(commands.Cog):
+    """
+    Dauerhafte Job-Warteschlange (Tabelle `job_outbox`) für Folgeaktionen, die nicht
+    auf dem Interaktionspfad laufen müssen (Rollen, Sheets, Listen-Updates).
+
+    Ein Job ruft `<CogName>.job_<name>(**payload)` auf. Jobs mit gleichem `job_key`
+    laufen in Einfügereihenfolge nacheinander, fehlgeschlagene Jobs werden mit
+    wachsendem Abstand wiederholt und überstehen einen Neustart des Bots.
+    """
+    def __init__(self, bot: "MyBot"):
+        self.bot = bot
+        self.__cog_name__ = "OutboxService"
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._last_cleanup: datetime | None = None
+
+    async def cog_load(self):
+        await self._ensure_table_exists()
+        # Nach einem Absturz hängengebliebene Jobs erneut einplanen
+        await self._execute_query("UPDATE job_outbox SET status = 'offen' WHERE status = 'laeuft'")
+        self._worker = asyncio.create_task(self._run_worker())
+
+    def cog_unload(self):
+        if self._worker: self._worker.cancel()
+
+    async def _execute_query(self, query: str, args: tuple = None, fetch: str = None):
+        pool: aiomysql.Pool = self.bot.db_pool
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, args)
+                if fetch == "one": return await cursor.fetchone()
+                if fetch == "all": return await cursor.fetchall()
+
+    async def _ensure_table_exists(self):
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS job_outbox (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                job_type VARCHAR(100) NOT NULL,
+                job_key VARCHAR(64) NULL,
+                payload TEXT NOT NULL,
+                status ENUM('offen', 'laeuft', 'fertig', 'fehler') NOT NULL DEFAULT 'offen',
+                versuche INT NOT NULL DEFAULT 0,
+                letzter_fehler TEXT NULL,
+                naechster_versuch DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                erstellt_am DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_job_outbox_faellig (status, naechster_versuch)
+            )
+        """)
+
+    # --- Öffentliche API ---
+    async def enqueue(self, cog_name: str, job_name: str, payload: Dict[str, Any] = None,
+                      job_key: str = None, dedupe: bool = False, cursor: aiomysql.Cursor = None):
+        """
+        Legt einen Job an. Mit `dedupe` wird kein weiterer Job angelegt, solange ein
+        identischer noch offen ist (z.B. für vollständige Listen- oder Sheet-Aktualisierungen).
+
+        Mit `cursor` wird der Job in der laufenden Transaktion des Aufrufers angelegt und
+        erst mit deren Commit sichtbar; der Aufrufer ruft danach `notify()` auf.
+        """
+        job_type = f"{cog_name}.job_{job_name}"
+        payload_json = json.dumps(payload or {}, sort_keys=True)
+        if cursor:
+            async def execute(query: str, args: tuple, fetch: str = None):
+                await cursor.execute(query, args)
+                if fetch == "one": return await cursor.fetchone()
+        else:
+            execute = self._execute_query
+
+        if dedupe:
+            existing = await execute(
+                "SELECT id FROM job_outbox WHERE job_type = %s AND payload = %s AND status = 'offen' LIMIT 1",
+                (job_type, payload_json), fetch="one"
+            )
+            if existing:
+                if not cursor: self.notify()
+                return
+        await execute(
+            "INSERT INTO job_outbox (job_type, job_key, payload) VALUES (%s, %s, %s)",
+            (job_type, job_key, payload_json)
+        )
+        if not cursor: self.notify()
+
+    def notify(self):
+        """Weckt den Worker, z.B. nach dem Commit einer Transaktion mit neuen Jobs."""
+        self._wakeup.set()
+
+    async def get_stats(self) -> Dict[str, int]:
+        rows = await self._execute_query("SELECT status, COUNT(*) AS anzahl FROM job_outbox GROUP BY status", fetch="all") or []
+        return {row['status']: row['anzahl'] for row in rows}
+
+    # --- Verarbeitung ---
+    async def _run_worker(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while await self._process_due_jobs():
+                    pass
+                await self._cleanup_done_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[OutboxService] Fehler im Worker: {e}")
+
+    async def _process_due_jobs(self) -> bool:
+        """Verarbeitet einen Block fälliger Jobs. Gibt True zurück, wenn ein voller Block abgearbeitet wurde."""
+        # Ein Job mit Schlüssel ist erst dran, wenn alle früheren Jobs dieses Schlüssels erledigt
+        # (oder endgültig fehlgeschlagen) sind oder im selben Block mitlaufen (offen und fällig).
+        jobs = await self._execute_query("""
+            SELECT o.* FROM job_outbox o
+            WHERE o.status = 'offen' AND o.naechster_versuch <= NOW()
+              AND (o.job_key IS NULL OR NOT EXISTS (
+                  SELECT 1 FROM job_outbox p
+                  WHERE p.job_key = o.job_key AND p.id < o.id AND p.status NOT IN ('fertig', 'fehler')
+                    AND NOT (p.status = 'offen' AND p.naechster_versuch <= NOW())
+              ))
+            ORDER BY o.id LIMIT %s
+        """, (BATCH_SIZE,), fetch="all") or []
+        if not jobs: return False
+
+        placeholders = ", ".join(["%s"] * len(jobs))
+        await self._execute_query(f"UPDATE job_outbox SET status = 'laeuft' WHERE id IN ({placeholders})", tuple(job['id'] for job in jobs))
+
+        # Jobs mit gleichem Schlüssel nacheinander, unterschiedliche Schlüssel parallel
+        chains: Dict[str, List[dict]] = {}
+        for job in jobs:
+            chains.setdefault(job['job_key'] or f"job:{job['id']}", []).append(job)
+
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_JOBS)
+        async def run_chain(chain: List[dict]):
+            async with semaphore:
+                for index, job in enumerate(chain):
+                    if await self._run_job(job): continue
+                    # Kette anhalten: spätere Jobs warten, bis der fehlgeschlagene erledigt ist
+                    if remaining := [j['id'] for j in chain[index + 1:]]:
+                        placeholders = ", ".join(["%s"] * len(remaining))
+                        await self._execute_query(f"UPDATE job_outbox SET status = 'offen' WHERE id IN ({placeholders})", tuple(remaining))
+                    return
+
+        await asyncio.gather(*(run_chain(chain) for chain in chains.values()))
+        return len(jobs) == BATCH_SIZE
+
+    async def _run_job(self, job: dict) -> bool:
+        """Führt einen Job aus. Gibt False zurück, wenn er fehlgeschlagen ist."""
+        try:
+            cog_name, method_name = job['job_type'].split(".", 1)
+            cog = self.bot.get_cog(cog_name)
+            handler = getattr(cog, method_name, None) if cog else None
+            if not handler or not method_name.startswith("job_"):
+                raise LookupError(f"Kein Handler für '{job['job_type']}' geladen.")
+            await handler(**json.loads(job['payload']))
+        except Exception as e:
+            await self._mark_failed(job, e)
+            return False
+        await self._execute_query("UPDATE job_outbox SET status = 'fertig', versuche = versuche + 1 WHERE id = %s", (job['id'],))
+        return True
+
+    async def _mark_failed(self, job: dict, error: Exception):
+        attempts = job['versuche'] + 1
+        if attempts >= MAX_ATTEMPTS:
+            print(f"[OutboxService] Job {job['id']} ({job['job_type']}) endgültig fehlgeschlagen: {error}")
+            await self._execute_query(
+                "UPDATE job_outbox SET status = 'fehler', versuche = %s, letzter_fehler = %s WHERE id = %s",
+                (attempts, str(error), job['id'])
+            )
+            return
+        delay = RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1)
+        await self._execute_query(
+            "UPDATE job_outbox SET status = 'offen', versuche = %s, letzter_fehler = %s, naechster_versuch = NOW() + INTERVAL %s SECOND WHERE id = %s",
+            (attempts, str(error), delay, job['id'])
+        )
+
+    async def _cleanup_done_jobs(self):
+        """Entfernt erledigte Jobs einmal täglich nach der Aufbewahrungsfrist."""
+        now = datetime.now()
+        if self._last_cleanup and now - self._last_cleanup < timedelta(days=1): return
+        self._last_cleanup = now
+        await self._execute_query("DELETE FROM job_outbox WHERE status = 'fertig' AND erstellt_am < NOW() - INTERVAL %s DAY", (KEEP_DONE_DAYS,))
+
+async def setup(bot: "MyBot"):
+    await bot.add_cog(OutboxService(bot))
@@ -2,15 +2,19 @@ import discord
 from discord.ext import commands
 import aiomysql
 import asyncio
+from contextlib import asynccontextmanager
 from functools import partial
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from typing import TYPE_CHECKING, Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List, Iterable, Set
+
+from utils.timing import PhaseTimer
 
 if TYPE_CHECKING:
     from main import MyBot
     from services.uprank_sperre_service import UprankSperreService
+    from services.scheduler_service import SchedulerService
 
 # --- Konstanten, die zur Logik gehören ---
 SERVICE_ACCOUNT_FILE = "service_account.json"
@@ -24,6 +28,86 @@ DN_RANGES = {
     1386673042289201224: (1, 2) # TEAM WHITE
 }
 
+class DnAllocator:
+    """
+    Hält pro Division eine Belegungs-Bitmap über den DN_RANGES-Bereich im Speicher.
+    Reservierungen sind synchron und damit innerhalb des Event-Loops atomar.
+    """
+    def __init__(self, ranges: Dict[int, tuple[int, int]]):
+        self._ranges = ranges
+        self._bitmaps = {div: bytearray(hi - lo + 1) for div, (lo, hi) in ranges.items()}
+        self._pending: Set[int] = set()
+        self._committed_during_sync: Set[int] | None = None
+        self.loaded = False
+
+    def _locate(self, dn: int) -> tuple[bytearray, int] | None:
+        for div, (lo, hi) in self._ranges.items():
+            if lo <= dn <= hi:
+                return self._bitmaps[div], dn - lo
+        return None
+
+    def begin_sync(self):
+        """Merkt sich alle DNs, die während eines laufenden DB-Abgleichs festgeschrieben werden."""
+        self._committed_during_sync = set()
+
+    def abort_sync(self):
+        self._committed_during_sync = None
+
+    def load(self, used_dns: Iterable[int]):
+        """Baut die Bitmaps aus dem DB-Stand neu auf; offene Reservierungen bleiben erhalten."""
+        for bitmap in self._bitmaps.values():
+            bitmap[:] = bytes(len(bitmap))
+        for dn in set(used_dns) | self._pending | (self._committed_during_sync or set()):
+            if slot := self._locate(dn):
+                slot[0][slot[1]] = 1
+        self._committed_during_sync = None
+        self.loaded = True
+
+    def reserve(self, division_id: int) -> str | None:
+        """Reserviert die niedrigste freie DN der Division."""
+        bitmap = self._bitmaps.get(division_id)
+        if bitmap is None: return None
+        index = bitmap.find(0)
+        if index == -1: return None
+        bitmap[index] = 1
+        dn = self._ranges[division_id][0] + index
+        self._pending.add(dn)
+        return str(dn)
+
+    def claim(self, dn: str) -> bool:
+        """Reserviert eine fest vorgegebene DN. DNs außerhalb der Bereiche werden nicht verwaltet."""
+        if not str(dn).isdigit(): return True
+        slot = self._locate(int(dn))
+        if not slot: return True
+        bitmap, index = slot
+        if bitmap[index]: return False
+        bitmap[index] = 1
+        self._pending.add(int(dn))
+        return True
+
+    def commit(self, dn: str):
+        """Bestätigt eine Reservierung, nachdem der DB-Eintrag geschrieben wurde."""
+        if not str(dn).isdigit(): return
+        self._pending.discard(int(dn))
+        if self._committed_during_sync is not None:
+            self._committed_during_sync.add(int(dn))
+
+    def release(self, dn: str):
+        """Gibt eine DN wieder frei (fehlgeschlagene Reservierung oder Kündigung)."""
+        if not str(dn).isdigit(): return
+        self._pending.discard(int(dn))
+        if self._committed_during_sync is not None:
+            self._committed_during_sync.discard(int(dn))
+        if slot := self._locate(int(dn)):
+            slot[0][slot[1]] = 0
+
+    def mark_used(self, dn: str):
+        """Markiert eine DN als belegt, die laut DB bereits vergeben ist."""
+        if not str(dn).isdigit(): return
+        self._pending.discard(int(dn))
+        if slot := self._locate(int(dn)):
+            slot[0][slot[1]] = 1
+
 class PersonalService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
@@ -37,8 +121,24 @@ class PersonalService(commands.Cog):
             14: 1107769266608017559, 15: 1293916581784584202, 16: 1361644874293837824, 17: 935010817580089404
         }
         self.ROLE_TO_RANK_ID_MAPPING = {v: k for k, v in self.RANK_MAPPING.items()}
+        self.dn_allocator = DnAllocator(DN_RANGES)
+        self._sheet_batch_depth = 0
+        self._sheet_update_pending = False
         self.bot.loop.create_task(self._async_init_sheets())
 
+    async def cog_load(self):
+        # Der erste Durchlauf lädt den DN-Allocator; bis dahin wird per DB gesucht.
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            await self.on_scheduler_ready(scheduler)
+
+    def cog_unload(self):
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            scheduler.unregister("personal.dn_reconcile")
+
+    @commands.Cog.listener()
+    async def on_scheduler_ready(self, scheduler: "SchedulerService"):
+        scheduler.register_interval("personal.dn_reconcile", self.reconcile_dn_allocator, timedelta(minutes=30))
+
     async def _async_init_sheets(self):
         loop = asyncio.get_running_loop()
         try:
@@ -73,6 +173,37 @@ class PersonalService(commands.Cog):
             return str(min_dn) if not check_first else None
         return str(result["free_dn"])
 
+    async def reconcile_dn_allocator(self):
+        """Gleicht die DN-Bitmaps mit der members-Tabelle ab."""
+        self.dn_allocator.begin_sync()
+        try:
+            rows = await self._execute_query("SELECT dn FROM members", fetch="all")
+        except Exception as e:
+            self.dn_allocator.abort_sync()
+            print(f"Fehler beim Abgleich des DN-Allocators: {e}")
+            return
+        self.dn_allocator.load(int(row["dn"]) for row in rows or [] if str(row["dn"]).isdigit())
+
+    async def _reserve_dn(self, division_id: int) -> str | None:
+        """Reserviert eine freie DN; fällt auf die DB-Suche zurück, falls der Allocator nicht geladen ist."""
+        if self.dn_allocator.loaded:
+            return self.dn_allocator.reserve(division_id)
+        min_dn, max_dn = DN_RANGES[division_id]
+        return await self._find_free_dn(min_dn, max_dn)
+
+    async def _insert_member_rows(self, dn: str, name: str, rank_id: int, user_id: int):
+        """Legt members- und units-Eintrag in einer Transaktion an."""
+        async with self.bot.db_pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute("INSERT INTO members (dn, name, rank, discord_id, hired_at) VALUES (%s, %s, %s, %s, CURDATE())", (dn, name, rank_id, user_id))
+                    await cursor.execute("INSERT INTO units (dn) VALUES (%s)", (dn,))
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
     async def _change_dn_in_db(self, old_dn: str, new_dn: str, user_id: int):
         async with self.bot.db_pool.acquire() as conn:
             async with conn.cursor() as cursor:
@@ -81,6 +212,8 @@ class PersonalService(commands.Cog):
                 await cursor.execute("UPDATE units SET dn = %s WHERE dn = %s", (new_dn, old_dn))
                 await cursor.execute("UPDATE upranksperre SET dn = %s WHERE dn = %s", (new_dn, old_dn))
                 await cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+        if uprank_sperre_service := self.bot.get_cog("UprankSperreService"):
+            uprank_sperre_service.move_lock(old_dn, new_dn)
 
     async def _delete_member_from_db(self, dn: str):
         async with self.bot.db_pool.acquire() as conn:
@@ -90,6 +223,8 @@ class PersonalService(commands.Cog):
                 await cursor.execute("DELETE FROM units WHERE dn = %s", (dn,))
                 await cursor.execute("DELETE FROM upranksperre WHERE dn = %s", (dn,))
                 await cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+        if uprank_sperre_service := self.bot.get_cog("UprankSperreService"):
+            uprank_sperre_service.drop_lock(dn)
     
     async def _get_all_members_for_sheet(self):
         query = "SELECT m.dn, m.name, m.rank, DATE_FORMAT(m.hired_at, '%d.%m.%Y') as hired_at, m.discord_id, u.internal_affairs, u.police_academy, u.human_resources, u.bikers, u.swat, u.asd, u.detectives, u.gtf, u.shp FROM members m LEFT JOIN units u ON m.dn = u.dn"
@@ -106,25 +241,51 @@ class PersonalService(commands.Cog):
 
     async def update_google_sheets(self):
         if not self.sheet: return
+        if self._sheet_batch_depth:
+            self._sheet_update_pending = True
+            return
         members = await self._get_all_members_for_sheet()
         if members is not None:
             await self.bot.loop.run_in_executor(None, self._blocking_update_google_sheets, members)
 
+    @asynccontextmanager
+    async def batched_sheet_updates(self):
+        """Fasst alle Sheets-Aktualisierungen innerhalb des Blocks zu einer am Ende zusammen."""
+        self._sheet_batch_depth += 1
+        try:
+            yield
+        finally:
+            self._sheet_batch_depth -= 1
+            if not self._sheet_batch_depth and self._sheet_update_pending:
+                self._sheet_update_pending = False
+                await self.update_google_sheets()
+
     async def hire_member(self, guild: discord.Guild, user: discord.Member, name: str, rank_role: discord.Role, reason: str, dn: str = None) -> Dict[str, Any]:
         new_rank_id = self.ROLE_TO_RANK_ID_MAPPING.get(rank_role.id)
         if not new_rank_id: return {"success": False, "error": f"Der gewählte Rang {rank_role.mention} ist ungültig."}
         if await self.get_member_details(user.id): return {"success": False, "error": f"{user.mention} ist bereits registriert."}
         new_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= new_rank_id <= rng[1]), None)
         if not new_division_id: return {"success": False, "error": "Keine passende Division für diesen Rang gefunden."}
-        if not dn:
-            min_dn, max_dn = DN_RANGES[new_division_id]
-            dn = await self._find_free_dn(min_dn, max_dn)
-            if not dn: return {"success": False, "error": "Keine freie Dienstnummer in der Division gefunden."}
-        try:
-            await self._execute_query("INSERT INTO members (dn, name, rank, discord_id, hired_at) VALUES (%s, %s, %s, %s, CURDATE())", (dn, name, new_rank_id, user.id))
-            await self._execute_query("INSERT INTO units (dn) VALUES (%s)", (dn,))
-        except Exception as e:
-            return {"success": False, "error": f"Datenbankfehler: {e}"}
+        auto_dn = not dn
+        if not auto_dn and not self.dn_allocator.claim(dn):
+            return {"success": False, "error": f"Die Dienstnummer `{dn}` ist bereits vergeben."}
+        # Bei automatischer Vergabe wird eine DN, die außerhalb des Bots belegt wurde, übersprungen.
+        for _ in range(3 if auto_dn else 1):
+            if auto_dn:
+                dn = await self._reserve_dn(new_division_id)
+                if not dn: return {"success": False, "error": "Keine freie Dienstnummer in der Division gefunden."}
+            try:
+                await self._insert_member_rows(dn, name, new_rank_id, user.id)
+                break
+            except aiomysql.IntegrityError as e:
+                self.dn_allocator.mark_used(dn)
+                db_error = e
+            except Exception as e:
+                self.dn_allocator.release(dn)
+                return {"success": False, "error": f"Datenbankfehler: {e}"}
+        else:
+            return {"success": False, "error": f"Datenbankfehler: {db_error}"}
+        self.dn_allocator.commit(dn)
         try:
             roles_to_add = [rank_role]
             STANDARD_ROLES = [935015868444868658, 1006304119541207140, 1213569073573793822]
@@ -134,7 +295,7 @@ class PersonalService(commands.Cog):
             await user.add_roles(*roles_to_add, reason=f"Einstellung: {reason}")
             await user.edit(nick=f"[PD-{dn}] {name}", reason="Einstellung")
         except discord.HTTPException as e:
-            return {"success": True, "warning": f"DB-Eintrag erfolgreich, aber Discord-Aktion fehlgeschlagen: {e}"}
+            return {"success": True, "dn": dn, "warning": f"DB-Eintrag erfolgreich, aber Discord-Aktion fehlgeschlagen: {e}"}
         await self.update_google_sheets()
         return {"success": True, "dn": dn, "division_id": new_division_id, "user": user, "rank_role": rank_role, "reason": reason}
 
@@ -143,6 +304,7 @@ class PersonalService(commands.Cog):
         if not member_details: return {"success": False, "error": f"{user.mention} ist nicht in der Datenbank."}
         dn = member_details["dn"]
         await self._delete_member_from_db(dn)
+        self.dn_allocator.release(dn)
         try:
             await user.kick(reason=f"Kündigung: {reason}")
         except discord.HTTPException:
@@ -151,79 +313,150 @@ class PersonalService(commands.Cog):
         return {"success": True, "dn": dn, "user": user, "reason": reason}
 
     async def promote_member(self, guild: discord.Guild, user: discord.Member, new_rank_role: discord.Role, reason: str, ignore_lock: bool = False) -> Dict[str, Any]:
-        member_details = await self.get_member_details(user.id)
-        if not member_details: return {"success": False, "error": f"{user.mention} ist nicht in der Datenbank."}
-        current_dn, current_rank_id, user_name = member_details["dn"], int(member_details["rank"]), member_details["name"]
+        return await self._apply_rank_change(guild, user, new_rank_role, reason, promote=True, ignore_lock=ignore_lock)
+
+    async def demote_member(self, guild: discord.Guild, user: discord.Member, new_rank_role: discord.Role, reason: str) -> Dict[str, Any]:
+        return await self._apply_rank_change(guild, user, new_rank_role, reason, promote=False)
+
+    async def _apply_rank_change(self, guild: discord.Guild, user: discord.Member, new_rank_role: discord.Role, reason: str, promote: bool, ignore_lock: bool = False) -> Dict[str, Any]:
+        """
+        Führt eine Beförderung/Degradierung als eine DB-Transaktion und einen einzigen
+        member.edit-Aufruf aus. Der Discord-Aufruf erfolgt erst nach dem Commit, damit
+        Zeilensperre und Pool-Verbindung nicht über den API-Aufruf gehalten werden;
+        schlägt er fehl, wird die Änderung in der DB wieder rückgängig gemacht.
+        """
+        action = "Beförderung" if promote else "Degradierung"
+        timer = PhaseTimer(f"{action} {user} ({user.id})")
         new_rank_id = self.ROLE_TO_RANK_ID_MAPPING.get(new_rank_role.id)
-        if not new_rank_id or new_rank_id <= current_rank_id: return {"success": False, "error": "Ungültiger oder niedrigerer Rang."}
         uprank_sperre_service: UprankSperreService = self.bot.get_cog("UprankSperreService")
-        if uprank_sperre_service and not ignore_lock:
-            is_gesperrt, sperre_ende = await uprank_sperre_service.check_sperre(current_dn)
-            if is_gesperrt: return {"success": False, "error": f"{user.mention} hat eine Uprank-Sperre bis <t:{int(sperre_ende.timestamp())}:D>."}
-        old_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= current_rank_id <= rng[1]), None)
-        new_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= new_rank_id <= rng[1]), None)
-        new_dn, dn_changed = current_dn, False
-        if old_division_id != new_division_id:
-            min_dn, max_dn = DN_RANGES[new_division_id]
-            new_dn_candidate = await self._find_free_dn(min_dn, max_dn)
-            if not new_dn_candidate: return {"success": False, "error": "Keine freie DN in der neuen Division gefunden."}
-            await self._change_dn_in_db(current_dn, new_dn_candidate, user.id)
-            new_dn, dn_changed = new_dn_candidate, True
-        await self._execute_query("UPDATE members SET rank = %s WHERE dn = %s", (new_rank_id, new_dn))
+
+        async with self.bot.db_pool.acquire() as conn:
+            await conn.begin()
+            reserved_dn = None
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    with timer.phase("db_lesen"):
+                        await cursor.execute("SELECT m.dn, m.rank, m.name, s.sperre_ende FROM members m LEFT JOIN upranksperre s ON s.dn = m.dn WHERE m.discord_id = %s FOR UPDATE", (user.id,))
+                        member_details = await cursor.fetchone()
+                    if not member_details:
+                        await conn.rollback()
+                        return {"success": False, "error": f"{user.mention} ist nicht in der Datenbank."}
+
+                    current_dn, current_rank_id, user_name = member_details["dn"], int(member_details["rank"]), member_details["name"]
+                    if promote and (not new_rank_id or new_rank_id <= current_rank_id):
+                        await conn.rollback()
+                        return {"success": False, "error": "Ungültiger oder niedrigerer Rang."}
+                    if not promote and (not new_rank_id or new_rank_id >= current_rank_id):
+                        await conn.rollback()
+                        return {"success": False, "error": "Ungültiger oder höherer Rang."}
+
+                    sperre_ende = member_details["sperre_ende"]
+                    if promote and uprank_sperre_service and not ignore_lock and sperre_ende and sperre_ende.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc):
+                        await conn.rollback()
+                        return {"success": False, "error": f"{user.mention} hat eine Uprank-Sperre bis <t:{int(sperre_ende.timestamp())}:D>."}
+
+                    old_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= current_rank_id <= rng[1]), None)
+                    new_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= new_rank_id <= rng[1]), None)
+                    new_dn, dn_changed = current_dn, False
+                    if old_division_id != new_division_id:
+                        reserved_dn = await self._reserve_dn(new_division_id)
+                        if not reserved_dn:
+                            await conn.rollback()
+                            return {"success": False, "error": "Keine freie DN in der neuen Division gefunden."}
+                        new_dn, dn_changed = reserved_dn, True
+
+                    with timer.phase("db_schreiben"):
+                        await self._write_rank_change(cursor, user.id, current_dn, new_dn, new_rank_id)
+
+                with timer.phase("db_commit"):
+                    await conn.commit()
+            except Exception:
+                await conn.rollback()
+                if reserved_dn: self.dn_allocator.release(reserved_dn)
+                raise
+
+        # Alle Rollen- und Nickname-Änderungen in einem einzigen API-Aufruf. Die Rollenliste wird
+        # ersetzt, daher frisch laden: Das übergebene Member-Objekt kann durch vorherige Edits
+        # (z.B. mehrere MassCommand-Zeilen, Outbox-Jobs) veraltet sein.
         try:
-            roles_to_remove = [guild.get_role(rid) for rid in self.RANK_MAPPING.values()]
-            if old_division_id: roles_to_remove.append(guild.get_role(old_division_id))
-            await user.remove_roles(*[r for r in roles_to_remove if r and r in user.roles], reason=f"Beförderung: {reason}")
-            roles_to_add = [new_rank_role]
-            if new_division_id: roles_to_add.append(guild.get_role(new_division_id))
-            await user.add_roles(*[r for r in roles_to_add if r], reason=f"Beförderung: {reason}")
-            if dn_changed: await user.edit(nick=f"[PD-{new_dn}] {user_name}", reason="Beförderung mit DN-Wechsel")
+            with timer.phase("discord_laden"):
+                current_member = await guild.fetch_member(user.id)
+        except discord.HTTPException:
+            current_member = guild.get_member(user.id) or user
+        dropped_role_ids = set(self.RANK_MAPPING.values())
+        if old_division_id: dropped_role_ids.add(old_division_id)
+        new_roles = [r for r in current_member.roles if r.id not in dropped_role_ids and not r.is_default()]
+        for role in (new_rank_role, guild.get_role(new_division_id) if new_division_id else None):
+            if role and role not in new_roles: new_roles.append(role)
+        edit_kwargs = {"roles": new_roles, "reason": f"{action}: {reason}"}
+        if dn_changed: edit_kwargs["nick"] = f"[PD-{new_dn}] {user_name}"
+        try:
+            with timer.phase("discord"):
+                await current_member.edit(**edit_kwargs)
         except discord.HTTPException as e:
-            return {"success": True, "warning": f"DB-Update erfolgreich, aber Discord-Aktion fehlgeschlagen: {e}"}
-        if uprank_sperre_service:
-            await uprank_sperre_service.setze_sperre(new_dn, new_rank_id)
-        await self.update_google_sheets()
+            with timer.phase("db_rueckgaengig"):
+                await self._revert_rank_change(user.id, current_dn, current_rank_id, new_dn, new_rank_id)
+            if reserved_dn: self.dn_allocator.release(reserved_dn)
+            self.bot.log(timer.summary())
+            return {"success": False, "error": f"Discord-Aktion fehlgeschlagen, die Änderung wurde zurückgerollt: {e}"}
+
+        if dn_changed:
+            self.dn_allocator.commit(new_dn)
+            self.dn_allocator.release(current_dn)
+            if uprank_sperre_service: uprank_sperre_service.move_lock(current_dn, new_dn)
+        with timer.phase("nachlauf"):
+            if promote and uprank_sperre_service:
+                await uprank_sperre_service.setze_sperre(new_dn, new_rank_id)
+            await self.update_google_sheets()
+        self.bot.log(timer.summary())
         return {"success": True, "dn_changed": dn_changed, "new_dn": new_dn, "new_division_id": new_division_id}
 
-    async def demote_member(self, guild: discord.Guild, user: discord.Member, new_rank_role: discord.Role, reason: str) -> Dict[str, Any]:
-        member_details = await self.get_member_details(user.id)
-        if not member_details: return {"success": False, "error": f"{user.mention} ist nicht in der Datenbank."}
-        current_dn, current_rank_id, user_name = member_details["dn"], int(member_details["rank"]), member_details["name"]
-        new_rank_id = self.ROLE_TO_RANK_ID_MAPPING.get(new_rank_role.id)
-        if not new_rank_id or new_rank_id >= current_rank_id: return {"success": False, "error": "Ungültiger oder höherer Rang."}
-        old_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= current_rank_id <= rng[1]), None)
-        new_division_id = next((div for rng, div in DIVISION_MAPPING.items() if rng[0] <= new_rank_id <= rng[1]), None)
-        new_dn, dn_changed = current_dn, False
-        if old_division_id != new_division_id:
-            min_dn, max_dn = DN_RANGES[new_division_id]
-            new_dn_candidate = await self._find_free_dn(min_dn, max_dn)
-            if not new_dn_candidate: return {"success": False, "error": "Keine freie DN in der neuen Division gefunden."}
-            await self._change_dn_in_db(current_dn, new_dn_candidate, user.id)
-            new_dn, dn_changed = new_dn_candidate, True
-        await self._execute_query("UPDATE members SET rank = %s WHERE dn = %s", (new_rank_id, new_dn))
+    async def _write_rank_change(self, cursor, user_id: int, from_dn: str, to_dn: str, rank_id: int):
+        """Setzt Rang (und bei Divisionswechsel die DN samt abhängiger Tabellen) eines Mitglieds."""
+        if from_dn == to_dn:
+            await cursor.execute("UPDATE members SET rank = %s WHERE discord_id = %s", (rank_id, user_id))
+            return
+        await cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
         try:
-            roles_to_remove = [guild.get_role(rid) for rid in self.RANK_MAPPING.values()]
-            if old_division_id: roles_to_remove.append(guild.get_role(old_division_id))
-            await user.remove_roles(*[r for r in roles_to_remove if r and r in user.roles], reason=f"Degradierung: {reason}")
-            roles_to_add = [new_rank_role]
-            if new_division_id: roles_to_add.append(guild.get_role(new_division_id))
-            await user.add_roles(*[r for r in roles_to_add if r], reason=f"Degradierung: {reason}")
-            if dn_changed: await user.edit(nick=f"[PD-{new_dn}] {user_name}", reason="Degradierung mit DN-Wechsel")
-        except discord.HTTPException as e:
-            return {"success": True, "warning": f"DB-Update erfolgreich, aber Discord-Aktion fehlgeschlagen: {e}"}
-        await self.update_google_sheets()
-        return {"success": True, "dn_changed": dn_changed, "new_dn": new_dn, "new_division_id": new_division_id}
+            await cursor.execute("UPDATE members SET dn = %s, rank = %s WHERE discord_id = %s", (to_dn, rank_id, user_id))
+            await cursor.execute("UPDATE units SET dn = %s WHERE dn = %s", (to_dn, from_dn))
+            await cursor.execute("UPDATE upranksperre SET dn = %s WHERE dn = %s", (to_dn, from_dn))
+        finally:
+            await cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+
+    async def _revert_rank_change(self, user_id: int, old_dn: str, old_rank_id: int, new_dn: str, new_rank_id: int):
+        """Macht eine bereits committete Rangänderung rückgängig, sofern das Mitglied seitdem unverändert ist."""
+        async with self.bot.db_pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute("SELECT dn, rank FROM members WHERE discord_id = %s FOR UPDATE", (user_id,))
+                    row = await cursor.fetchone()
+                    if row and str(row["dn"]) == str(new_dn) and int(row["rank"]) == new_rank_id:
+                        await self._write_rank_change(cursor, user_id, new_dn, old_dn, old_rank_id)
+                    else:
+                        print(f"WARNUNG: Rangänderung für {user_id} nicht zurückgerollt, Datensatz wurde inzwischen geändert.")
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
 
     async def change_dn(self, user: discord.Member, new_dn: str) -> Dict[str, Any]:
         member_details = await self.get_member_details(user.id)
         if not member_details: return {"success": False, "error": f"{user.mention} ist nicht in der Datenbank."}
         current_dn, user_name = member_details["dn"], member_details["name"]
-        if await self._check_dn_exists(new_dn): return {"success": False, "error": f"Die Dienstnummer `{new_dn}` ist bereits vergeben."}
-        await self._change_dn_in_db(current_dn, new_dn, user.id)
+        if await self._check_dn_exists(new_dn) or not self.dn_allocator.claim(new_dn): return {"success": False, "error": f"Die Dienstnummer `{new_dn}` ist bereits vergeben."}
+        try:
+            await self._change_dn_in_db(current_dn, new_dn, user.id)
+        except Exception:
+            self.dn_allocator.release(new_dn)
+            raise
+        self.dn_allocator.commit(new_dn)
+        self.dn_allocator.release(current_dn)
         try:
             await user.edit(nick=f"[PD-{new_dn}] {user_name}", reason="Dienstnummer manuell geändert")
         except discord.HTTPException as e:
-            return {"success": True, "warning": f"DB-Update erfolgreich, aber Nickname-Update fehlgeschlagen: {e}"}
+            return {"success": True, "old_dn": current_dn, "new_dn": new_dn, "warning": f"DB-Update erfolgreich, aber Nickname-Update fehlgeschlagen: {e}"}
         await self.update_google_sheets()
         return {"success": True, "old_dn": current_dn, "new_dn": new_dn}
 
@@ -1,30 +1,50 @@
 # bot/services/sanction_service.py
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
+import asyncio
 from datetime import datetime, timedelta, timezone
 import aiomysql
 import yaml
 import re
-from typing import TYPE_CHECKING, Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List, Tuple
+
+from utils.db_helpers import ensure_index
+from utils.expiry_scheduler import ExpiryScheduler
 
 if TYPE_CHECKING:
     from main import MyBot
     from services.display_service import DisplayService
 
+# --- Konstanten ---
+WARNING_DURATION = timedelta(days=7)
+ESCALATION_THRESHOLD = 3
+WARNING_COUNT_PATTERN = re.compile(r"(\d+)\s*\.?\s*verwarnung", re.IGNORECASE) # z.B. "1. Verwarnung", "2 Verwarnungen"
+WARNING_PATTERN = re.compile(r"verwarn", re.IGNORECASE)
+STATS_CACHE_TTL = timedelta(seconds=60)
+STATS_TOP_USERS = 5
+PAGE_COLUMNS = (
+    "id, user_name, strafe, grund, zahlungsdatum, erstellt_von_name, erstellt_am, "
+    "erledigt, erledigt_am, erledigt_von_name"
+)
+
 class SanctionService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "SanctionService"
         self.config = self._load_config()
+        self._stats_cache: Tuple[Dict[str, Any], datetime] | None = None
+        self.warning_expiries = ExpiryScheduler(self._expire_warnings, name="Verwarnungen")
+        self._expiry_loader: asyncio.Task | None = None
 
     async def cog_load(self):
         await self._ensure_table_exists()
         await self._ensure_sanctions_table_exists()  # Neue Tabelle für Sanktionen
-        self.verwarnung_cleanup_task.start()
+        self._expiry_loader = asyncio.create_task(self._load_warning_expiries())
 
     def cog_unload(self):
-        self.verwarnung_cleanup_task.cancel()
+        if self._expiry_loader: self._expiry_loader.cancel()
+        self.warning_expiries.stop()
 
     def _load_config(self) -> Dict[str, Any]:
         try:
@@ -58,6 +78,7 @@ class SanctionService(commands.Cog):
                 KEY user_id_idx (user_id)
             );
         """)
+        await ensure_index(self._execute_query, "verwarnungen", "granted_at_idx", ("granted_at",))
 
     async def _ensure_sanctions_table_exists(self):
         """Erstellt die Tabelle für Sanktionen falls sie nicht existiert."""
@@ -82,6 +103,10 @@ class SanctionService(commands.Cog):
                 KEY erstellt_am_idx (erstellt_am)
             );
         """)
+        # Indizes für die seitenweise Anzeige nach (erstellt_am, id) mit Filtern
+        await ensure_index(self._execute_query, "sanktionen", "erledigt_erstellt_idx", ("erledigt", "erstellt_am", "id"))
+        await ensure_index(self._execute_query, "sanktionen", "user_erstellt_idx", ("user_id", "erstellt_am", "id"))
+        await ensure_index(self._execute_query, "sanktionen", "ersteller_erstellt_idx", ("erstellt_von_id", "erstellt_am", "id"))
 
     async def count_warnings_from_db(self, user_id: int) -> int:
         """Zählt aktive Verwarnungen für einen User aus der Datenbank."""
@@ -92,18 +117,78 @@ class SanctionService(commands.Cog):
         )
         return result['count'] if result else 0
 
-    async def save_sanction_to_db(self, user: discord.Member, strafe: str, grund: str, 
-                                 zahlungsdatum: str, erstellt_von: discord.Member, deckname: str = None):
-        """Speichert eine neue Sanktion in der Datenbank."""
-        await self._execute_query("""
-            INSERT INTO sanktionen (
-                user_id, user_name, deckname, strafe, grund, zahlungsdatum,
-                erstellt_von_id, erstellt_von_name, erstellt_am
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            user.id, user.display_name, deckname, strafe, grund, zahlungsdatum,
-            erstellt_von.id, erstellt_von.display_name, datetime.now(timezone.utc)
-        ))
+    async def issue_sanction(self, user: discord.Member, strafe: str, grund: str, zahlungsdatum: str,
+                             erstellt_von: discord.Member, deckname: str = None) -> Dict[str, Any]:
+        """
+        Speichert eine Sanktion samt daraus folgender Verwarnungen in einer Transaktion und
+        vergibt die neuen Verwarnungs-Rollen anschließend mit einer einzigen Rollenänderung.
+        """
+        neue_verwarnungen = self.parse_warning_count(strafe)
+        granted_at = datetime.now(timezone.utc)
+        neue_rollen: List[discord.Role] = []
+        warning_ids: List[int] = []
+        gesamt = 0
+
+        try:
+            async with self.bot.db_pool.acquire() as conn:
+                await conn.begin()
+                try:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute("""
+                            INSERT INTO sanktionen (
+                                user_id, user_name, deckname, strafe, grund, zahlungsdatum,
+                                erstellt_von_id, erstellt_von_name, erstellt_am
+                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """, (
+                            user.id, user.display_name, deckname, strafe, grund, zahlungsdatum,
+                            erstellt_von.id, erstellt_von.display_name, granted_at
+                        ))
+                        if neue_verwarnungen:
+                            await cursor.execute("SELECT COUNT(*) FROM verwarnungen WHERE user_id = %s", (user.id,))
+                            (aktuelle_verwarnungen,) = await cursor.fetchone()
+                            gesamt = aktuelle_verwarnungen + neue_verwarnungen
+                            print(f"🔄 Verarbeite {neue_verwarnungen} neue Verwarnungen für {user.display_name}")
+                            print(f"   Vorher: {aktuelle_verwarnungen}, Nachher: {gesamt}")
+                            neue_rollen = self._warning_roles_to_add(user, gesamt)
+                            for rolle in neue_rollen:
+                                await cursor.execute(
+                                    "INSERT INTO verwarnungen (user_id, role_id, granted_at) VALUES (%s, %s, %s)",
+                                    (user.id, rolle.id, granted_at)
+                                )
+                                warning_ids.append(cursor.lastrowid)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        except Exception as e:
+            print(f"❌ Fehler beim Speichern der Sanktion für {user.display_name}: {e}")
+            return {"success": False, "error": f"Die Sanktion konnte nicht gespeichert werden: {e}"}
+        self._stats_cache = None
+
+        result = {"success": True, "neue_verwarnungen": neue_verwarnungen, "neue_rollen": [r.name for r in neue_rollen], "warning": None}
+        if neue_rollen:
+            reason = f"Sanktion: {gesamt} Verwarnungen erreicht"
+            roles = [r for r in user.roles if not r.is_default()] + neue_rollen
+            edit = lambda: user.edit(roles=roles, reason=reason)
+            try:
+                if write_queue := self.bot.get_cog("WriteQueueService"):
+                    await write_queue.submit(edit)
+                else:
+                    await edit()
+                for warning_id in warning_ids:
+                    self.warning_expiries.schedule(warning_id, granted_at + WARNING_DURATION)
+                print(f"✅ Rollen {', '.join(result['neue_rollen'])} für {user.display_name} hinzugefügt")
+            except Exception as e:
+                # Ohne Rolle zählt die Verwarnung nicht, damit DB und Discord übereinstimmen
+                format_strings = ','.join(['%s'] * len(warning_ids))
+                await self._execute_query(f"DELETE FROM verwarnungen WHERE id IN ({format_strings})", tuple(warning_ids))
+                print(f"❌ Fehler beim Hinzufügen der Verwarnungs-Rollen für {user.display_name}: {e}")
+                result["neue_rollen"] = []
+                result["warning"] = f"Die Verwarnungs-Rollen konnten nicht vergeben werden: {e}"
+
+        if gesamt >= ESCALATION_THRESHOLD:
+            await self._handle_escalation(user, gesamt)
+        return result
 
     async def get_open_sanctions(self, user_id: int = None) -> List[Dict]:
         """Holt alle offenen Sanktionen oder nur die eines bestimmten Users."""
@@ -143,6 +228,7 @@ class SanctionService(commands.Cog):
             completed_by.display_name, 
             sanction_id
         ))
+        self._stats_cache = None
         return True
 
     async def get_all_sanctions(self, user_id: int = None, limit: int = 50) -> List[Dict]:
@@ -157,125 +243,146 @@ class SanctionService(commands.Cog):
         result = await self._execute_query(query, args, fetch="all")
         return result if result else []
 
-    async def extract_and_process_warnings(self, member: discord.Member, strafe: str) -> int:
+    async def get_sanctions_page(self, after: Tuple[datetime, int] = None, limit: int = 10,
+                                 erledigt: bool = None, user_id: int = None, erstellt_von_id: int = None,
+                                 von: datetime = None, bis: datetime = None) -> List[Dict]:
         """
-        Extrahiert Verwarnungen aus der Strafe und verarbeitet sie.
-        Gibt die Anzahl der neuen Verwarnungen zurück.
+        Holt eine Seite Sanktionen (neueste zuerst) per Keyset-Pagination auf (erstellt_am, id).
+        `after` ist der Schlüssel des letzten Eintrags der vorherigen Seite. Es wird ein
+        Eintrag mehr als `limit` geladen, damit der Aufrufer erkennt, ob es weitere Seiten gibt.
         """
-        # Verwarnungen aus der Strafe extrahieren
-        verwarnung_patterns = [
-            r"(\d+)\s*\.?\s*verwarnung",
-            r"verwarnung",
-            r"(\d+)\s*verwarn",
-            r"verwarn"
-        ]
-        
-        neue_verwarnungen = 0
-        strafe_lower = strafe.lower()
-        
-        # Prüfe auf explizite Anzahl (z.B. "1. Verwarnung", "2 Verwarnungen")
-        for pattern in verwarnung_patterns[:2]:  # Nur die ersten beiden mit Zahlen
-            matches = re.findall(pattern, strafe_lower, re.IGNORECASE)
-            if matches:
-                neue_verwarnungen = sum(int(m) for m in matches if m.isdigit())
-                break
-        
+        conditions, args = [], []
+        if erledigt is not None:
+            conditions.append("erledigt = %s"); args.append(erledigt)
+        if user_id:
+            conditions.append("user_id = %s"); args.append(user_id)
+        if erstellt_von_id:
+            conditions.append("erstellt_von_id = %s"); args.append(erstellt_von_id)
+        if von:
+            conditions.append("erstellt_am >= %s"); args.append(von)
+        if bis:
+            conditions.append("erstellt_am < %s"); args.append(bis)
+        if after:
+            conditions.append("(erstellt_am < %s OR (erstellt_am = %s AND id < %s))")
+            args.extend((after[0], after[0], after[1]))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT {PAGE_COLUMNS} FROM sanktionen {where} ORDER BY erstellt_am DESC, id DESC LIMIT %s"
+        result = await self._execute_query(query, tuple(args) + (limit + 1,), fetch="all")
+        return result if result else []
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        """
+        Zählt Sanktionen direkt in der Datenbank (exakt, unabhängig von der Tabellengröße).
+        Das Ergebnis wird kurz zwischengespeichert und bei neuen/erledigten Sanktionen verworfen.
+        """
+        if self._stats_cache and datetime.now(timezone.utc) < self._stats_cache[1]:
+            return self._stats_cache[0]
+
+        totals = await self._execute_query(
+            "SELECT COUNT(*) AS gesamt, COALESCE(SUM(erledigt), 0) AS erledigt FROM sanktionen",
+            fetch="one"
+        )
+        top_users = await self._execute_query("""
+            SELECT user_id, MAX(user_name) AS user_name, COUNT(*) AS anzahl
+            FROM sanktionen GROUP BY user_id ORDER BY anzahl DESC LIMIT %s
+        """, (STATS_TOP_USERS,), fetch="all") or []
+
+        gesamt, erledigt = int(totals['gesamt']), int(totals['erledigt'])
+        stats = {
+            "gesamt": gesamt,
+            "erledigt": erledigt,
+            "offen": gesamt - erledigt,
+            "top_users": [(row['user_name'], row['anzahl']) for row in top_users],
+        }
+        self._stats_cache = (stats, datetime.now(timezone.utc) + STATS_CACHE_TTL)
+        return stats
+
+    @staticmethod
+    def parse_warning_count(strafe: str) -> int:
+        """Ermittelt die Anzahl neuer Verwarnungen aus dem Strafentext."""
+        # Explizite Anzahl (z.B. "1. Verwarnung", "2 Verwarnungen")
+        neue_verwarnungen = sum(int(m) for m in WARNING_COUNT_PATTERN.findall(strafe))
         # Wenn keine Zahl gefunden, aber "Verwarnung" im Text, dann 1 Verwarnung
-        if neue_verwarnungen == 0:
-            for pattern in verwarnung_patterns[2:]:  # Die ohne Zahlen
-                if re.search(pattern, strafe_lower, re.IGNORECASE):
-                    neue_verwarnungen = 1
-                    break
-
-        # Verwarnungen verarbeiten falls welche gefunden
-        if neue_verwarnungen > 0:
-            await self._process_warnings(member, neue_verwarnungen)
-        
+        if neue_verwarnungen == 0 and WARNING_PATTERN.search(strafe):
+            neue_verwarnungen = 1
         return neue_verwarnungen
 
-    async def _process_warnings(self, member: discord.Member, neue_verwarnungen: int):
-        """Verarbeitet neue Verwarnungen für ein Mitglied."""
-        aktuelle_verwarnungen = await self.count_warnings_from_db(member.id)
-        gesamt = aktuelle_verwarnungen + neue_verwarnungen
-        
-        print(f"🔄 Verarbeite {neue_verwarnungen} neue Verwarnungen für {member.display_name}")
-        print(f"   Vorher: {aktuelle_verwarnungen}, Nachher: {gesamt}")
-        
-        # Rollen basierend auf Verwarnungsanzahl zuweisen
+    def _warning_roles_to_add(self, member: discord.Member, gesamt: int) -> List[discord.Role]:
+        """Verwarnungs-Rollen, die bei `gesamt` Verwarnungen fehlen."""
         rollen_config = [
             (1, self.config.get('verwarnung_1_role_id')),
             (2, self.config.get('verwarnung_2_role_id'))
         ]
-        
+        rollen = []
         for stufe, rollen_id in rollen_config:
             if gesamt >= stufe and rollen_id:
                 rolle = member.guild.get_role(rollen_id)
                 if rolle and rolle not in member.roles:
-                    try:
-                        await member.add_roles(rolle, reason=f"Sanktion: {gesamt} Verwarnungen erreicht")
-                        await self._execute_query(
-                            "INSERT INTO verwarnungen (user_id, role_id, granted_at) VALUES (%s, %s, %s)", 
-                            (member.id, rolle.id, datetime.now(timezone.utc))
-                        )
-                        print(f"✅ Rolle {rolle.name} für {member.display_name} hinzugefügt")
-                    except Exception as e:
-                        print(f"❌ Fehler beim Hinzufügen der Rolle {rolle.name}: {e}")
-
-        # Eskalation bei 3+ Verwarnungen
-        if gesamt >= 3:
-            await self._handle_escalation(member, gesamt)
+                    rollen.append(rolle)
+        return rollen
 
     async def _handle_escalation(self, member: discord.Member, gesamt_verwarnungen: int):
         """Behandelt Eskalation bei 3+ Verwarnungen."""
         # Eskalation nur loggen, keine Channel-Benachrichtigung mehr
         print(f"⚠️ ESKALATION: {member.display_name} hat {gesamt_verwarnungen} Verwarnungen erreicht!")
 
-    @tasks.loop(hours=1)
-    async def verwarnung_cleanup_task(self):
-        """Entfernt abgelaufene Verwarnungen (nach 7 Tagen)."""
-        guild = self.bot.get_guild(self.config.get('guild_id'))
-        if not guild: 
-            return
+    # --- Ablauf von Verwarnungen ---
+    async def _load_warning_expiries(self):
+        """Baut die Ablauf-Planung aus der Datenbank neu auf (bereits Abgelaufenes wird sofort verarbeitet)."""
+        await self.bot.wait_until_ready()
+        rows = await self._execute_query("SELECT id, granted_at FROM verwarnungen", fetch="all") or []
+        for row in rows:
+            self.warning_expiries.schedule(row['id'], row['granted_at'] + WARNING_DURATION)
+        self.warning_expiries.start()
+        print(f"⏰ {len(rows)} Verwarnungen für den Ablauf eingeplant.")
 
-        seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    async def _expire_warnings(self, warning_ids: List[int]):
+        """Entfernt die Rollen abgelaufener Verwarnungen (nach 7 Tagen) und löscht die Einträge."""
+        format_strings = ','.join(['%s'] * len(warning_ids))
         abgelaufene = await self._execute_query(
-            "SELECT * FROM verwarnungen WHERE granted_at < %s", 
-            (seven_days_ago,), 
+            f"SELECT * FROM verwarnungen WHERE id IN ({format_strings})",
+            tuple(warning_ids),
             fetch="all"
         )
-        
-        if not abgelaufene: 
+        if not abgelaufene:
             return
 
-        print(f"🧹 Bereinige {len(abgelaufene)} abgelaufene Verwarnungen (nach 7 Tagen)...")
-        
+        guild = self.bot.get_guild(self.config.get('guild_id'))
+        if guild:
+            await asyncio.gather(*(self._remove_warning_role(guild, eintrag) for eintrag in abgelaufene))
+
         ids_to_delete = [eintrag["id"] for eintrag in abgelaufene]
-        
-        for eintrag in abgelaufene:
-            try:
-                member = await guild.fetch_member(eintrag["user_id"])
-                rolle = guild.get_role(eintrag["role_id"])
-                if member and rolle and rolle in member.roles:
-                    await member.remove_roles(rolle, reason="Verwarnung abgelaufen (7 Tage)")
-                    print(f"✅ Verwarnung-Rolle {rolle.name} von {member.display_name} entfernt (nach 7 Tagen)")
-            except discord.NotFound:
-                print(f"⚠️ Mitglied {eintrag['user_id']} nicht mehr auf dem Server")
-                continue
-            except Exception as e:
-                print(f"❌ Fehler beim Entfernen abgelaufener Verwarnungs-Rolle: {e}")
-
-        # Datenbankeinträge löschen
-        if ids_to_delete:
-            format_strings = ','.join(['%s'] * len(ids_to_delete))
-            await self._execute_query(
-                f"DELETE FROM verwarnungen WHERE id IN ({format_strings})", 
-                tuple(ids_to_delete)
-            )
-            print(f"🗑️ {len(ids_to_delete)} abgelaufene Verwarnungseinträge aus DB gelöscht (nach 7 Tagen)")
-
-    @verwarnung_cleanup_task.before_loop
-    async def before_cleanup_loop(self):
-        await self.bot.wait_until_ready()
+        format_strings = ','.join(['%s'] * len(ids_to_delete))
+        await self._execute_query(
+            f"DELETE FROM verwarnungen WHERE id IN ({format_strings})", 
+            tuple(ids_to_delete)
+        )
+        print(f"🗑️ {len(ids_to_delete)} abgelaufene Verwarnungseinträge aus DB gelöscht (nach 7 Tagen)")
+
+    async def _remove_warning_role(self, guild: discord.Guild, eintrag: Dict):
+        rolle = guild.get_role(eintrag["role_id"])
+        if not rolle:
+            return
+        try:
+            member = guild.get_member(eintrag["user_id"]) or await guild.fetch_member(eintrag["user_id"])
+        except discord.NotFound:
+            print(f"⚠️ Mitglied {eintrag['user_id']} nicht mehr auf dem Server")
+            return
+        except discord.HTTPException as e:
+            print(f"❌ Mitglied {eintrag['user_id']} konnte nicht geladen werden: {e}")
+            return
+        if rolle not in member.roles:
+            return
+        remove = lambda: member.remove_roles(rolle, reason="Verwarnung abgelaufen (7 Tage)")
+        try:
+            if write_queue := self.bot.get_cog("WriteQueueService"):
+                await write_queue.submit(remove)
+            else:
+                await remove()
+            print(f"✅ Verwarnung-Rolle {rolle.name} von {member.display_name} entfernt (nach 7 Tagen)")
+        except Exception as e:
+            print(f"❌ Fehler beim Entfernen abgelaufener Verwarnungs-Rolle: {e}")
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(SanctionService(bot))
\ No newline at end of file
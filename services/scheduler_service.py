@@ -0,0 +1,204 @@
+import discord
+from discord.ext import commands
+import aiomysql
+import asyncio
+import yaml
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Tuple
+
+from utils.expiry_scheduler import ExpiryScheduler
+
+if TYPE_CHECKING:
+    from main import MyBot
+
+# --- Konstanten ---
+CONFIG_FILE = "config/scheduler_config.yaml"
+LAST_RUN_KEY_PREFIX = "scheduler:"
+DEFAULT_TIMEZONE = "Europe/Berlin"
+MESSAGE_CATCH_UP = timedelta(hours=2)
+
+@dataclass
+class ScheduledJob:
+    name: str
+    callback: Callable[..., Awaitable[Any]]
+    interval: timedelta | None = None
+    weekdays: Tuple[int, ...] = ()
+    at: time | None = None
+    tz: ZoneInfo | None = None
+    catch_up: timedelta | None = None
+    scheduled_for: datetime | None = None
+
+    @property
+    def is_cron(self) -> bool:
+        return self.at is not None
+
+    def next_run(self, after: datetime) -> datetime:
+        if not self.is_cron:
+            return after + self.interval
+        local_date = after.astimezone(self.tz).date()
+        for offset in range(8):
+            day = local_date + timedelta(days=offset)
+            candidate = datetime.combine(day, self.at, tzinfo=self.tz)
+            if day.weekday() in self.weekdays and candidate > after:
+                return candidate.astimezone(timezone.utc)
+        raise ValueError(f"Job '{self.name}' hat keine gültigen Wochentage.")
+
+    def previous_run(self, before: datetime) -> datetime | None:
+        local_date = before.astimezone(self.tz).date()
+        for offset in range(8):
+            day = local_date - timedelta(days=offset)
+            candidate = datetime.combine(day, self.at, tzinfo=self.tz)
+            if day.weekday() in self.weekdays and candidate <= before:
+                return candidate.astimezone(timezone.utc)
+        return None
+
+class SchedulerService(commands.Cog):
+    """
+    Zentraler Zeitplaner für wiederkehrende Aufgaben. Alle Jobs liegen in einem Heap
+    (`ExpiryScheduler`), ein einziger Task wacht nur zum nächsten fälligen Zeitpunkt auf.
+
+    - `register_interval`: alle X Minuten (wie `tasks.loop(minutes=...)`)
+    - `register_cron`: an bestimmten Wochentagen zu einer Uhrzeit in einer Zeitzone;
+      der letzte Lauf wird in `bot_config` gespeichert und nach einem Neustart innerhalb
+      von `catch_up` nachgeholt.
+
+    Nach dem Laden wird das Event `scheduler_ready` ausgelöst, damit früher geladene Cogs
+    ihre Jobs registrieren können; später geladene Cogs registrieren direkt in `cog_load`.
+    """
+    def __init__(self, bot: "MyBot"):
+        self.bot = bot
+        self.__cog_name__ = "SchedulerService"
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._timer = ExpiryScheduler(self._run_due_jobs, name="SchedulerService")
+        self._starter: asyncio.Task | None = None
+
+    async def cog_load(self):
+        await self._register_scheduled_messages()
+        self._starter = asyncio.create_task(self._start_when_ready())
+        self.bot.dispatch("scheduler_ready", self)
+
+    def cog_unload(self):
+        if self._starter: self._starter.cancel()
+        self._timer.stop()
+        for task in self._running.values():
+            task.cancel()
+
+    async def _execute_query(self, query: str, args: tuple = None, fetch: str = None):
+        pool: aiomysql.Pool = self.bot.db_pool
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, args)
+                if fetch == "one": return await cursor.fetchone()
+                if fetch == "all": return await cursor.fetchall()
+
+    async def _start_when_ready(self):
+        await self.bot.wait_until_ready()
+        self._timer.start()
+
+    # --- Öffentliche API ---
+    def register_interval(self, name: str, callback: Callable[[], Awaitable[Any]], interval: timedelta, first_run: datetime = None):
+        """Führt `callback()` im Abstand `interval` aus, standardmäßig sofort zum ersten Mal."""
+        job = ScheduledJob(name=name, callback=callback, interval=interval)
+        self._add_job(job, first_run or datetime.now(timezone.utc))
+
+    async def register_cron(self, name: str, callback: Callable[[datetime], Awaitable[Any]], weekdays: Tuple[int, ...],
+                            at: time, tz: str = DEFAULT_TIMEZONE, catch_up: timedelta = None):
+        """
+        Führt `callback(scheduled_for)` an den Wochentagen `weekdays` (0=Montag) um `at` Ortszeit aus.
+        Wurde der letzte fällige Termin verpasst (z.B. Bot offline) und liegt er höchstens
+        `catch_up` zurück, wird er sofort nachgeholt.
+        """
+        job = ScheduledJob(name=name, callback=callback, weekdays=tuple(weekdays), at=at, tz=ZoneInfo(tz), catch_up=catch_up)
+        now = datetime.now(timezone.utc)
+        first_run = job.next_run(now)
+        if catch_up and (missed := job.previous_run(now)) and now - missed <= catch_up:
+            last_run = await self._get_last_run(name)
+            if last_run and last_run < missed:
+                first_run = missed
+        self._add_job(job, first_run)
+
+    def unregister(self, name: str):
+        self.jobs.pop(name, None)
+        self._timer.cancel(name)
+
+    # --- Ausführung ---
+    def _add_job(self, job: ScheduledJob, first_run: datetime):
+        job.scheduled_for = first_run
+        self.jobs[job.name] = job
+        self._timer.schedule(job.name, first_run)
+
+    async def _run_due_jobs(self, names: List[str]):
+        for name in names:
+            job = self.jobs.get(name)
+            if not job: continue
+            # Jobs laufen unabhängig voneinander; ein Job wird erst nach seinem Ende neu eingeplant
+            self._running[name] = asyncio.create_task(self._run_job(job))
+
+    async def _run_job(self, job: ScheduledJob):
+        scheduled_for = job.scheduled_for
+        try:
+            if job.is_cron:
+                await job.callback(scheduled_for)
+                await self._set_last_run(job.name, scheduled_for)
+            else:
+                await job.callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[SchedulerService] Fehler im Job '{job.name}': {e}")
+        finally:
+            self._running.pop(job.name, None)
+
+        if self.jobs.get(job.name) is not job: return # Inzwischen abgemeldet oder ersetzt
+        now = datetime.now(timezone.utc)
+        next_run = job.next_run(scheduled_for)
+        if next_run <= now:
+            next_run = job.next_run(now)
+        job.scheduled_for = next_run
+        self._timer.schedule(job.name, next_run)
+
+    async def _get_last_run(self, name: str) -> datetime | None:
+        row = await self._execute_query("SELECT config_value FROM bot_config WHERE config_key = %s", (LAST_RUN_KEY_PREFIX + name,), fetch="one")
+        return datetime.fromisoformat(row['config_value']) if row else None
+
+    async def _set_last_run(self, name: str, scheduled_for: datetime):
+        query = "INSERT INTO bot_config (config_key, config_value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)"
+        await self._execute_query(query, (LAST_RUN_KEY_PREFIX + name, scheduled_for.isoformat()))
+
+    # --- Geplante Nachrichten aus der Config ---
+    async def _register_scheduled_messages(self):
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                entries = (yaml.safe_load(f) or {}).get("scheduled_messages") or []
+        except FileNotFoundError:
+            print(f"WARNUNG: {CONFIG_FILE} nicht gefunden, keine geplanten Nachrichten.")
+            return
+
+        for entry in entries:
+            if not entry.get("enabled", True): continue
+            try:
+                hour, minute = map(int, str(entry["time"]).split(":"))
+                await self.register_cron(
+                    f"message.{entry['name']}",
+                    lambda scheduled_for, entry=entry: self._send_scheduled_message(entry),
+                    weekdays=(int(entry["day_of_week"]),), at=time(hour, minute),
+                    tz=entry.get("timezone", DEFAULT_TIMEZONE), catch_up=MESSAGE_CATCH_UP
+                )
+            except (KeyError, ValueError) as e:
+                print(f"FEHLER: Geplante Nachricht '{entry.get('name')}' ist ungültig konfiguriert: {e}")
+
+    async def _send_scheduled_message(self, entry: Dict[str, Any]):
+        channel = self.bot.get_channel(entry["channel_id"])
+        if not channel:
+            return print(f"Kanal {entry['channel_id']} für geplante Nachricht '{entry['name']}' nicht gefunden.")
+        send = lambda: channel.send(entry["message"], allowed_mentions=discord.AllowedMentions(roles=True))
+        if write_queue := self.bot.get_cog("WriteQueueService"):
+            await write_queue.submit(send)
+        else:
+            await send()
+
+async def setup(bot: "MyBot"):
+    await bot.add_cog(SchedulerService(bot))
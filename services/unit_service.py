@@ -3,6 +3,7 @@ from discord.ext import commands
 from discord import Interaction
 import aiomysql
 import asyncio
+from datetime import timedelta
 from functools import partial
 from typing import TYPE_CHECKING, List, Dict, Any
 
@@ -12,11 +13,70 @@ from googleapiclient.discovery import build
 
 if TYPE_CHECKING:
     from main import MyBot
+    from services.scheduler_service import SchedulerService
 
 # --- Konstanten ---
 SERVICE_ACCOUNT_FILE = "service_account.json"
 SPREADSHEET_ID = "1LuBHz2JQIhJjF80I0CZVuvF8pAOmRNKU77htabzx3_k"
 
+class UnitCapacityTracker:
+    """
+    Hält Limits und Belegung je Unit im Speicher. Reservierungen sind synchron und
+    damit innerhalb des Event-Loops atomar; offene Reservierungen zählen zur Belegung.
+    """
+    def __init__(self):
+        self._limits: Dict[str, int] = {}
+        self._counts: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._delta_during_sync: Dict[str, int] | None = None
+        self.loaded = False
+
+    def begin_sync(self):
+        """Merkt sich alle Änderungen, die während eines laufenden DB-Abgleichs festgeschrieben werden."""
+        self._delta_during_sync = {}
+
+    def abort_sync(self):
+        self._delta_during_sync = None
+
+    def load(self, limits: Dict[str, int], counts: Dict[str, int]):
+        """Übernimmt Limits und Belegung aus der DB; offene Reservierungen bleiben erhalten."""
+        delta = self._delta_during_sync or {}
+        self._limits = dict(limits)
+        self._counts = {unit: max(0, counts.get(unit, 0) + delta.get(unit, 0)) for unit in limits}
+        self._delta_during_sync = None
+        self.loaded = True
+
+    def capacity(self, unit_name: str) -> tuple[int, int] | None:
+        if unit_name not in self._limits: return None
+        return (self._counts.get(unit_name, 0) + self._pending.get(unit_name, 0), self._limits[unit_name])
+
+    def reserve(self, unit_name: str, override: bool = False) -> bool:
+        """Reserviert einen Platz; mit `override` auch über das Limit hinaus."""
+        capacity = self.capacity(unit_name)
+        if not capacity: return False
+        if capacity[0] >= capacity[1] and not override: return False
+        self._pending[unit_name] = self._pending.get(unit_name, 0) + 1
+        return True
+
+    def _apply(self, unit_name: str, change: int):
+        self._counts[unit_name] = max(0, self._counts.get(unit_name, 0) + change)
+        if self._delta_during_sync is not None:
+            self._delta_during_sync[unit_name] = self._delta_during_sync.get(unit_name, 0) + change
+
+    def commit(self, unit_name: str):
+        """Bestätigt eine Reservierung, nachdem der DB-Eintrag geschrieben wurde."""
+        self.release(unit_name)
+        self._apply(unit_name, 1)
+
+    def release(self, unit_name: str):
+        """Gibt eine nicht genutzte Reservierung wieder frei."""
+        if self._pending.get(unit_name, 0) > 0:
+            self._pending[unit_name] -= 1
+
+    def leave(self, unit_name: str):
+        """Verbucht einen Austritt."""
+        self._apply(unit_name, -1)
+
 class UnitService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
@@ -39,8 +99,41 @@ class UnitService(commands.Cog):
             1376692472213934202: [1376903575338352751, 1376903570854772766, 1376903562205990932, 1376903544904482919, 1376692842742681701, 1376692683288084560], # GTF
             1212825535005204521: [1325631255101968454, 1325631253189361795, 1395498540402479134, 1212825593796890694, 1212825879898759241, 1212825936592896122] # SHP
         }
+        # Transitive Abhängigkeiten je Unit-Rolle (inkl. der Rolle selbst), einmalig berechnet
+        self.ROLE_DEPENDENCY_CLOSURE = self._build_dependency_closure(self.ROLE_DEPENDENCIES)
+        self.capacity_tracker = UnitCapacityTracker()
         self.bot.loop.create_task(self._async_init_sheets())
 
+    @staticmethod
+    def _build_dependency_closure(dependencies: Dict[int, List[int]]) -> Dict[int, frozenset]:
+        closure: Dict[int, frozenset] = {}
+        for role_id in dependencies:
+            seen, stack = {role_id}, [role_id]
+            while stack:
+                for dep_id in dependencies.get(stack.pop(), []):
+                    if dep_id not in seen:
+                        seen.add(dep_id)
+                        stack.append(dep_id)
+            closure[role_id] = frozenset(seen)
+        return closure
+
+    def exit_role_ids(self, role_ids: List[int]) -> frozenset:
+        """Alle Rollen-IDs, die beim Austritt mit den angegebenen Rollen entfernt werden müssen."""
+        return frozenset().union(*(self.ROLE_DEPENDENCY_CLOSURE.get(role_id, frozenset((role_id,))) for role_id in role_ids))
+
+    async def cog_load(self):
+        # Der erste Durchlauf lädt die Kapazitäten; bis dahin wird per DB geprüft.
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            await self.on_scheduler_ready(scheduler)
+
+    def cog_unload(self):
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            scheduler.unregister("unit.capacity_reconcile")
+
+    @commands.Cog.listener()
+    async def on_scheduler_ready(self, scheduler: "SchedulerService"):
+        scheduler.register_interval("unit.capacity_reconcile", self.reconcile_capacity, timedelta(minutes=30))
+
     async def _async_init_sheets(self):
         loop = asyncio.get_running_loop()
         try:
@@ -70,20 +163,80 @@ class UnitService(commands.Cog):
         result = await self._execute_query("SELECT dn FROM members WHERE discord_id = %s", (user_id,), fetch="one")
         return result['dn'] if result else None
 
-    async def _get_unit_status(self, dn: str, unit_name: str) -> bool:
-        result = await self._execute_query(f"SELECT `{unit_name}` FROM units WHERE dn = %s", (dn,), fetch="one")
-        return bool(result[unit_name]) if result else False
-
     async def _get_unit_capacity(self, unit_name: str) -> tuple[int, int] | None:
         result = await self._execute_query("SELECT aktuelle_mitglieder, mitglieder_limit FROM unit_limits WHERE unit_name = %s", (unit_name,), fetch="one")
         return (result['aktuelle_mitglieder'], result['mitglieder_limit']) if result else None
 
-    async def _set_unit_status(self, dn: str, unit_name: str, status: bool):
-        await self._execute_query(f"UPDATE units SET `{unit_name}` = %s WHERE dn = %s", (status, dn))
+    async def _set_unit_status(self, dn: str, unit_name: str, status: bool, jobs: List[tuple] = ()) -> bool:
+        """
+        Setzt den Unit-Status und passt den Mitgliederzähler in einer Transaktion an.
+        Gibt False zurück, wenn der Status bereits gesetzt war (nichts geändert).
+
+        `jobs` sind Folgeaktionen `(job_name, payload, job_key, dedupe)`; sie landen in derselben
+        Transaktion in der Outbox und gehen so bei einem Absturz nach dem Commit nicht verloren.
+        """
+        outbox = self.bot.get_cog("OutboxService")
+        async with self.bot.db_pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    # NULL (Spalten-Default neuer Zeilen) zählt als "nicht in der Unit"
+                    changed = await cursor.execute(f"UPDATE units SET `{unit_name}` = %s WHERE dn = %s AND IFNULL(`{unit_name}`, 0) = %s", (status, dn, not status))
+                    if changed:
+                        await cursor.execute(
+                            "UPDATE unit_limits SET aktuelle_mitglieder = GREATEST(0, aktuelle_mitglieder + %s) WHERE unit_name = %s",
+                            (1 if status else -1, unit_name)
+                        )
+                        if outbox:
+                            for job_name, payload, job_key, dedupe in jobs:
+                                await outbox.enqueue(self.__cog_name__, job_name, payload, job_key=job_key, dedupe=dedupe, cursor=cursor)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        if changed and jobs:
+            if outbox:
+                outbox.notify()
+            else:
+                for job_name, payload, job_key, dedupe in jobs:
+                    await self._publish(job_name, payload, job_key=job_key, dedupe=dedupe)
+        return bool(changed)
+
+    async def reconcile_capacity(self):
+        """Gleicht Limits und Belegung mit `unit_limits` und einer Zählung über `units` ab."""
+        unit_names = list(self.UNIT_MAPPING.values())
+        self.capacity_tracker.begin_sync()
+        try:
+            limits = await self._execute_query("SELECT unit_name, aktuelle_mitglieder, mitglieder_limit FROM unit_limits", fetch="all") or []
+            sums = ", ".join(f"COALESCE(SUM(`{name}`), 0) AS `{name}`" for name in unit_names)
+            counts = await self._execute_query(f"SELECT {sums} FROM units", fetch="one") or {}
+        except Exception as e:
+            self.capacity_tracker.abort_sync()
+            print(f"Fehler beim Abgleich der Unit-Kapazitäten: {e}")
+            return
+
+        counts = {name: int(counts.get(name) or 0) for name in unit_names}
+        self.capacity_tracker.load({row['unit_name']: row['mitglieder_limit'] for row in limits}, counts)
+        # Abweichende Zähler (z.B. durch direkte DB-Änderungen) korrigieren
+        for row in limits:
+            if row['unit_name'] in counts and row['aktuelle_mitglieder'] != counts[row['unit_name']]:
+                await self._execute_query("UPDATE unit_limits SET aktuelle_mitglieder = %s WHERE unit_name = %s", (counts[row['unit_name']], row['unit_name']))
+
+    async def _reserve_capacity(self, unit: discord.Role, unit_name: str, override: bool) -> str | None:
+        """Reserviert einen Unit-Platz. Gibt bei Erfolg None, sonst eine Fehlermeldung zurück."""
+        if self.capacity_tracker.loaded:
+            capacity = self.capacity_tracker.capacity(unit_name)
+            if not capacity: return f"Keine Kapazitätsdaten für Unit `{unit_name}` gefunden."
+            if not self.capacity_tracker.reserve(unit_name, override):
+                return f"Die Unit `{unit.name}` ist voll (Limit: {capacity[1]})."
+            return None
 
-    async def _change_member_count(self, unit_name: str, change: int):
-        query = "UPDATE unit_limits SET aktuelle_mitglieder = GREATEST(0, aktuelle_mitglieder + %s) WHERE unit_name = %s"
-        await self._execute_query(query, (change, unit_name))
+        capacity = await self._get_unit_capacity(unit_name)
+        if not capacity: return f"Keine Kapazitätsdaten für Unit `{unit_name}` gefunden."
+        aktuelle_mitglieder, mitglieder_limit = capacity
+        if aktuelle_mitglieder >= mitglieder_limit and not override:
+            return f"Die Unit `{unit.name}` ist voll (Limit: {mitglieder_limit})."
+        return None
 
     async def _get_all_members_for_sheet_async(self):
         query = "SELECT m.dn, m.name, m.rank, DATE_FORMAT(m.hired_at, '%d.%m.%Y') as hired_at, m.discord_id, u.internal_affairs, u.police_academy, u.human_resources, u.bikers, u.swat, u.asd, u.detectives, u.gtf, u.shp FROM members m LEFT JOIN units u ON m.dn = u.dn"
@@ -103,6 +256,52 @@ class UnitService(commands.Cog):
         if members is not None:
             await self.bot.loop.run_in_executor(None, self._blocking_update_google_sheets, members)
 
+    # =========================================================================
+    # HINTERGRUND-JOBS (OUTBOX)
+    # =========================================================================
+
+    async def _publish(self, job_name: str, payload: Dict[str, Any] = None, job_key: str = None, dedupe: bool = False):
+        """Übergibt eine Folgeaktion an die Outbox; ohne OutboxService wird sie direkt ausgeführt."""
+        if outbox := self.bot.get_cog("OutboxService"):
+            try:
+                return await outbox.enqueue(self.__cog_name__, job_name, payload, job_key=job_key, dedupe=dedupe)
+            except Exception as e:
+                print(f"[UnitService] Outbox nicht erreichbar, führe '{job_name}' direkt aus: {e}")
+        try:
+            await getattr(self, f"job_{job_name}")(**(payload or {}))
+        except Exception as e:
+            print(f"[UnitService] Folgeaktion '{job_name}' fehlgeschlagen: {e}")
+
+    async def job_add_entry_roles(self, guild_id: int, user_id: int, role_ids: List[int], grund: str, unit_name: str = None):
+        # Ist das Mitglied inzwischen wieder ausgetreten, dürfen die Rollen nicht erneut vergeben werden
+        if unit_name in self.UNIT_MAPPING.values():
+            row = await self._execute_query(
+                f"SELECT u.`{unit_name}` AS status FROM units u JOIN members m ON m.dn = u.dn WHERE m.discord_id = %s", (user_id,), fetch="one"
+            )
+            if not row or not row['status']:
+                return print(f"[UnitService] Mitglied {user_id} ist nicht mehr in {unit_name}, Unit-Rollen werden nicht vergeben.")
+        guild = self.bot.get_guild(guild_id)
+        if not guild: raise LookupError(f"Server {guild_id} nicht gefunden.")
+        try:
+            member = guild.get_member(user_id) or await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return print(f"[UnitService] Mitglied {user_id} hat den Server verlassen, Unit-Rollen werden nicht vergeben.")
+        roles = [r for role_id in role_ids if (r := guild.get_role(role_id)) and r not in member.roles]
+        if not roles: return
+        if write_queue := self.bot.get_cog("WriteQueueService"):
+            await write_queue.submit(lambda: member.add_roles(*roles, reason=f"Unit Eintritt: {grund}"))
+        else:
+            await member.add_roles(*roles, reason=f"Unit Eintritt: {grund}")
+
+    async def job_set_deckname(self, user_id: int, deckname: str):
+        await self._set_deckname(user_id, deckname)
+
+    async def job_sync_google_sheets(self):
+        await self.update_google_sheets_async()
+
+    async def job_refresh_unit_lists(self):
+        if cog := self.bot.get_cog("UnitListService"): await cog.trigger_update()
+
     # =========================================================================
     # ÖFFENTLICHE API-METHODEN
     # =========================================================================
@@ -115,36 +314,30 @@ class UnitService(commands.Cog):
         if override and not interaction.user.guild_permissions.administrator:
             return {"success": False, "error": "Du hast keine Berechtigung für den Override."}
 
-        capacity = await self._get_unit_capacity(unit_name)
-        if not capacity: return {"success": False, "error": f"Keine Kapazitätsdaten für Unit `{unit_name}` gefunden."}
-        
-        aktuelle_mitglieder, mitglieder_limit = capacity
-        if aktuelle_mitglieder >= mitglieder_limit and not override:
-            return {"success": False, "error": f"Die Unit `{unit.name}` ist voll (Limit: {mitglieder_limit})."}
+        if error := await self._reserve_capacity(unit, unit_name, override):
+            return {"success": False, "error": error}
 
-        dn = await self._get_dn_for_user(user.id)
-        if not dn: return {"success": False, "error": "Benutzer hat keine gültige Dienstnummer."}
-        if await self._get_unit_status(dn, unit_name): return {"success": False, "error": f"{user.mention} ist bereits in der Unit."}
+        # Folgeaktionen laufen im Hintergrund über die Outbox; der Befehl antwortet direkt nach dem Commit
+        role_ids = [r.id for r in [unit] + zusatz_rollen if r]
+        jobs = [("add_entry_roles", {"guild_id": user.guild.id, "user_id": user.id, "role_ids": role_ids, "grund": grund, "unit_name": unit_name}, str(user.id), False)]
+        if deckname:
+            jobs.append(("set_deckname", {"user_id": user.id, "deckname": deckname}, str(user.id), False))
+        jobs += [("sync_google_sheets", None, None, True), ("refresh_unit_lists", None, None, True)]
 
         try:
-            await self._set_unit_status(dn, unit_name, True)
-            await self._change_member_count(unit_name, 1)
+            dn = await self._get_dn_for_user(user.id)
+            if not dn:
+                self.capacity_tracker.release(unit_name)
+                return {"success": False, "error": "Benutzer hat keine gültige Dienstnummer."}
+            if not await self._set_unit_status(dn, unit_name, True, jobs):
+                self.capacity_tracker.release(unit_name)
+                return {"success": False, "error": f"{user.mention} ist bereits in der Unit."}
         except Exception as e:
+            self.capacity_tracker.release(unit_name)
             return {"success": False, "error": f"Datenbankfehler: {e}"}
+        self.capacity_tracker.commit(unit_name)
 
-        await self.update_google_sheets_async()
-        
-        try:
-            roles_to_add = [unit] + zusatz_rollen
-            await user.add_roles(*[r for r in roles_to_add if r], reason=f"Unit Eintritt: {grund}")
-        except discord.HTTPException as e:
-            return {"success": True, "warning": f"DB-Eintrag erfolgreich, aber Rollenvergabe fehlgeschlagen: {e}"}
-
-        if deckname:
-            await self._set_deckname(user.id, deckname)
-
-        if cog := self.bot.get_cog("UnitListService"): await cog.trigger_update()
-
+        # Die Einladung benötigt die Interaktion und bleibt daher im Befehl
         SEAL_UNIT_ROLE_ID = 1125174901989445693
         SU_SERVER_ID = 1363986017907900428
         if unit.id == SEAL_UNIT_ROLE_ID:
@@ -160,31 +353,34 @@ class UnitService(commands.Cog):
 
         dn = await self._get_dn_for_user(user.id)
         if not dn: return {"success": False, "error": "Benutzer hat keine gültige Dienstnummer."}
-        if not await self._get_unit_status(dn, unit_name): return {"success": False, "error": f"{user.mention} ist nicht in der Unit."}
 
         try:
-            await self._set_unit_status(dn, unit_name, False)
-            await self._change_member_count(unit_name, -1)
+            if not await self._set_unit_status(dn, unit_name, False):
+                return {"success": False, "error": f"{user.mention} ist nicht in der Unit."}
         except Exception as e:
             return {"success": False, "error": f"Datenbankfehler: {e}"}
+        self.capacity_tracker.leave(unit_name)
             
         await self.update_google_sheets_async()
 
-        final_roles_to_remove = rollen_zum_entfernen + [unit]
-        for r in final_roles_to_remove[:]:
-            if r.id in self.ROLE_DEPENDENCIES:
-                for dep_id in self.ROLE_DEPENDENCIES[r.id]:
-                    if dep_role := interaction.guild.get_role(dep_id):
-                        if dep_role not in final_roles_to_remove: final_roles_to_remove.append(dep_role)
-        
-        await user.remove_roles(*list(set(final_roles_to_remove)), reason=f"Unit Austritt: {grund}")
+        # Ein einziger Rollen-Edit statt einzelner Entfernungen
+        remove_ids = self.exit_role_ids([r.id for r in rollen_zum_entfernen + [unit]])
+        remaining_roles = [r for r in user.roles if r.id not in remove_ids and not r.is_default()]
+        warning = None
+        if len(remaining_roles) < len(user.roles) - 1:
+            try:
+                await user.edit(roles=remaining_roles, reason=f"Unit Austritt: {grund}")
+            except discord.HTTPException as e:
+                warning = f"DB-Eintrag erfolgreich, aber Rollenentfernung fehlgeschlagen: {e}"
 
         if cog := self.bot.get_cog("UnitListService"):
             await cog.trigger_update()
             if unit.id == 1125174901989445693:
                 if hasattr(cog, 'remove_deckname_async'): await cog.remove_deckname_async(user.id)
         
-        return {"success": True, "user": user, "unit": unit, "grund": grund}
+        result = {"success": True, "user": user, "unit": unit, "grund": grund}
+        if warning: result["warning"] = warning
+        return result
 
     async def unit_promotion(self, user: discord.Member, grund: str, roles_to_add: List[discord.Role], roles_to_remove: List[discord.Role]) -> Dict[str, Any]:
         try:
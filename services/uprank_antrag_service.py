@@ -5,7 +5,9 @@ from discord.ext import commands
 import aiomysql
 import yaml
 from datetime import datetime, time, timedelta, timezone
-from typing import TYPE_CHECKING, Dict, Any, Optional, List
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Tuple
+
+from utils.db_helpers import ensure_index
 
 if TYPE_CHECKING:
     from main import MyBot
@@ -14,12 +16,24 @@ if TYPE_CHECKING:
     from services.log_service import LogService
     from cogs.uprank_antrag_commands import UprankAntragCommands
 
+# --- Konstanten ---
+HISTORY_COLUMNS = "id, requester_id, target_user_id, target_dn, reason, status, created_at"
+
 class UprankAntragService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "UprankAntragService"
         self.config = self._load_config()
 
+    async def cog_load(self):
+        try:
+            await ensure_index(self._execute_query, "uprank_requests", "uprank_user_verlauf_idx", ("target_user_id", "created_at", "id"))
+            await ensure_index(self._execute_query, "uprank_requests", "uprank_woche_verlauf_idx", ("week_identifier", "created_at", "id"))
+            await ensure_index(self._execute_query, "uprank_requests", "uprank_status_woche_idx", ("status", "week_identifier"))
+            await ensure_index(self._execute_query, "uprank_requests", "uprank_nachricht_idx", ("proposal_message_id",))
+        except Exception as e:
+            print(f"WARNUNG: Indizes für uprank_requests konnten nicht angelegt werden: {e}")
+
     def _load_config(self) -> Dict[str, Any]:
         try:
             with open('config/uprank_antrag_config.yaml', 'r', encoding='utf-8') as f:
@@ -104,10 +118,25 @@ class UprankAntragService(commands.Cog):
 
         try:
             proposal_message = await proposal_channel.send(embed=proposal_embed)
+        except discord.HTTPException as e:
+            return {"success": False, "error": f"Nachricht konnte nicht gesendet werden: {e}"}
+
+        # Der Antrag muss in der DB stehen, bevor abgestimmt werden kann – sonst gehen frühe Stimmen verloren
+        week_id = self.get_week_identifier(datetime.now(timezone.utc))
+        query_requests = "INSERT INTO uprank_requests (requester_id, target_user_id, target_dn, unit_name, reason, new_rank_key, status, week_identifier, proposal_message_id, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+        args_requests = (requester.id, target_user_id, target_dn, unit_name, reason, new_rank_key, 'pending', week_id, proposal_message.id, datetime.now(timezone.utc))
+        await self._execute_query(query_requests, args_requests)
+
+        try:
             await proposal_message.add_reaction("✅")
             await proposal_message.add_reaction("❌")
             await proposal_message.add_reaction("🗑️")
         except discord.HTTPException as e:
+            await self._execute_query("DELETE FROM uprank_requests WHERE proposal_message_id = %s", (proposal_message.id,))
+            await self._execute_query("DELETE FROM uprank_votes WHERE proposal_message_id = %s", (proposal_message.id,))
+            try:
+                await proposal_message.delete()
+            except discord.HTTPException: pass
             return {"success": False, "error": f"Nachricht konnte nicht gesendet werden: {e}"}
 
         original_message_id = None
@@ -121,10 +150,6 @@ class UprankAntragService(commands.Cog):
                 original_message_id = unit_copy_message.id
             except discord.HTTPException: pass
         
-        week_id = self.get_week_identifier(datetime.now(timezone.utc))
-        query_requests = "INSERT INTO uprank_requests (requester_id, target_user_id, target_dn, unit_name, reason, new_rank_key, status, week_identifier, proposal_message_id, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-        args_requests = (requester.id, target_user_id, target_dn, unit_name, reason, new_rank_key, 'pending', week_id, proposal_message.id, datetime.now(timezone.utc))
-        await self._execute_query(query_requests, args_requests)
         if original_message_id:
             query_proposals = "INSERT INTO uprank_proposals (original_message_id, original_channel_id, proposal_message_id, proposal_channel_id) VALUES (%s, %s, %s, %s)"
             args_proposals = (original_message_id, interaction.channel_id, proposal_message.id, proposal_channel_id)
@@ -172,13 +197,24 @@ class UprankAntragService(commands.Cog):
             await log_service.log_event('uprank', log_message)
         return {"success": True, "message": "Der Antrag wurde gelöscht."}
 
-    async def get_uprank_history_for_user(self, user_id: int) -> List[Dict[str, Any]]:
-        query = "SELECT * FROM uprank_requests WHERE target_user_id = %s ORDER BY created_at DESC"
-        return await self._execute_query(query, (user_id,), fetch="all")
-
-    async def get_uprank_history_for_week(self, week_identifier: str) -> List[Dict[str, Any]]:
-        query = "SELECT * FROM uprank_requests WHERE week_identifier = %s ORDER BY created_at DESC"
-        return await self._execute_query(query, (week_identifier,), fetch="all")
+    async def get_uprank_history_for_user(self, user_id: int, after: Tuple[datetime, int] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        return await self._get_history_page("target_user_id", user_id, after, limit)
+
+    async def get_uprank_history_for_week(self, week_identifier: str, after: Tuple[datetime, int] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        return await self._get_history_page("week_identifier", week_identifier, after, limit)
+
+    async def _get_history_page(self, column: str, value: Any, after: Tuple[datetime, int] | None, limit: int) -> List[Dict[str, Any]]:
+        """
+        Eine Seite des Verlaufs (neueste zuerst) per Keyset-Pagination auf (created_at, id).
+        Lädt einen Eintrag mehr als `limit`, damit erkennbar ist, ob weitere Seiten existieren.
+        """
+        query = f"SELECT {HISTORY_COLUMNS} FROM uprank_requests WHERE {column} = %s"
+        args = [value]
+        if after:
+            query += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+            args.extend((after[0], after[0], after[1]))
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        return await self._execute_query(query, tuple(args) + (limit + 1,), fetch="all") or []
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(UprankAntragService(bot))
\ No newline at end of file
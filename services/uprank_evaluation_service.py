@@ -1,26 +1,44 @@
 # bot/services/uprank_evaluation_service.py
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from datetime import datetime, time, timezone, timedelta
 import aiomysql
-from typing import TYPE_CHECKING, Dict, List, Tuple
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
 if TYPE_CHECKING:
     from main import MyBot
     from services.uprank_antrag_service import UprankAntragService
     from services.personal_service import PersonalService
+    from services.scheduler_service import SchedulerService
 
 LAST_EVAL_KEY = "last_uprank_evaluation_week_id"
+EVALUATION_TIME = time(17, 30) # Sonntags, UTC
+EVALUATION_CATCH_UP = timedelta(days=1)
+VOTE_EMOJIS = {'✅': 'ja', '❌': 'nein'}
 
 class UprankEvaluationService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "UprankEvaluationService"
-        self.weekly_evaluation_task.start()
+        self._vote_repair: asyncio.Task | None = None
+
+    async def cog_load(self):
+        await self._ensure_votes_table_exists()
+        self._vote_repair = asyncio.create_task(self._repair_votes_when_ready())
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            await self.on_scheduler_ready(scheduler)
 
     def cog_unload(self):
-        self.weekly_evaluation_task.cancel()
+        if self._vote_repair: self._vote_repair.cancel()
+        if scheduler := self.bot.get_cog("SchedulerService"):
+            scheduler.unregister("uprank.wochenauswertung")
+
+    @commands.Cog.listener()
+    async def on_scheduler_ready(self, scheduler: "SchedulerService"):
+        await scheduler.register_cron("uprank.wochenauswertung", self.weekly_evaluation, weekdays=(6,), at=EVALUATION_TIME,
+                                      tz="UTC", catch_up=EVALUATION_CATCH_UP)
 
     async def _execute_query(self, query: str, args: tuple = None, fetch: str = None):
         pool: aiomysql.Pool = self.bot.db_pool
@@ -33,6 +51,122 @@ class UprankEvaluationService(commands.Cog):
                 await conn.commit()
                 return result
 
+    async def _ensure_votes_table_exists(self):
+        await self._execute_query("""
+            CREATE TABLE IF NOT EXISTS uprank_votes (
+                proposal_message_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                vote ENUM('ja', 'nein') NOT NULL,
+                PRIMARY KEY (proposal_message_id, vote, user_id)
+            )
+        """)
+
+    # --- Stimmen-Erfassung ---
+    def _proposal_channel_id(self) -> int | None:
+        antrag_service: "UprankAntragService" = self.bot.get_cog("UprankAntragService")
+        return antrag_service.config.get('proposal_channel_id') if antrag_service else None
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        vote = VOTE_EMOJIS.get(str(payload.emoji))
+        if not vote or (payload.member and payload.member.bot) or payload.channel_id != self._proposal_channel_id(): return
+        # Nur Stimmen zu noch offenen Anträgen werden gezählt
+        await self._execute_query("""
+            INSERT IGNORE INTO uprank_votes (proposal_message_id, user_id, vote)
+            SELECT proposal_message_id, %s, %s FROM uprank_requests WHERE proposal_message_id = %s AND status = 'pending'
+        """, (payload.user_id, vote, payload.message_id))
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        vote = VOTE_EMOJIS.get(str(payload.emoji))
+        if not vote or payload.channel_id != self._proposal_channel_id(): return
+        await self._execute_query(
+            "DELETE FROM uprank_votes WHERE proposal_message_id = %s AND vote = %s AND user_id = %s",
+            (payload.message_id, vote, payload.user_id)
+        )
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        if payload.channel_id != self._proposal_channel_id(): return
+        await self._mark_proposals_deleted([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        if payload.channel_id != self._proposal_channel_id(): return
+        await self._mark_proposals_deleted(list(payload.message_ids))
+
+    async def _mark_proposals_deleted(self, message_ids: List[int]):
+        """Gelöschte Antragsnachrichten dürfen nicht mehr mit ihrem alten Stimmenstand ausgewertet werden."""
+        if not message_ids: return
+        placeholders = ", ".join(["%s"] * len(message_ids))
+        await self._execute_query(f"UPDATE uprank_requests SET status = 'deleted' WHERE status = 'pending' AND proposal_message_id IN ({placeholders})", tuple(message_ids))
+        await self._execute_query(f"DELETE FROM uprank_votes WHERE proposal_message_id IN ({placeholders})", tuple(message_ids))
+
+    async def _repair_votes_when_ready(self):
+        await self.bot.wait_until_ready()
+        try:
+            await self.repair_votes()
+        except Exception as e:
+            print(f"Fehler beim Abgleich der Uprank-Stimmen: {e}")
+
+    async def repair_votes(self):
+        """
+        Gleicht die Stimmen aller offenen Anträge einmalig mit den Reaktionen in Discord ab
+        (Erstbefüllung und Reaktionen, die verpasst wurden, während der Bot offline war).
+        Anträge, deren Nachricht gelöscht wurde, werden als 'deleted' markiert.
+        """
+        proposal_channel_id = self._proposal_channel_id()
+        proposal_channel = self.bot.get_channel(proposal_channel_id) if proposal_channel_id else None
+        if not proposal_channel: return
+        pending = await self._execute_query("SELECT id, proposal_message_id FROM uprank_requests WHERE status = 'pending'", fetch="all") or []
+
+        deleted_ids = []
+        for proposal in pending:
+            try:
+                message = await proposal_channel.fetch_message(proposal['proposal_message_id'])
+            except discord.NotFound:
+                deleted_ids.append(proposal['id'])
+                continue
+            except discord.HTTPException as e:
+                print(f"Fehler beim Abgleich der Stimmen für Antrag {proposal['id']}: {e}")
+                continue
+
+            rows = []
+            for reaction in message.reactions:
+                if vote := VOTE_EMOJIS.get(str(reaction.emoji)):
+                    rows.extend([(message.id, user.id, vote) async for user in reaction.users() if not user.bot])
+            await self._replace_votes(message.id, rows)
+
+        if deleted_ids:
+            placeholders = ", ".join(["%s"] * len(deleted_ids))
+            await self._execute_query(f"UPDATE uprank_requests SET status = 'deleted' WHERE id IN ({placeholders})", tuple(deleted_ids))
+        print(f"Uprank-Stimmen für {len(pending)} offene Anträge abgeglichen ({len(deleted_ids)} gelöscht).")
+
+    async def _replace_votes(self, message_id: int, rows: List[Tuple[int, int, str]]):
+        async with self.bot.db_pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute("DELETE FROM uprank_votes WHERE proposal_message_id = %s", (message_id,))
+                    if rows:
+                        await cursor.executemany("INSERT INTO uprank_votes (proposal_message_id, user_id, vote) VALUES (%s, %s, %s)", rows)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def _get_tallied_proposals(self, week_identifier: str) -> List[Dict[str, Any]]:
+        """Alle offenen Anträge der Woche mit Stimmen und aktuellem Rang in einer Abfrage."""
+        return await self._execute_query("""
+            SELECT r.id, r.proposal_message_id, r.target_user_id, r.target_dn, r.new_rank_key,
+                   m.rank AS current_rank, m.name AS member_name,
+                   (SELECT COUNT(*) FROM uprank_votes v WHERE v.proposal_message_id = r.proposal_message_id AND v.vote = 'ja') AS ja_stimmen,
+                   (SELECT COUNT(*) FROM uprank_votes v WHERE v.proposal_message_id = r.proposal_message_id AND v.vote = 'nein') AS nein_stimmen
+            FROM uprank_requests r
+            LEFT JOIN members m ON m.discord_id = r.target_user_id
+            WHERE r.week_identifier = %s AND r.status = 'pending'
+        """, (week_identifier,), fetch="all") or []
+
     async def get_last_evaluated_week(self) -> str | None:
         row = await self._execute_query("SELECT config_value FROM bot_config WHERE config_key = %s", (LAST_EVAL_KEY,), fetch="one")
         return row['config_value'] if row else None
@@ -74,22 +208,16 @@ class UprankEvaluationService(commands.Cog):
         if not proposal_channel:
             embed = discord.Embed(title="Fehler bei der Vorschau", description="Der `proposal_channel_id` ist nicht konfiguriert.", color=discord.Color.red())
             return embed, 0
-        pending_proposals = await self._execute_query("SELECT * FROM uprank_requests WHERE week_identifier = %s AND status = 'pending'", (week_identifier,), fetch="all")
+        pending_proposals = await self._get_tallied_proposals(week_identifier)
         if not pending_proposals:
             embed = discord.Embed(title=f"Vorschau für {week_identifier}", description="Keine ausstehenden Anträge für diese Woche gefunden.", color=discord.Color.orange())
             return embed, 0
         approved_list, rejected_list = [], []
         for proposal in pending_proposals:
-            try:
-                message = await proposal_channel.fetch_message(proposal['proposal_message_id'])
-                ja_stimmen = next((r.count - 1 for r in message.reactions if str(r.emoji) == '✅'), 0)
-                nein_stimmen = next((r.count - 1 for r in message.reactions if str(r.emoji) == '❌'), 0)
-                is_approved = ja_stimmen > nein_stimmen
-                line = f"`DN: {proposal['target_dn']:<4}` <@{proposal['target_user_id']}> (👍{ja_stimmen}|👎{nein_stimmen})"
-                if is_approved: approved_list.append(line)
-                else: rejected_list.append(line)
-            except (discord.NotFound, discord.Forbidden): pass
-            except Exception as e: print(f"Fehler bei der Vorschau von Antrag {proposal['id']}: {e}")
+            ja_stimmen, nein_stimmen = proposal['ja_stimmen'], proposal['nein_stimmen']
+            line = f"`DN: {proposal['target_dn']:<4}` <@{proposal['target_user_id']}> (👍{ja_stimmen}|👎{nein_stimmen})"
+            if ja_stimmen > nein_stimmen: approved_list.append(line)
+            else: rejected_list.append(line)
         
         summary_embed = discord.Embed(title=f"📋 Vorschau der Auswertung für {week_identifier}", timestamp=datetime.now(timezone.utc), color=discord.Color.blue())
         self._add_proposals_to_embed(summary_embed, approved_list, "✅ Voraussichtlich Genehmigt")
@@ -107,7 +235,7 @@ class UprankEvaluationService(commands.Cog):
             embed = discord.Embed(title="Fehler bei der Auswertung", description="Einer der benötigten Services oder der `proposal_channel_id` ist nicht konfiguriert.", color=discord.Color.red())
             return embed, 0
 
-        pending_proposals = await self._execute_query("SELECT * FROM uprank_requests WHERE week_identifier = %s AND status = 'pending'", (week_identifier,), fetch="all")
+        pending_proposals = await self._get_tallied_proposals(week_identifier)
         if not pending_proposals:
             embed = discord.Embed(title=f"Auswertung für {week_identifier}", description="Keine ausstehenden Anträge für diese Woche gefunden.", color=discord.Color.orange())
             return embed, 0
@@ -115,38 +243,32 @@ class UprankEvaluationService(commands.Cog):
         grouped_upranks = {}
         grouped_deranks = {}
         approved_count = 0
+        new_statuses = {}
 
         for proposal in pending_proposals:
-            try:
-                message = await proposal_channel.fetch_message(proposal['proposal_message_id'])
-                ja_stimmen = next((r.count - 1 for r in message.reactions if str(r.emoji) == '✅'), 0)
-                nein_stimmen = next((r.count - 1 for r in message.reactions if str(r.emoji) == '❌'), 0)
-                new_status = 'approved' if ja_stimmen > nein_stimmen else 'rejected'
-                await self._execute_query("UPDATE uprank_requests SET status = %s WHERE id = %s", (new_status, proposal['id']))
-
-                if new_status == 'approved':
-                    approved_count += 1
-                    member_details = await personal_service.get_member_details(proposal['target_user_id'])
-                    if not member_details: continue
-                    
-                    old_rank_id = int(member_details['rank'])
-                    new_rank_id = proposal['new_rank_key']
-                    
-                    promo_key = (old_rank_id, new_rank_id)
-                    name = member_details['name']
-                    member_mention = f"- <@{proposal['target_user_id']}> ({name})"
-                    
-                    if new_rank_id > old_rank_id:
-                        if promo_key not in grouped_upranks: grouped_upranks[promo_key] = []
-                        grouped_upranks[promo_key].append(member_mention)
-                    else:
-                        if promo_key not in grouped_deranks: grouped_deranks[promo_key] = []
-                        grouped_deranks[promo_key].append(member_mention)
+            new_status = 'approved' if proposal['ja_stimmen'] > proposal['nein_stimmen'] else 'rejected'
+            new_statuses[proposal['id']] = new_status
+            if new_status != 'approved': continue
 
-            except discord.NotFound:
-                await self._execute_query("UPDATE uprank_requests SET status = 'deleted' WHERE id = %s", (proposal['id'],))
-            except Exception as e:
-                print(f"Fehler bei der Auswertung von Antrag {proposal['id']}: {e}")
+            approved_count += 1
+            if proposal['current_rank'] is None: continue
+            
+            old_rank_id = int(proposal['current_rank'])
+            new_rank_id = proposal['new_rank_key']
+            
+            promo_key = (old_rank_id, new_rank_id)
+            member_mention = f"- <@{proposal['target_user_id']}> ({proposal['member_name']})"
+            
+            if new_rank_id > old_rank_id:
+                grouped_upranks.setdefault(promo_key, []).append(member_mention)
+            else:
+                grouped_deranks.setdefault(promo_key, []).append(member_mention)
+
+        # Alle Status in einem Update setzen
+        cases = " ".join(["WHEN %s THEN %s"] * len(new_statuses))
+        placeholders = ", ".join(["%s"] * len(new_statuses))
+        args = [value for item in new_statuses.items() for value in item] + list(new_statuses.keys())
+        await self._execute_query(f"UPDATE uprank_requests SET status = CASE id {cases} END WHERE id IN ({placeholders}) AND status = 'pending'", tuple(args))
 
         summary_embed = discord.Embed(title=f"📋 Wochenauswertung für {week_identifier}", timestamp=datetime.now(timezone.utc), color=discord.Color.green())
         
@@ -172,12 +294,11 @@ class UprankEvaluationService(commands.Cog):
         
         return summary_embed, approved_count
 
-    @tasks.loop(time=time(17, 30, tzinfo=timezone.utc))
-    async def weekly_evaluation_task(self):
-        if datetime.now(timezone.utc).weekday() != 6: return
+    async def weekly_evaluation(self, scheduled_for: datetime):
         antrag_service: "UprankAntragService" = self.bot.get_cog("UprankAntragService")
         if not antrag_service: return
-        evaluation_date = datetime.now(timezone.utc) - timedelta(days=1)
+        # Vom geplanten Termin aus rechnen, damit auch ein nachgeholter Lauf die richtige Woche auswertet
+        evaluation_date = scheduled_for - timedelta(days=1)
         current_week_id = antrag_service.get_week_identifier(evaluation_date)
         last_evaluated_week = await self.get_last_evaluated_week()
         if last_evaluated_week == current_week_id:
@@ -191,9 +312,5 @@ class UprankEvaluationService(commands.Cog):
             await channel.send("# " + "-"*70 + " Wochenauswertung Abgeschlossen " + "-"*70)
         await self.set_last_evaluated_week(current_week_id)
 
-    @weekly_evaluation_task.before_loop
-    async def before_weekly_task(self):
-        pass
-
 async def setup(bot: "MyBot"):
     await bot.add_cog(UprankEvaluationService(bot))
\ No newline at end of file
@@ -2,7 +2,10 @@ import discord
 from discord.ext import commands
 from datetime import datetime, timedelta, timezone
 import aiomysql
-from typing import TYPE_CHECKING
+import asyncio
+from typing import TYPE_CHECKING, Dict, List
+
+from utils.expiry_scheduler import ExpiryScheduler
 
 if TYPE_CHECKING:
     from main import MyBot
@@ -10,12 +13,27 @@ if TYPE_CHECKING:
 # --- Konstanten ---
 UPRANK_CHANNEL_ID = 1186705436330692749
 OVERVIEW_MSG_KEY = "uprank_overview_message_id"
+OVERVIEW_DEBOUNCE_SECONDS = 5 # Mehrere Änderungen kurz hintereinander ergeben eine Aktualisierung
 
 class UprankSperreService(commands.Cog):
     def __init__(self, bot: "MyBot"):
         self.bot = bot
         self.__cog_name__ = "UprankSperreService"
         self._initial_update_done = False
+        # Aktive Sperren: DN -> Ende (UTC). Wird beim Laden gefüllt und bei jeder Änderung mitgeschrieben.
+        self.active_locks: Dict[str, datetime] = {}
+        self._locks_loaded = False
+        self.lock_expiries = ExpiryScheduler(self._expire_locks, name="Uprank-Sperren")
+        self._overview_update: asyncio.Task | None = None
+        self._overview_dirty = False
+
+    async def cog_load(self):
+        await self._load_active_locks()
+        self.lock_expiries.start()
+
+    def cog_unload(self):
+        self.lock_expiries.stop()
+        if self._overview_update: self._overview_update.cancel()
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -45,10 +63,50 @@ class UprankSperreService(commands.Cog):
         result = await self._execute_query("SELECT dn FROM members WHERE discord_id = %s", (user_id,), fetch="one")
         return result['dn'] if result else None
 
+    # --- Sperren im Speicher ---
+    async def _load_active_locks(self):
+        rows = await self._execute_query(
+            "SELECT dn, sperre_ende FROM upranksperre WHERE sperre_ende > %s", (datetime.now(timezone.utc),), fetch="all"
+        ) or []
+        self.active_locks = {str(row['dn']): row['sperre_ende'].replace(tzinfo=timezone.utc) for row in rows}
+        for dn, ende in self.active_locks.items():
+            self.lock_expiries.schedule(dn, ende)
+        self._locks_loaded = True
+
+    async def _expire_locks(self, dns: List[str]):
+        """Entfernt abgelaufene Sperren aus dem Speicher und aktualisiert die Übersicht einmal."""
+        now = datetime.now(timezone.utc)
+        expired = [dn for dn in dns if dn in self.active_locks and self.active_locks[dn] <= now]
+        for dn in expired:
+            del self.active_locks[dn]
+        if expired:
+            self.request_overview_update()
+
+    def request_overview_update(self):
+        """Plant eine Aktualisierung der Übersicht; weitere Anfragen bis dahin werden zusammengefasst."""
+        self._overview_dirty = True
+        if self._overview_update and not self._overview_update.done(): return
+        self._overview_update = asyncio.create_task(self._debounced_overview_update())
+
+    async def _debounced_overview_update(self):
+        # Änderungen während einer laufenden Aktualisierung setzen das Flag erneut und lösen eine weitere Runde aus
+        while self._overview_dirty:
+            await asyncio.sleep(OVERVIEW_DEBOUNCE_SECONDS)
+            self._overview_dirty = False
+            try:
+                await self.update_overview_embed()
+            except Exception as e:
+                print(f"Fehler beim Aktualisieren der Uprank-Sperren-Übersicht: {e}")
+
     # --- Öffentliche API-Methoden ---
 
     async def check_sperre(self, dn: str) -> tuple[bool, datetime | None]:
         """Prüft, ob eine DN eine aktive Uprank-Sperre hat."""
+        if self._locks_loaded:
+            ende = self.active_locks.get(str(dn))
+            if ende and ende > datetime.now(timezone.utc):
+                return (True, ende)
+            return (False, None)
         row = await self._execute_query("SELECT sperre_ende FROM upranksperre WHERE dn = %s", (dn,), fetch="one")
         if row and row['sperre_ende'].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc):
             return (True, row['sperre_ende'])
@@ -65,7 +123,34 @@ class UprankSperreService(commands.Cog):
         """Setzt eine Sperre mit einem festen Enddatum."""
         query = "INSERT INTO upranksperre (dn, letzter_uprank, sperre_ende) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE letzter_uprank=VALUES(letzter_uprank), sperre_ende=VALUES(sperre_ende)"
         await self._execute_query(query, (dn, datetime.now(timezone.utc), ende_datum))
-        await self.update_overview_embed()
+
+        dn, ende_datum = str(dn), ende_datum if ende_datum.tzinfo else ende_datum.replace(tzinfo=timezone.utc)
+        previous = self.active_locks.get(dn)
+        if ende_datum > datetime.now(timezone.utc):
+            self.active_locks[dn] = ende_datum
+            self.lock_expiries.schedule(dn, ende_datum)
+        else:
+            self.active_locks.pop(dn, None)
+            self.lock_expiries.cancel(dn)
+        if self.active_locks.get(dn) != previous:
+            self.request_overview_update()
+
+    def move_lock(self, old_dn: str, new_dn: str):
+        """Überträgt eine Sperre im Speicher auf eine neue DN (nach einem DN-Wechsel in der Datenbank)."""
+        old_dn, new_dn = str(old_dn), str(new_dn)
+        ende = self.active_locks.pop(old_dn, None)
+        self.lock_expiries.cancel(old_dn)
+        if ende is None: return
+        self.active_locks[new_dn] = ende
+        self.lock_expiries.schedule(new_dn, ende)
+        self.request_overview_update()
+
+    def drop_lock(self, dn: str):
+        """Entfernt eine Sperre aus dem Speicher (nach dem Löschen des Mitglieds)."""
+        dn = str(dn)
+        self.lock_expiries.cancel(dn)
+        if self.active_locks.pop(dn, None) is not None:
+            self.request_overview_update()
 
     def _berechne_sperrzeit(self, rang_id: int) -> timedelta:
         """Berechnet die Dauer der Sperre basierend auf der Rang-ID."""
@@ -75,14 +160,18 @@ class UprankSperreService(commands.Cog):
 
     async def update_overview_embed(self):
         """Aktualisiert das Übersichts-Embed im Uprank-Kanal."""
-        query = "SELECT m.discord_id, m.name, u.sperre_ende FROM upranksperre u JOIN members m ON u.dn = m.dn WHERE u.sperre_ende > NOW() ORDER BY u.sperre_ende ASC"
-        active_locks = await self._execute_query(query, fetch="all")
+        now = datetime.now(timezone.utc)
+        locks = sorted(((ende, dn) for dn, ende in self.active_locks.items() if ende > now))
+        members = {}
+        if locks:
+            placeholders = ", ".join(["%s"] * len(locks))
+            rows = await self._execute_query(f"SELECT dn, discord_id, name FROM members WHERE dn IN ({placeholders})", tuple(dn for _, dn in locks), fetch="all") or []
+            members = {str(row['dn']): row for row in rows}
         
         lines = []
-        if active_locks:
-            for lock in active_locks:
-                timestamp = int(lock['sperre_ende'].timestamp())
-                lines.append(f"{lock['name']} (<@{lock['discord_id']}>): <t:{timestamp}:R>")
+        for ende, dn in locks:
+            if member := members.get(dn):
+                lines.append(f"{member['name']} (<@{member['discord_id']}>): <t:{int(ende.timestamp())}:R>")
         
         description = "\n".join(lines) if lines else "Aktuell sind keine Sperren aktiv."
 
@@ -99,18 +188,16 @@ class UprankSperreService(commands.Cog):
             return
 
         msg_id = await self._get_config_value(OVERVIEW_MSG_KEY)
-        message_to_edit = None
         if msg_id:
             try:
-                message_to_edit = await channel.fetch_message(int(msg_id))
+                # Direkt bearbeiten, ohne die Nachricht vorher zu laden
+                await channel.get_partial_message(int(msg_id)).edit(embed=embed)
+                return
             except (discord.NotFound, discord.Forbidden):
-                message_to_edit = None
+                pass
 
-        if message_to_edit:
-            await message_to_edit.edit(embed=embed)
-        else:
-            new_message = await channel.send(embed=embed)
-            await self._set_config_value(OVERVIEW_MSG_KEY, str(new_message.id))
+        new_message = await channel.send(embed=embed)
+        await self._set_config_value(OVERVIEW_MSG_KEY, str(new_message.id))
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(UprankSperreService(bot))
\ No newline at end of file
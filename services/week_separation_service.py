@@ -2,6 +2,8 @@ import discord
 from discord.ext import commands
 from typing import TYPE_CHECKING, List, Optional
 
+from utils.broadcast import broadcast
+
 if TYPE_CHECKING:
     from main import MyBot
 
@@ -24,7 +26,6 @@ class WeekSeparationService(commands.Cog):
         Wenn target_channel angegeben ist, nur dorthin, ansonsten an die Preset-Liste.
         """
         message = "# ---------------------------------------------Wochentrennung---------------------------------------------"
-        sent_channels = []
         channels_to_send_in = []
 
         if target_channel:
@@ -34,16 +35,9 @@ class WeekSeparationService(commands.Cog):
                 if channel := self.bot.get_channel(channel_id):
                     channels_to_send_in.append(channel)
         
-        for channel in channels_to_send_in:
-            try:
-                await channel.send(message)
-                sent_channels.append(channel)
-            except discord.Forbidden:
-                print(f"[FEHLER] WeekSeparation: Keine Berechtigung zum Senden in Channel {channel.id}.")
-            except Exception as e:
-                print(f"[FEHLER] WeekSeparation: Fehler beim Senden in {channel.id}: {e}")
-        
-        return sent_channels
+        results = await broadcast(channels_to_send_in, {"content": message}, label="WeekSeparation",
+                                  write_queue=self.bot.get_cog("WriteQueueService"))
+        return [result.channel for result in results if result.success]
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(WeekSeparationService(bot))
\ No newline at end of file
@@ -0,0 +1,41 @@
+import discord
+from discord.ext import commands
+import asyncio
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Awaitable, Callable, TypeVar
+
+from utils.broadcast import retry_transient
+
+if TYPE_CHECKING:
+    from main import MyBot
+
+T = TypeVar("T")
+
+# --- Konstanten ---
+MAX_CONCURRENT_WRITES = 4
+
+class WriteQueueService(commands.Cog):
+    """
+    Begrenzt bot-weit die Anzahl gleichzeitiger schreibender Discord-Aufrufe
+    (Rollen, Nicknames, Nachrichten), damit Massenaktionen den Bot nicht blockieren.
+    """
+    def __init__(self, bot: "MyBot"):
+        self.bot = bot
+        self.__cog_name__ = "WriteQueueService"
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_WRITES)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Reserviert einen Schreib-Slot für einen zusammenhängenden Ablauf."""
+        async with self._semaphore:
+            yield
+
+    async def submit(self, factory: Callable[[], Awaitable[T]], retries: int = 2) -> T:
+        """Führt einen einzelnen Schreibaufruf aus und wiederholt ihn bei vorübergehenden Fehlern."""
+        async def attempt() -> T:
+            async with self._semaphore:
+                return await factory()
+        return await retry_transient(attempt, retries)
+
+async def setup(bot: "MyBot"):
+    await bot.add_cog(WriteQueueService(bot))
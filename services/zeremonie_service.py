@@ -3,6 +3,8 @@ from discord.ext import commands
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING, Dict, Any
 
+from utils.broadcast import broadcast
+
 if TYPE_CHECKING:
     from main import MyBot
 
@@ -28,12 +30,8 @@ class ZeremonieService(commands.Cog):
         display_name = interaction.user.nick or interaction.user.name
         embed.set_footer(text=f"U.S. ARMY Management | ausgeführt von {display_name}")
 
-        for channel_id in CHANNEL_IDS:
-            if channel := self.bot.get_channel(channel_id):
-                try:
-                    await channel.send(embed=embed)
-                except discord.Forbidden:
-                    print(f"[ZeremonieService] Fehler: Keine Berechtigung zum Senden in Channel {channel_id}")
+        channels = [channel for channel_id in CHANNEL_IDS if (channel := self.bot.get_channel(channel_id))]
+        await broadcast(channels, {"embed": embed}, label="ZeremonieService", write_queue=self.bot.get_cog("WriteQueueService"))
 
 async def setup(bot: "MyBot"):
     await bot.add_cog(ZeremonieService(bot))
\ No newline at end of file
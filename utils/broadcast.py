@@ -0,0 +1,88 @@
+import discord
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, List, TypeVar
+
+if TYPE_CHECKING:
+    from services.write_queue_service import WriteQueueService
+
+T = TypeVar("T")
+
+# --- Konstanten ---
+MAX_CONCURRENT_SENDS = 5
+MAX_RETRIES = 2
+RETRY_BASE_DELAY = 1.0
+
+def is_transient_error(error: Exception) -> bool:
+    """Rate-Limits und Serverfehler von Discord lohnen einen erneuten Versuch."""
+    return isinstance(error, discord.HTTPException) and (error.status == 429 or error.status >= 500)
+
+async def retry_transient(factory: Callable[[], Awaitable[T]], retries: int = MAX_RETRIES) -> T:
+    """Führt `factory()` aus und wiederholt sie bei vorübergehenden Fehlern mit wachsendem Abstand."""
+    attempt = 0
+    while True:
+        try:
+            return await factory()
+        except Exception as e:
+            if attempt >= retries or not is_transient_error(e):
+                raise
+        attempt += 1
+        await asyncio.sleep(RETRY_BASE_DELAY * 2 ** (attempt - 1))
+
+# =========================================================================
+# NACHRICHTEN AN MEHRERE KANÄLE
+# =========================================================================
+@dataclass
+class BroadcastResult:
+    channel: discord.abc.Messageable
+    message: discord.Message | None = None
+    error: Exception | None = None
+    duration: float = 0.0
+    attempts: int = 0
+
+    @property
+    def success(self) -> bool:
+        return self.message is not None
+
+async def broadcast(channels: Iterable[discord.abc.Messageable], send_kwargs: Dict[str, Any] | Callable[[Any], Dict[str, Any]],
+                    label: str = "Broadcast", max_concurrency: int = MAX_CONCURRENT_SENDS, retries: int = MAX_RETRIES,
+                    write_queue: "WriteQueueService" = None) -> List[BroadcastResult]:
+    """
+    Sendet eine Nachricht gleichzeitig (höchstens `max_concurrency` parallel) in mehrere Kanäle.
+
+    `send_kwargs` sind die Argumente für `channel.send` oder eine Funktion, die sie je Kanal
+    liefert (z.B. für kanalabhängige Rollen-Pings). Mit `write_queue` läuft jeder Versuch über
+    die bot-weite Schreibwarteschlange; `max_concurrency` begrenzt dann nur diesen Broadcast.
+    Vorübergehende Fehler werden bis zu `retries` Mal wiederholt. Das Ergebnis enthält je
+    Kanal Erfolg, Fehler und Dauer.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def send(channel) -> BroadcastResult:
+        result = BroadcastResult(channel=channel)
+        started = time.perf_counter()
+
+        async def attempt() -> discord.Message:
+            result.attempts += 1
+            kwargs = send_kwargs(channel) if callable(send_kwargs) else send_kwargs
+            async with semaphore:
+                if write_queue:
+                    return await write_queue.submit(lambda: channel.send(**kwargs), retries=0)
+                return await channel.send(**kwargs)
+
+        try:
+            result.message = await retry_transient(attempt, retries)
+        except Exception as e:
+            # Ein fehlerhafter Kanal darf die übrigen Sendungen nicht abbrechen
+            result.error = e
+        result.duration = time.perf_counter() - started
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(send(channel) for channel in channels))
+    failed = [r for r in results if not r.success]
+    print(f"[{label}] {len(results) - len(failed)}/{len(results)} Kanäle erfolgreich in {(time.perf_counter() - started) * 1000:.1f}ms")
+    for r in failed:
+        print(f"[{label}] Fehler beim Senden in Channel {getattr(r.channel, 'id', '?')}: {r.error}")
+    return results
@@ -0,0 +1,18 @@
+from typing import Awaitable, Callable, Sequence
+
+# =========================================================================
+# DATENBANK-HILFSFUNKTIONEN
+# =========================================================================
+async def ensure_index(execute_query: Callable[..., Awaitable], table: str, index_name: str, columns: Sequence[str]):
+    """
+    Legt einen Index an, falls er noch nicht existiert (MySQL kennt kein `CREATE INDEX IF NOT EXISTS`).
+    `execute_query` ist die `_execute_query`-Methode des aufrufenden Services.
+    """
+    existing = await execute_query(
+        "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+        (table, index_name), fetch="one"
+    )
+    if existing: return
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    await execute_query(f"ALTER TABLE `{table}` ADD INDEX `{index_name}` ({column_list})")
+    print(f"Index {index_name} auf {table} ({column_list}) angelegt.")
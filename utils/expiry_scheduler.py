@@ -0,0 +1,88 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+# --- Konstanten ---
+MAX_SLEEP_SECONDS = 3600 # Auch ohne neue Einträge regelmäßig aufwachen (Uhrzeit-Sprünge)
+RETRY_DELAY = timedelta(seconds=60) # Nach einem Fehler in `on_expire` werden die Schlüssel erneut eingeplant
+
+# =========================================================================
+# ABLAUF-PLANUNG
+# =========================================================================
+class ExpiryScheduler:
+    """
+    Führt für jeden Schlüssel zum exakten Ablaufzeitpunkt einen Callback aus.
+
+    Die Einträge liegen in einem Heap im Speicher; der Aufrufer baut ihn beim Start
+    aus der Datenbank neu auf. Gleichzeitig fällige Schlüssel werden gemeinsam an
+    `on_expire(keys)` übergeben. Erneutes `schedule` überschreibt einen Eintrag,
+    `cancel` entfernt ihn (veraltete Heap-Einträge werden beim Abholen verworfen).
+    Wirft `on_expire` eine Exception, werden die Schlüssel nach `RETRY_DELAY` erneut übergeben.
+    """
+    def __init__(self, on_expire: Callable[[List[Hashable]], Awaitable[None]], name: str = "ExpiryScheduler"):
+        self.on_expire = on_expire
+        self.name = name
+        self._heap: List[Tuple[datetime, int, Hashable]] = []
+        self._due: Dict[Hashable, datetime] = {}
+        self._counter = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task: self._task.cancel()
+
+    def schedule(self, key: Hashable, due: datetime):
+        if due.tzinfo is None:
+            due = due.replace(tzinfo=timezone.utc)
+        self._due[key] = due
+        self._counter += 1
+        heapq.heappush(self._heap, (due, self._counter, key))
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable):
+        self._due.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _pop_due(self, now: datetime) -> List[Hashable]:
+        keys = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due:
+                del self._due[key]
+                keys.append(key)
+        return keys
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now(timezone.utc)
+            keys = self._pop_due(now)
+            if keys:
+                try:
+                    await self.on_expire(keys)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"[{self.name}] Fehler beim Verarbeiten abgelaufener Einträge, neuer Versuch in {RETRY_DELAY.seconds}s: {e}")
+                    retry_at = datetime.now(timezone.utc) + RETRY_DELAY
+                    for key in keys:
+                        # Zwischenzeitlich neu eingeplante Schlüssel behalten ihren neuen Termin
+                        if key not in self._due:
+                            self.schedule(key, retry_at)
+                continue
+
+            timeout = MAX_SLEEP_SECONDS
+            if self._heap:
+                timeout = min(timeout, max((self._heap[0][0] - now).total_seconds(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
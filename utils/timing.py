@@ -0,0 +1,33 @@
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# =========================================================================
+# ZEITMESSUNG
+# =========================================================================
+class PhaseTimer:
+    """
+    Misst die Dauer einzelner Phasen eines Ablaufs (z.B. DB, Discord)
+    und fasst sie zu einer Log-Zeile zusammen.
+    """
+    def __init__(self, label: str):
+        self.label = label
+        self.spans: List[Tuple[str, float]] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, time.perf_counter() - start))
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._started
+
+    def summary(self) -> str:
+        parts = [f"{name}={duration * 1000:.1f}ms" for name, duration in self.spans]
+        parts.append(f"gesamt={self.total * 1000:.1f}ms")
+        return f"[Timing] {self.label}: " + ", ".join(parts)